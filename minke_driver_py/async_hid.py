@@ -0,0 +1,392 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+
+import numpy as np
+import serial
+
+from hid_driver import InputDevice, FrameTransmitter, ProtocolProbe, ReadyProbe, split_hotkey
+from human_hid import HumanHID
+from metrics import async_timed
+from move_handle import AsyncMoveHandle
+
+
+class AsyncFrameTransmitter(FrameTransmitter):
+    """
+    FrameTransmitter 的 asyncio 版本
+    节流模型与同步版完全一致，区别在于：
+      - 等待用 asyncio.sleep，不占线程
+      - 串口以非阻塞方式写入 (write_timeout=0)，写不完时等待 fd 可写
+    """
+    async def flush(self):
+        self._seal()
+        if not self._delays:
+            return
+        buf, delays, sizes = self._take()
+        if not self.ser:
+            return
+        self._count(buf, delays, sizes)
+        c = self.metrics.counters
+        loop = asyncio.get_running_loop()
+        for step in self._plan(buf, delays, sizes):
+            if isinstance(step, float):
+                await asyncio.sleep(step)
+                c['throttle_seconds_total'] += step
+            else:
+                t = loop.time()
+                await self._write(step)
+                c['write_seconds_total'] += loop.time() - t
+
+    async def _write(self, data):
+        view = memoryview(data)
+        while view:
+            ser = self.ser
+            try:
+                with self.lock:
+                    n = ser.write(view) or 0
+                    self.last_write = time.perf_counter()
+            except serial.SerialTimeoutException:
+                raise
+            except (serial.SerialException, OSError) as e:
+                # 重连是阻塞的 (打开串口 + 握手)，放到线程池里执行，不卡住事件循环
+                if self.on_disconnect is None or not await asyncio.get_running_loop().run_in_executor(
+                        None, self.on_disconnect, e, ser):
+                    raise
+                continue
+            view = view[n:]
+            if view:
+                await self._writable(len(view))
+
+    async def _writable(self, remaining):
+        loop = asyncio.get_running_loop()
+        try:
+            fd = self.ser.fileno()
+            fut = loop.create_future()
+            loop.add_writer(fd, fut.set_result, None)
+        except (AttributeError, NotImplementedError, OSError, ValueError):
+            # Windows Proactor / 虚拟串口不支持 add_writer: 按线路速率估算等待时间
+            await asyncio.sleep(remaining * self.byte_time)
+            return
+        try:
+            await fut
+        finally:
+            loop.remove_writer(fd)
+
+
+class AsyncInputDevice(InputDevice):
+    """
+    InputDevice 的 asyncio 版本，API 与同步版一一对应，只是全部需要 await
+
+    async with AsyncInputDevice('COM3') as dev:
+        await dev.mouse_move(100, 0)
+        await dev.type_string("hello")
+    """
+    def __init__(self, port, baud_rate=115200, device_timed=False, **kwargs):
+        super().__init__(port, baud_rate, device_timed, **kwargs)
+        self.tx = AsyncFrameTransmitter(None, baud_rate, metrics=self.metrics)
+        self.tx.on_disconnect = self._reconnect
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def connect(self):
+        try:
+            self._open()
+            t = time.perf_counter()
+            self.ready = await self._async_handshake()
+            self.protocol = await self._async_negotiate()
+            self._count_connect()
+            print(f"Device connected on {self.port} ({self.ready}, v{self.protocol}, "
+                  f"{(time.perf_counter() - t) * 1000:.0f} ms)")
+        except Exception as e:
+            self.metrics.inc('connect_errors_total')
+            print(f"Connection failed: {e}")
+            raise
+        self._start_keepalive()
+
+    def _open(self):
+        # write_timeout=0: 非阻塞写，写不完的部分由事件循环等待
+        self.ser = serial.serial_for_url(self.port, self.baud, timeout=0, write_timeout=0)
+        self.tx.ser = self.ser
+
+    async def _async_handshake(self):
+        probe = ReadyProbe(self.ready_timeout)
+        while True:
+            now = time.perf_counter()
+            frame = probe.probe(now)
+            if frame:
+                self.ser.write(frame)
+            n = self.ser.in_waiting
+            data = self.ser.read(n) if n else b''
+            result = probe.feed(data, now)
+            if result:
+                return result
+            if not data:
+                await asyncio.sleep(0.005)
+
+    async def _async_negotiate(self):
+        if self.protocol_request:
+            return self.protocol_request
+        if self.ready != 'ack':
+            return 1
+        probe = ProtocolProbe()
+        self.ser.write(probe.frame)
+        while True:
+            n = self.ser.in_waiting
+            data = self.ser.read(n) if n else b''
+            version = probe.feed(data, time.perf_counter())
+            if version:
+                return version
+            if not data:
+                await asyncio.sleep(0.002)
+
+    async def close(self):
+        self._stop_keepalive()
+        if self.ser and self.ser.is_open:
+            await self.tx.flush()
+            if self.device_timed:
+                await self.sync()
+            self.ser.close()
+            print("Device disconnected")
+
+    def _send_packet(self, type, b2, b3, b4, b5, b6, b7, delay_ms=0):
+        # 只入缓冲；由各个 async API 在末尾统一 await flush()
+        if not self.ser: return
+        self._push(type, b2, b3, b4, b5, b6, b7, delay_ms)
+
+    @asynccontextmanager
+    async def batch(self):
+        """async with dev.batch(): 块内的帧合并，退出时统一发送"""
+        self.tx.hold += 1
+        try:
+            yield self
+        finally:
+            self.tx.hold -= 1
+            if not self.tx.hold:
+                await self.tx.flush()
+
+    async def flush(self):
+        if not self.tx.hold:
+            await self.tx.flush()
+
+    async def wait(self, seconds):
+        if seconds <= 0:
+            return
+        if self.device_timed:
+            self._pending_delay += seconds
+            return
+        await self.tx.flush()
+        await self.scheduler.async_wait(seconds)
+
+    async def wait_until(self, deadline):
+        if self.device_timed:
+            await self.wait(deadline - self.scheduler.now())
+            return 0.0
+        if deadline > self.scheduler.now():
+            await self.tx.flush()
+        return await self.scheduler.async_wait_until(deadline)
+
+    async def sync(self):
+        await self.tx.flush()
+        lead = self.tx.lead_time
+        if lead > 0:
+            await asyncio.sleep(lead)
+
+    @async_timed('send_frames')
+    async def send_frames(self, frames, interval=0.0, delays=None):
+        if not self.ser: return
+        frames = self._frame_array(frames)
+        if not len(frames): return
+        gaps = self._gaps(interval, len(frames))
+        if delays is not None:
+            delays = np.asarray(delays)
+        if self.device_timed or not gaps.any():
+            self._push_frames(frames, gaps, delays)
+            await self.flush()
+            await self.wait(gaps[-1])
+            return
+        for i in range(len(frames)):
+            self._push_frames(frames[i:i + 1], None, None if delays is None else delays[i:i + 1])
+            await self.wait(gaps[i])
+        await self.flush()
+
+    # ================= 鼠标 API =================
+
+    @async_timed('mouse_move')
+    async def mouse_move(self, dx, dy, wheel=0):
+        self._mouse_move(dx, dy, wheel)
+        await self.flush()
+
+    @async_timed('mouse_move_to')
+    async def mouse_move_to(self, x_percent, y_percent):
+        super().mouse_move_to(x_percent, y_percent)
+        await self.flush()
+
+    @async_timed('mouse_move_abs')
+    async def mouse_move_abs(self, x, y):
+        self._mouse_move_abs(x, y)
+        await self.flush()
+
+    @async_timed('mouse_click')
+    async def mouse_click(self, button='left'):
+        super().mouse_down(button)
+        await self.wait(0.05)
+        super().mouse_up(button)
+        await self.flush()
+
+    @async_timed('mouse_down')
+    async def mouse_down(self, button='left'):
+        super().mouse_down(button)
+        await self.flush()
+
+    @async_timed('mouse_up')
+    async def mouse_up(self, button='left'):
+        super().mouse_up(button)
+        await self.flush()
+
+    @async_timed('mouse_scroll')
+    async def mouse_scroll(self, steps):
+        await self.mouse_move(0, 0, wheel=steps)
+
+    # ================= 键盘 API =================
+
+    @async_timed('key_press')
+    async def key_press(self, key):
+        super().key_down(key)
+        await self.wait(0.05)
+        super().key_up(key)
+        await self.flush()
+
+    @async_timed('key_down')
+    async def key_down(self, key, modifiers=[]):
+        super().key_down(key, modifiers)
+        await self.flush()
+
+    @async_timed('key_up')
+    async def key_up(self, key):
+        super().key_up(key)
+        await self.flush()
+
+    @async_timed('type_string')
+    async def type_string(self, text, interval=0.05, hold=0.05, fast=False):
+        gaps = interval * 1000 if isinstance(interval, (int, float)) else [g * 1000 for g in interval]
+        frames, tail_ms = self.keystrokes.compile(text, hold * 1000, gaps, fast)
+        self._push_compiled(frames)
+        await self.flush()
+        await self.wait(tail_ms / 1000)
+
+    @async_timed('hotkey')
+    async def hotkey(self, *args):
+        target, mods = split_hotkey(args)
+        if target is None:
+            return
+        super().key_down(target, modifiers=mods)
+        await self.wait(0.1)
+        super().key_up(target)
+        await self.flush()
+
+
+class AsyncHumanHID(HumanHID):
+    """
+    HumanHID 的 asyncio 版本：轨迹与节奏算法完全复用，等待全部走 device.wait (asyncio.sleep)
+    同一个事件循环可以同时驱动多个脚本 (多块设备)，不需要线程。
+
+    async with AsyncHumanHID('COM3') as bot:
+        await bot.click_at(0.5, 0.5)
+    """
+    device_class = AsyncInputDevice
+    handle_class = AsyncMoveHandle
+
+    async def __aenter__(self):
+        await self.device.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.device.close()
+
+    # ================= 拟人移动 =================
+    @async_timed('human.move_to')
+    async def move_to(self, x, y, duration=0.5, jitter_pixels=3):
+        await self._preempt()
+        path, gaps, target_x, target_y = self._plan_move(x, y, duration, jitter_pixels)
+
+        hid = self._path_to_hid(path)
+        await self.device.send_frames(self.device.encoder.mouse_abs(hid[:, 0], hid[:, 1]), interval=gaps)
+
+        self.current_x = target_x
+        self.current_y = target_y
+
+        await self.device.wait(random.uniform(0.05, 0.12))
+
+    async def sync(self):
+        await self.device.sync()
+
+    # ================= 可改目标的移动 =================
+    async def start_move(self, x, y, duration=0.5, jitter_pixels=3, click=None):
+        """见 HumanHID.start_move；返回 AsyncMoveHandle (await handle.wait())"""
+        prev = await self._preempt()
+        self.active_move = self.handle_class(self, x, y, duration, jitter_pixels, click, prev).start()
+        return self.active_move
+
+    async def start_click_at(self, x, y, button='left', duration=0.6, jitter_pixels=3):
+        return await self.start_move(x, y, duration, jitter_pixels, click=button)
+
+    async def _preempt(self):
+        prev = self.active_move
+        if prev is None or prev.done:
+            return None
+        prev.cancel()
+        await prev.join()
+        return prev
+
+    # ================= 拟人点击 =================
+    @async_timed('human.click')
+    async def click(self, button='left'):
+        async with self.device.batch():
+            await self.device.mouse_down(button)
+            await self.device.wait(random.uniform(0.06, 0.14))
+            await self.device.mouse_up(button)
+
+    @async_timed('human.click_at')
+    async def click_at(self, x, y, button='left', duration=0.6, jitter_pixels=3):
+        await self.move_to(x, y, duration=duration, jitter_pixels=jitter_pixels)
+        await self.click(button)
+
+    # ================= 批量点击 =================
+    @async_timed('human.click_many')
+    async def click_many(self, targets, button='left', jitter_pixels=3):
+        """见 HumanHID.click_many"""
+        await self._preempt()
+        plan, frames, times, end = self._plan_clicks(targets, button, jitter_pixels)
+        if frames is None:
+            plan.actual = 0.0
+            return plan
+        t = time.perf_counter()
+        await self.device.wait(times[0])
+        await self.device.send_frames(frames, interval=np.diff(times, append=times[-1]))
+        self._finish_clicks(plan, t, end)
+        return plan
+
+    # ================= 拟人输入 =================
+    @async_timed('human.type')
+    async def type(self, text, wpm=80):
+        await self.device.type_string(text, interval=[d for _, d in self._type_delays(text, wpm)])
+
+    # ================= 拖拽 =================
+    @async_timed('human.drag_drop')
+    async def drag_drop(self, start_x, start_y, end_x, end_y, duration=1.0):
+        async with self.device.batch():
+            await self.move_to(start_x, start_y, duration=duration*0.4, jitter_pixels=3)
+
+            await self.device.mouse_down('left')
+            await self.device.wait(random.uniform(0.1, 0.2))
+
+            await self.move_to(end_x, end_y, duration=duration, jitter_pixels=3)
+
+            await self.device.wait(random.uniform(0.1, 0.2))
+            await self.device.mouse_up('left')
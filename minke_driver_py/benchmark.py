@@ -0,0 +1,679 @@
+# ================= 性能基准 =================
+# 覆盖驱动、拟人与回放的热点路径。需要设备的项目全部跑在 loop:// + VirtualMinke 上，不需要开发板。
+#   encode    : 单帧 encode_frame 与 FrameEncoder 批量编码速率
+#   protocol  : 典型鼠标流 (HumanHID 绝对轨迹 / 相对移动) 在 v1 与 v2 协议下每次更新的字节数、
+#               115200 波特率下串口能承载的更新/秒、v2 打包耗时，并用参考解码器校验往返一致
+#   device    : InputDevice 逐帧 API 的上位机开销，以及虚拟设备实际送达的帧率
+#   stream    : RelativeStream 从命令到首帧写上串口的延迟 (空闲阶跃 / 拟人起步 / 运动中改目标)、采样率与线上帧率
+#   vision    : VisionPipeline 端到端反应时间 (采集 -> 动作下发)，12ms 检测器 + 后台忙线程负载，
+#               检测在线程 / 子进程中执行两种情况 (GIL 切换间隔 1ms)，对照帧周期
+#   paths     : HumanHID 单次移动规划 (轨迹 + HID 换算 + 编码) 与批量生成的耗时，短/长距离移动的发送帧数
+#   tour      : 批量点击 n 个随机目标: 排路线耗时、整批规划 (路线 + 轨迹 + 组帧) 耗时、路线长度与按 Fitts 定律
+#               估计的移动时间相对检测顺序的比例；另在虚拟设备上点 TOUR_CLICKS 个目标，对比预计与实际总时长
+#   typing    : type_string 预编译速率与实际送达的字符/秒
+#   recording : JSONL / .mkr 的整体加载与流式读取速率
+#   scheduler : 逐步等待的迟到分布与总漂移 (time.sleep 对照 / Scheduler，空闲与有忙线程两种情况)
+#   pool      : DevicePool 在 1 块与 POOL_BOARDS 块 (loop://) 板子上的任务吞吐与扩展比，
+#               以及命令句柄 then 串联后取消时挂住的后继数
+#   replay    : ActionReplayer 回放每个事件的送达时刻相对录制时间轴的误差 (上位机计时 / 设备计时)
+# 结果为 JSON: {'meta': {...}, 'results': {基准名: {指标: 数值}}}
+# 指标方向按后缀判断: *_per_s 越大越好；*_ms / *_us / *drops 越小越好；其余只记录不比较。
+#
+#   python benchmark.py --out baseline.json
+#   python benchmark.py --baseline baseline.json --threshold 0.2   # 有退化时退出码为 1
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import CancelledError, Future, TimeoutError as FuturesTimeout
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+from device_pool import DevicePool
+from hid_driver import (InputDevice, FrameEncoder, KeystrokeCompiler, RecordEncoder, RelativeEncoder,
+                        encode_frame, EVENT_TYPE_MOUSE_ABS, FRAME_DTYPE, FRAME_LEN, FRAME2_SYNC)
+from hid_worker import CommandHandle
+from human_hid import HumanHID
+from record_format import jsonl_to_binary, load_events
+from repalyer import ActionReplayer
+from scheduler import Scheduler
+from stream_replay import EventStream
+from tour_planner import fitts_durations, plan_tour
+from virtual_device import VirtualMinke, RxContext
+from vision_pipeline import SyntheticSource, VisionPipeline, brightest_spot
+
+FORMAT_VERSION = 1
+POOL_BOARDS = 4
+BAUD_RATE = 115200
+TOLERANCE_MS = 1.0   # 毫秒级指标的绝对容差 (低于 HID 轮询粒度的抖动不算退化)
+
+# 每个基准的规模: (quick, full)
+SIZES = {
+    'encode': (20000, 100000),
+    'protocol': (200, 1000),
+    'device': (100, 400),
+    'stream': (20, 60),
+    'vision': (120, 600),
+    'paths': (500, 2000),
+    'tour': (200, 500),
+    'typing': (60, 200),
+    'recording': (20000, 200000),
+    'scheduler': (100, 500),
+    'pool': (8, 32),
+    'replay': (60, 200),
+}
+
+
+def _best(fn, repeat=5):
+    """重复 repeat 次取最短耗时 (秒)"""
+    best = float('inf')
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+@contextmanager
+def virtual_device(device=None, **vm_kwargs):
+    """把 InputDevice (默认新建 loop://) 连上一台虚拟 Minke"""
+    dev = device or InputDevice('loop://')
+    dev.connect()
+    vm = VirtualMinke(**vm_kwargs).start(dev.ser)
+    try:
+        yield dev, vm
+    finally:
+        # 先停设备线程再关串口，避免接收线程读到已关闭的端口
+        vm.stop()
+        dev.close()
+
+
+def _delivered(vm):
+    """虚拟设备送达的帧报告 (不含看门狗复位)，按接收序号排序"""
+    return sorted((r for r in vm.reports if 'seq' in r), key=lambda r: r['seq'])
+
+
+def _rate(n, seconds):
+    return n / seconds if seconds > 0 else float('inf')
+
+
+# ================= 各项基准 =================
+def bench_encode(n):
+    xs = np.random.randint(0, 32767, n).astype(np.int16)
+    ys = np.random.randint(0, 32767, n).astype(np.int16)
+    pairs = list(zip(xs.tolist(), ys.tolist()))
+
+    def per_frame():
+        for x, y in pairs:
+            encode_frame(EVENT_TYPE_MOUSE_ABS, 0, 0, x & 0xFF, (x >> 8) & 0xFF, y & 0xFF, (y >> 8) & 0xFF)
+
+    enc = FrameEncoder(n)
+    return {
+        'frames': n,
+        'frames_per_s': _rate(n, _best(per_frame, 3)),
+        'bulk_frames_per_s': _rate(n, _best(lambda: enc.mouse_abs(xs, ys))),
+    }
+
+
+def _mouse_streams(n):
+    """n 条 HumanHID 绝对轨迹 + 等量的相对移动流 (10ms 一步)，均为 FRAME_DTYPE 数组"""
+    human = HumanHID('loop://', 1920, 1080)
+    rng = random.Random(0)
+    enc = FrameEncoder()
+    paths = []
+    for _ in range(n):
+        path, _, _, _ = human._plan_move(rng.random(), rng.random(), 0.5, 3)
+        hid = human._path_to_hid(path)
+        paths.append(np.array(enc.mouse_abs(hid[:, 0], hid[:, 1]), dtype=np.uint8).view(FRAME_DTYPE))
+    abs_frames = np.concatenate(paths)
+    rel = RelativeEncoder()
+    steps = [s for _ in range(len(abs_frames)) for s in rel.steps(rng.gauss(0, 8), rng.gauss(0, 8))]
+    xy = np.array(steps)
+    rel_frames = np.array(enc.mouse_rel(xy[:, 0], xy[:, 1]), dtype=np.uint8).view(FRAME_DTYPE)
+    return {'abs': abs_frames, 'rel': rel_frames}
+
+
+def bench_protocol(n):
+    records = RecordEncoder()
+    line = BAUD_RATE / 10   # 8N1 每秒字节数
+    result = {'paths': n, 'v1_updates_per_s': line / FRAME_LEN}
+    mismatches = resync_drops = stall_drops = 0
+    for kind, frames in _mouse_streams(n).items():
+        delays = np.full(len(frames), 10)
+        frames['delay'] = delays
+        data, _, _ = records.pack(frames, delays)
+        per_update = len(data) / len(frames)
+        ref = [(e.type, e.delay_ms, e.buttons, e.x, e.y) for e in RxContext().events(frames.tobytes())]
+        got = [(e.type, e.delay_ms, e.buttons, e.x, e.y) for e in RxContext().events(data)]
+        mismatches += ref != got
+        # 坏同步字 (LEN 合法但是错的) 之后紧跟的完整帧/记录，CRC 失败后重解析应全部找回
+        for stream in (frames.tobytes(), data):
+            resync_drops += len(ref) - len(RxContext().events(bytes((FRAME2_SYNC, 0x60)) + stream))
+        # LEN 字节损坏 (超出合法记录长度) 且后面只有几帧: 不能等凑够 LEN 个字节才放出这几帧
+        head, _, _ = records.pack(frames[:5], delays[:5])
+        for stream in (frames[:5].tobytes(), head):
+            stall_drops += 5 - len(RxContext().events(bytes((FRAME2_SYNC, 0xF0)) + stream))
+        result[f'{kind}_updates'] = len(frames)
+        result[f'{kind}_bytes_per_update'] = per_update
+        result[f'{kind}_gain'] = FRAME_LEN / per_update
+        result[f'v2_{kind}_updates_per_s'] = line / per_update
+        result[f'{kind}_pack_us'] = _best(lambda: records.pack(frames, delays), 3) / len(frames) * 1e6
+    result['roundtrip_mismatches'] = mismatches
+    result['resync_drops'] = resync_drops
+    result['resync_stall_drops'] = stall_drops
+    return result
+
+
+def bench_device(n):
+    with virtual_device() as (dev, vm):
+        t0 = time.perf_counter()
+        with dev.batch():
+            for i in range(n):
+                dev.mouse_move_abs(1000 + i, 2000 + i)
+            t_api = time.perf_counter() - t0
+        t_sent = time.perf_counter() - t0
+        vm.wait_idle()
+        reports = _delivered(vm)
+        st = vm.stats()
+
+    span = reports[-1]['t'] - reports[0]['t'] if len(reports) > 1 else 0.0
+    return {
+        'frames': n,
+        'delivered': len(reports),
+        'api_us': t_api / n * 1e6,
+        'send_frames_per_s': _rate(n, t_sent),
+        'frames_per_s': _rate(len(reports) - 1, span),
+        'queue_drops': st['queue_drops'],
+        'usb_drops': st['usb_drops'],
+    }
+
+
+def bench_stream(n):
+    human = HumanHID('loop://', 1920, 1080)
+    with virtual_device(human.device) as (dev, vm):
+        writes = []
+        dev.metrics.add_frame_hook(lambda frame, delay_ms, t: writes.append(t))
+
+        def first_write_after(t0):
+            while not writes or writes[-1] < t0:
+                time.sleep(0.0005)
+            return next(t for t in writes if t >= t0) - t0
+
+        with human.rel_stream(seed=0) as stream:
+            def idle_latency(duration):
+                out = []
+                for i in range(n):
+                    stream.wait_idle(2)
+                    time.sleep(0.02)
+                    t0 = time.perf_counter()
+                    stream.aim(40 if i % 2 else -40, 10, duration)
+                    out.append(first_write_after(t0))
+                return out
+
+            # 阶跃目标 (duration 极短): 只剩引擎与串口的延迟；拟人目标另含起步段攒够 1 个计数的时间
+            wire = idle_latency(0.001)
+            onset = idle_latency(None)
+
+            # 运动中改目标 (跟踪时的典型用法): 随机相位给新目标，受设备下一个轮询时隙限制
+            rng = random.Random(0)
+            busy = []
+            stream.aim(600, 0)
+            for i in range(n):
+                time.sleep(rng.uniform(0.02, 0.04))
+                t0 = time.perf_counter()
+                stream.aim(60, 20 if i % 2 else -20)
+                busy.append(first_write_after(t0))
+            stream.wait_idle(2)
+
+            # 持续跟随: 采样率与线上帧率
+            ticks = dev.metrics.counters['stream_ticks_total']
+            count = len(writes)
+            t0 = time.perf_counter()
+            stream.track(3000, 0)
+            time.sleep(0.5)
+            span = time.perf_counter() - t0
+            rate = (len(writes) - count) / span
+            tick_rate = (dev.metrics.counters['stream_ticks_total'] - ticks) / span
+            stream.halt()
+            stream.wait_idle(2)
+
+    return {
+        'commands': n,
+        'wire_latency_ms': float(np.median(wire)) * 1000,
+        'onset_latency_ms': float(np.median(onset)) * 1000,
+        'busy_latency_ms': float(np.median(busy)) * 1000,
+        'busy_latency_p95': float(np.percentile(busy, 95)) * 1000,
+        'tick_rate': tick_rate,
+        'wire_frames_per_s': rate,
+    }
+
+
+VISION_FPS = 60
+VISION_DETECT_SECONDS = 0.012
+
+
+def _slow_detector(image):
+    """模拟 CPU 密集的检测器 (持有 GIL 忙等)"""
+    t = time.perf_counter()
+    while time.perf_counter() - t < VISION_DETECT_SECONDS:
+        pass
+    return brightest_spot(image)
+
+
+def bench_vision(n):
+    human = HumanHID('loop://', 1920, 1080)
+    result = {'frames': n, 'frame_period_ms': 1000.0 / VISION_FPS}
+    with virtual_device(human.device):
+        for mode in ('thread', 'process'):
+            # 负载: 一个持续占用 GIL 的后台线程
+            stop = threading.Event()
+
+            def busy():
+                while not stop.is_set():
+                    sum(range(1000))
+            load = threading.Thread(target=busy, daemon=True)
+            load.start()
+            pipe = VisionPipeline(human, SyntheticSource(fps=VISION_FPS, frames=n), _slow_detector,
+                                  detect_in_process=mode == 'process')
+            with pipe:
+                pipe.join()
+            stop.set()
+            load.join()
+            if human.active_move is not None:
+                human.active_move.cancel()
+                human.active_move.join()
+
+            st = pipe.stats()
+            result[f'{mode}_reaction_p50_ms'] = st['reaction']['p50_ms']
+            result[f'{mode}_reaction_p95_ms'] = st['reaction']['p95_ms']
+            result[f'{mode}_dropped'] = st['dropped_frames']
+    return result
+
+
+def bench_paths(n):
+    human = HumanHID('loop://', 1920, 1080)
+    dev = human.device
+    rng = random.Random(0)
+    targets = [(rng.random(), rng.random()) for _ in range(n)]
+
+    def plan():
+        for x, y in targets:
+            path, _, _, _ = human._plan_move(x, y, 0.5, 3)
+            hid = human._path_to_hid(path)
+            dev.encoder.mouse_abs(hid[:, 0], hid[:, 1])
+
+    def frames_per_move(dist_px):
+        # 从屏幕中心水平移动 dist_px，0.5 秒，平均每次移动实际发送的帧数
+        counts = []
+        for _ in range(20):
+            human.current_x, human.current_y = 0.5, 0.5
+            path, _, _, _ = human._plan_move(0.5 + dist_px / 1920, 0.5, 0.5, 0)
+            counts.append(len(path))
+        return sum(counts) / len(counts)
+
+    starts = np.random.rand(n, 2)
+    ends = np.random.rand(n, 2)
+    return {
+        'paths': n,
+        'short_move_frames': frames_per_move(4),
+        'long_move_frames': frames_per_move(800),
+        'move_plan_us': _best(plan, 3) / n * 1e6,
+        'batch_path_us': _best(lambda: human.generate_paths(starts, ends, 30)) / n * 1e6,
+    }
+
+
+TOUR_CLICKS = 6
+
+
+def bench_tour(n):
+    human = HumanHID('loop://', 1920, 1080)
+    scale = np.array((1920.0, 1080.0))
+    rng = np.random.default_rng(0)
+    targets = rng.random((n, 2))
+    pts = targets * scale
+    start = scale / 2
+    order = plan_tour(pts, start, extent=scale)
+
+    def route(o):
+        # -> (路线长度 像素, Fitts 定律估计的移动时间 秒)
+        dist = np.hypot(*np.diff(np.vstack([start, pts[o]]), axis=0).T)
+        return float(dist.sum()), float(fitts_durations(dist).sum())
+
+    tour_px, tour_s = route(order)
+    detect_px, detect_s = route(np.arange(n))
+    result = {
+        'targets': n,
+        'tour_plan_us': _best(lambda: plan_tour(pts, start, extent=scale), 10) * 1e6,
+        'click_plan_ms': _best(lambda: human._plan_clicks(targets, 'left', 3), 3) * 1e3,
+        'length_ratio': tour_px / detect_px,
+        'move_time_ratio': tour_s / detect_s,
+    }
+
+    with virtual_device(human.device) as (dev, vm):
+        plan = human.click_many(targets[:TOUR_CLICKS])
+        vm.wait_idle()
+        reports = _delivered(vm)
+    result['clicks_delivered'] = sum(1 for r in reports if r['buttons'])
+    result['estimated_s'] = plan.estimated
+    result['actual_s'] = plan.actual
+    result['estimate_error_ms'] = abs(plan.actual - plan.estimated) * 1e3
+    return result
+
+
+def bench_typing(n):
+    rng = random.Random(0)
+    text = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz ABC,.!?0123456789') for _ in range(n))
+    # 每次新建编译器 (不共享缓存)，首次查表也计入
+    t_compile = _best(lambda: KeystrokeCompiler('us').compile(text, fast=True))
+
+    with virtual_device() as (dev, vm):
+        dev.type_string(text, fast=True)
+        vm.wait_idle()
+        reports = _delivered(vm)
+
+    span = reports[-1]['t'] - reports[0]['t'] if len(reports) > 1 else 0.0
+    return {
+        'chars': n,
+        'frames': len(reports),
+        'compile_chars_per_s': _rate(n, t_compile),
+        'chars_per_s': _rate(n, span),
+        # 快速模式省略抬起帧后，同键码相邻 (含大小写 / 上档符号) 的字符不能丢
+        'fast_press_drops': sum(len(t) - _fast_presses(t) for t in (text, 'aA', 'Aa', '1!', 'aa', 'ab')),
+    }
+
+
+def _fast_presses(text):
+    """快速模式编译结果里主机能看到的按下次数 (键码从无到有或换成另一个键码)"""
+    held, presses = 0, 0
+    for prefix, _ in KeystrokeCompiler('us').compile(text, fast=True)[0]:
+        code = prefix[2] if prefix[3] != 0x80 else 0
+        presses += code != 0 and code != held
+        held = code
+    return presses
+
+
+def _synthetic_events(n, step_ms=8):
+    """合成录制: 以移动为主，穿插点击、滚轮与按键"""
+    rng = random.Random(0)
+    t, x, y = 0, 960, 540
+    for i in range(n):
+        t += rng.randint(1, 2 * step_ms)
+        r = i % 50
+        if r == 10:
+            yield {'t': t, 'e': 'click', 'b': 'left', 's': 1}
+        elif r == 11:
+            yield {'t': t, 'e': 'click', 'b': 'left', 's': 0}
+        elif r == 20:
+            yield {'t': t, 'e': 'scroll', 'dy': rng.choice((-1, 1))}
+        elif r in (30, 31):
+            yield {'t': t, 'e': 'key', 'k': 'a', 's': 1 if r == 30 else 0}
+        else:
+            x = min(1919, max(0, x + rng.randint(-5, 5)))
+            y = min(1079, max(0, y + rng.randint(-5, 5)))
+            yield {'t': t, 'e': 'move', 'x': x, 'y': y}
+
+
+def _write_jsonl(filename, events):
+    with open(filename, 'w', encoding='utf-8') as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+
+
+def bench_recording(n):
+    with tempfile.TemporaryDirectory() as tmp:
+        jsonl = os.path.join(tmp, 'bench.jsonl')
+        mkr = os.path.join(tmp, 'bench.mkr')
+        _write_jsonl(jsonl, _synthetic_events(n))
+        jsonl_to_binary(jsonl, mkr)
+
+        def consume(it):
+            for _ in it:
+                pass
+
+        return {
+            'events': n,
+            'jsonl_bytes': os.path.getsize(jsonl),
+            'mkr_bytes': os.path.getsize(mkr),
+            'jsonl_load_events_per_s': _rate(n, _best(lambda: consume(load_events(jsonl)), 3)),
+            'mkr_load_events_per_s': _rate(n, _best(lambda: consume(load_events(mkr)), 3)),
+            'jsonl_stream_events_per_s': _rate(n, _best(lambda: consume(EventStream(jsonl)), 3)),
+            'mkr_stream_events_per_s': _rate(n, _best(lambda: consume(EventStream(mkr)), 3)),
+            'mkr_raw_events_per_s': _rate(n, _best(lambda: consume(EventStream(mkr, raw=True)), 3)),
+        }
+
+
+def _replay_errors(filename, device_timed, events):
+    """回放一遍，返回每个事件 (送达时刻 - 录制时刻) 的误差 (ms)，两条时间轴都以第一个事件为零点"""
+    player = ActionReplayer('loop://', device_timed=device_timed)
+    human = HumanHID('loop://', player.sw, player.sh, device_timed=device_timed)
+    with virtual_device(human.device) as (dev, vm):
+        player.replay(human, filename)
+        dev.sync()
+        vm.wait_idle()
+        reports = _delivered(vm)
+
+    t0 = reports[0]['t']
+    rec = {r['seq']: r['t'] - t0 for r in reports}
+    return np.array([(rec[i] * 1000 - (e['t'] - events[0]['t'])) for i, e in enumerate(events) if i in rec])
+
+
+def _step_drift(n, step, wait):
+    """n 步、每步 step 秒的等待 -> 实际总时长与 n * step 之差 (ms)"""
+    start = time.perf_counter()
+    for _ in range(n):
+        wait(step)
+    return (time.perf_counter() - start - n * step) * 1000.0
+
+
+@contextmanager
+def _cpu_load():
+    """后台忙线程，与等待线程争抢 GIL"""
+    stop = threading.Event()
+
+    def burn():
+        while not stop.is_set():
+            sum(range(1000))
+
+    t = threading.Thread(target=burn, daemon=True)
+    t.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        t.join()
+
+
+def bench_scheduler(n, step=0.005):
+    """time.sleep 对照组按每次调用的多睡量统计，Scheduler 按截止时刻的迟到量统计"""
+    over = []
+
+    def sleep(seconds):
+        t = time.perf_counter()
+        time.sleep(seconds)
+        over.append((time.perf_counter() - t - seconds) * 1000.0)
+
+    result = {'steps': n, 'sleep_drift_ms': _step_drift(n, step, sleep)}
+    result['sleep_p95_late_ms'] = float(np.percentile(over, 95))
+    for mode in ('idle', 'loaded'):
+        sched = Scheduler()
+        with _cpu_load() if mode == 'loaded' else nullcontext():
+            result[f'{mode}_drift_ms'] = _step_drift(n, step, sched.wait)
+        st = sched.stats()
+        result[f'{mode}_p95_late_ms'] = st['p95_ms']
+        result[f'{mode}_max_late_ms'] = st['max_ms']
+    return result
+
+
+def _chain_cancel_drops():
+    """CommandHandle.then 串联后取消: 源命令取消、回调返回的 Future 被取消，后继句柄都必须结束"""
+    hung = 0
+    for cancel_inner in (False, True):
+        src, inner = CommandHandle(), Future()
+        nxt = src.then(lambda _: inner)
+        if cancel_inner:
+            src.set_running_or_notify_cancel()
+            src.set_result(None)
+            inner.cancel()
+        else:
+            src.cancel()
+        try:
+            nxt.result(timeout=1.0)
+        except CancelledError:
+            continue
+        except FuturesTimeout:
+            pass
+        hung += 1
+    return hung
+
+
+def _pool_move(bot, x):
+    bot.move_to(x, 0.5, duration=0.1, jitter_pixels=0)
+
+
+def bench_pool(n):
+    result = {'jobs': n, 'boards': POOL_BOARDS}
+    for boards in (1, POOL_BOARDS):
+        with DevicePool(['loop://'] * boards, monitor_interval=None) as pool:
+            t = time.perf_counter()
+            pool.map(_pool_move, [i / n for i in range(n)])
+            pool.join()
+            result[f'{boards}_board_jobs_per_s'] = _rate(n, time.perf_counter() - t)
+    result['scaling'] = result[f'{POOL_BOARDS}_board_jobs_per_s'] / result['1_board_jobs_per_s'] / POOL_BOARDS
+    result['then_cancel_drops'] = _chain_cancel_drops()
+    return result
+
+
+def bench_replay(n):
+    events = list(_synthetic_events(n, step_ms=25))
+    result = {'events': n}
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'bench.jsonl')
+        _write_jsonl(filename, events)
+        for mode, device_timed in (('host', False), ('device_timed', True)):
+            err = np.abs(_replay_errors(filename, device_timed, events))
+            result[f'{mode}_delivered'] = len(err)
+            result[f'{mode}_mean_error_ms'] = float(err.mean()) if len(err) else float('inf')
+            result[f'{mode}_p95_error_ms'] = float(np.percentile(err, 95)) if len(err) else float('inf')
+            result[f'{mode}_max_error_ms'] = float(err.max()) if len(err) else float('inf')
+    return result
+
+
+BENCHMARKS = {
+    'encode': bench_encode,
+    'protocol': bench_protocol,
+    'device': bench_device,
+    'stream': bench_stream,
+    'vision': bench_vision,
+    'paths': bench_paths,
+    'tour': bench_tour,
+    'typing': bench_typing,
+    'recording': bench_recording,
+    'scheduler': bench_scheduler,
+    'pool': bench_pool,
+    'replay': bench_replay,
+}
+
+
+# ================= 运行与比较 =================
+def run(names=None, quick=False):
+    """运行选定的基准 -> 结果文档"""
+    results = {}
+    for name in names or BENCHMARKS:
+        n = SIZES[name][0 if quick else 1]
+        print(f"⏱️ {name} (n={n}) ...")
+        results[name] = BENCHMARKS[name](n)
+    return {
+        'meta': {
+            'version': FORMAT_VERSION,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'quick': quick,
+        },
+        'results': results,
+    }
+
+
+def direction(metric):
+    """+1: 越大越好，-1: 越小越好，0: 只记录"""
+    if metric.endswith('_per_s'):
+        return 1
+    if metric.endswith(('_ms', '_us', 'drops')):
+        return -1
+    return 0
+
+
+def compare(current, baseline, threshold=0.2):
+    """
+    与基线逐项比较
+    :param threshold: 相对变差超过该比例视为退化
+    :return: [(基准, 指标, 当前值, 基线值, 相对变化, 是否退化), ...]
+    """
+    rows = []
+    for name, metrics in current['results'].items():
+        base = baseline['results'].get(name, {})
+        for metric, value in metrics.items():
+            sign = direction(metric)
+            if not sign or metric not in base:
+                continue
+            old = base[metric]
+            change = (value - old) / abs(old) if old else (0.0 if value == old else math.copysign(math.inf, value - old))
+            worse = -sign * change
+            if metric.endswith('_ms') and abs(value - old) < TOLERANCE_MS:
+                worse = 0.0
+            rows.append((name, metric, value, old, change, worse > threshold))
+    return rows
+
+
+def print_results(doc):
+    for name, metrics in doc['results'].items():
+        print(f"📊 {name}")
+        for metric, value in metrics.items():
+            print(f"   {metric:<28} {value:>14.3f}" if isinstance(value, float) else f"   {metric:<28} {value:>14}")
+
+
+def print_comparison(rows):
+    for name, metric, value, old, change, regressed in rows:
+        mark = "❌" if regressed else "✅"
+        key = f"{name}.{metric}"
+        print(f"{mark} {key:<38} {value:>14.3f}  (基线 {old:.3f}, {change:+.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Minke 性能基准 (虚拟设备)")
+    parser.add_argument("--only", default=None, help=f"逗号分隔的基准名: {','.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="缩小规模，快速冒烟")
+    parser.add_argument("--out", default=None, help="结果写入 JSON 文件")
+    parser.add_argument("--baseline", default=None, help="与保存的基线 JSON 比较")
+    parser.add_argument("--threshold", type=float, default=0.2, help="相对退化阈值 (默认 20%%)")
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else None
+    unknown = set(names or ()) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"未知基准: {', '.join(sorted(unknown))}")
+
+    doc = run(names, args.quick)
+    print_results(doc)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(doc, f, indent=2)
+        print(f"💾 结果已写入 {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare(doc, baseline, args.threshold)
+        print_comparison(rows)
+        regressions = sum(1 for r in rows if r[-1])
+        if regressions:
+            print(f"❌ {regressions} 项指标退化超过 {args.threshold:.0%}")
+            raise SystemExit(1)
+        print("✅ 没有超过阈值的退化")
@@ -0,0 +1,101 @@
+# ================= 向量化三次贝塞尔轨迹引擎 =================
+# B(t) = (1-t)^3 P0 + 3(1-t)^2 t P1 + 3(1-t) t^2 P2 + t^3 P3
+# 把 t 采样写成 Bernstein 基矩阵 B (steps+1, 4) 后，整条轨迹就是一次矩阵乘法:
+#     path = B @ [P0, P1, P2, P3]          -> (steps+1, 2)
+# 批量时控制点为 (N, 4, 2)，一次 matmul 得到 (N, steps+1, 2)。
+# 基矩阵只与步数有关，按步数缓存。
+from functools import lru_cache
+
+import numpy as np
+
+ABS_MAX = 32767
+
+
+@lru_cache(maxsize=512)
+def bernstein_basis(steps):
+    """步数 -> 只读 Bernstein 基矩阵 (steps+1, 4), float32"""
+    t = np.linspace(0.0, 1.0, steps + 1, dtype=np.float64)
+    mt = 1.0 - t
+    basis = np.stack([mt ** 3, 3 * mt ** 2 * t, 3 * mt * t ** 2, t ** 3], axis=1)
+    basis = basis.astype(np.float32)
+    basis.setflags(write=False)
+    return basis
+
+
+def bernstein_at(u):
+    """任意参数序列 u -> Bernstein 基矩阵 (len(u), 4), float32 (非均匀取点，不缓存)"""
+    u = np.asarray(u, dtype=np.float64)
+    mu = 1.0 - u
+    return np.stack([mu ** 3, 3 * mu ** 2 * u, 3 * mu * u ** 2, u ** 3], axis=1).astype(np.float32)
+
+
+def bezier_at(u, ctrl):
+    """在参数 u 处取点: ctrl 为 (4, 2) 控制点 -> (len(u), 2) float32"""
+    return bernstein_at(u) @ np.asarray(ctrl, dtype=np.float32)
+
+
+def bezier_at_batch(u, controls, seg):
+    """多条曲线混合取点: 第 i 个点取 controls[seg[i]] 在参数 u[i] 处的值 -> (len(u), 2) float32"""
+    controls = np.asarray(controls, dtype=np.float32)
+    return np.matmul(bernstein_at(u)[:, None, :], controls[seg])[:, 0]
+
+
+def bezier_path(start, control1, control2, end, steps):
+    """单条轨迹 -> (steps+1, 2) float32"""
+    ctrl = np.array((start, control1, control2, end), dtype=np.float32)
+    return bernstein_basis(steps) @ ctrl
+
+
+def bezier_paths(controls, steps):
+    """
+    批量轨迹
+    :param controls: (N, 4, 2) 控制点 [P0, P1, P2, P3]
+    :return: (N, steps+1, 2) float32
+    """
+    controls = np.asarray(controls, dtype=np.float32)
+    return np.matmul(bernstein_basis(steps), controls)
+
+
+def human_controls(starts, ends, screen_w, screen_h, rng=None):
+    """
+    批量生成拟人控制点 (与 HumanHID 的偏移规则一致)
+    偏移在像素空间计算：距离的 20%，并限制在 [20px, 150px]；
+    短距离时下限降为距离的一半 (几像素的微调不再绕出 20px 的弧)
+    :param starts, ends: (N, 2) 百分比坐标 (0.0 ~ 1.0)
+    :return: (N, 4, 2) float32 百分比坐标
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    starts = np.asarray(starts, dtype=np.float32).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=np.float32).reshape(-1, 2)
+    scale = np.array((screen_w, screen_h), dtype=np.float32)
+
+    s_px = starts * scale
+    e_px = ends * scale
+    delta = e_px - s_px
+    dist = np.hypot(delta[:, 0], delta[:, 1])
+    limit = np.clip(dist * 0.2, np.minimum(20, dist * 0.5), 150)[:, None, None]
+
+    offsets = rng.uniform(-1.0, 1.0, size=(len(starts), 2, 2)).astype(np.float32) * limit
+    ctrl = np.empty((len(starts), 4, 2), dtype=np.float32)
+    ctrl[:, 0] = s_px
+    ctrl[:, 1] = s_px + delta * 0.25 + offsets[:, 0]
+    ctrl[:, 2] = s_px + delta * 0.75 + offsets[:, 1]
+    ctrl[:, 3] = e_px
+    return ctrl / scale
+
+
+def human_paths(starts, ends, steps, screen_w, screen_h, rng=None):
+    """批量拟人轨迹 -> (N, steps+1, 2) float32 百分比坐标"""
+    return bezier_paths(human_controls(starts, ends, screen_w, screen_h, rng), steps)
+
+
+def to_hid(path, max_x=ABS_MAX, max_y=ABS_MAX, margin=10):
+    """
+    百分比轨迹 -> 绝对鼠标坐标 (含安全边距钳制), int16
+    与 InputDevice.mouse_move_to 的取整/钳制规则一致，结果可直接用于组帧
+    """
+    scale = np.array((max_x, max_y), dtype=np.float32)
+    hid = np.multiply(path, scale, dtype=np.float32)
+    np.maximum(hid, margin, out=hid)
+    np.minimum(hid, scale - margin, out=hid)
+    return hid.astype(np.int16)
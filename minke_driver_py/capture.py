@@ -0,0 +1,229 @@
+# ================= 低开销录制通道 =================
+# pynput 回调里只做一件事：把定长记录 pack 进预分配的环形缓冲区。
+# 后台线程按块取出 -> 转成列 -> 写盘 (.mkr 或 JSONL)，内存占用恒定。
+import json
+import struct
+import threading
+import time
+
+import numpy as np
+
+from record_format import RecordingWriter, EXTENSION, EVENT_CODES, ROW_DTYPE
+
+
+class CaptureRing:
+    """
+    定长记录环形缓冲区 (多生产者 / 单消费者)
+    记录布局与 .mkr 的列一致: t(int64 ms) e s x y k，共 16 字节
+    满了直接丢弃新事件并计数，绝不阻塞回调线程。
+    """
+    RECORD = struct.Struct('<qBBhhH')
+    DTYPE = ROW_DTYPE
+
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self._buf = bytearray(capacity * self.RECORD.size)
+        self._view = np.frombuffer(self._buf, dtype=self.DTYPE)
+        self._lock = threading.Lock()
+        self.head = 0      # 已写入总数
+        self.tail = 0      # 已取出总数
+        self.dropped = 0
+        self._last_t = 0
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def put(self, t, e, s, x, y, k):
+        # x / y 列是 int16: 超界坐标 (多屏、负坐标的副屏) 与浮点坐标截断到范围内，回调里不抛 struct.error
+        x = min(max(int(x), -32768), 32767)
+        y = min(max(int(y), -32768), 32767)
+        with self._lock:
+            if self.head - self.tail >= self.capacity:
+                self.dropped += 1
+                return False
+            # 鼠标/键盘两个监听线程并发写入，时间戳在锁内保证单调
+            if t < self._last_t:
+                t = self._last_t
+            self._last_t = t
+            self.RECORD.pack_into(self._buf, (self.head % self.capacity) * self.RECORD.size,
+                                  t, e, s, x, y, k)
+            self.head += 1
+            return True
+
+    def drain(self, max_n=None):
+        """取出积压的记录 -> 结构化数组 (拷贝)"""
+        with self._lock:
+            head = self.head
+        n = head - self.tail
+        if max_n is not None:
+            n = min(n, max_n)
+        if n <= 0:
+            return self._view[:0].copy()
+        start = self.tail % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            rows = self._view[start:end].copy()
+        else:
+            rows = np.concatenate([self._view[start:], self._view[:end - self.capacity]])
+        with self._lock:
+            self.tail += n
+        return rows
+
+
+class JsonlSink:
+    """把环形缓冲区的记录写成 JSONL (与旧格式兼容)"""
+    def __init__(self, filename):
+        self._f = open(filename, 'w', encoding='utf-8')
+        self.strings = []
+        self._string_ids = {}
+
+    def string_id(self, name):
+        sid = self._string_ids.get(name)
+        if sid is None:
+            sid = self._string_ids[name] = len(self.strings)
+            self.strings.append(name)
+        return sid
+
+    def write(self, rows):
+        strings = self.strings
+        lines = []
+        for t, e, s, x, y, k in rows.tolist():
+            if e == 1:
+                event = {"t": t, "e": "move", "x": x, "y": y}
+            elif e == 2:
+                event = {"t": t, "e": "click", "b": strings[k], "s": s}
+            elif e == 3:
+                event = {"t": t, "e": "scroll", "dy": y}
+            else:
+                event = {"t": t, "e": "key", "k": strings[k], "s": s}
+            lines.append(json.dumps(event) + "\n")
+        self._f.writelines(lines)
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+class MkrSink:
+    """把环形缓冲区的记录按块写成 .mkr"""
+    def __init__(self, filename, compression=None):
+        self.writer = RecordingWriter(filename, compression)
+
+    def string_id(self, name):
+        return self.writer.string_id(name)
+
+    def write(self, rows):
+        self.writer.append_columns(rows['t'], rows['e'], rows['s'], rows['x'], rows['y'], rows['k'])
+
+    def close(self):
+        self.writer.close()
+
+
+def open_sink(filename, compression=None):
+    if filename.endswith(EXTENSION):
+        return MkrSink(filename, compression)
+    return JsonlSink(filename)
+
+
+class StreamingCapture:
+    """
+    环形缓冲区 + 后台写盘线程
+
+    cap = StreamingCapture('actions.mkr')
+    cap.start()
+    cap.record('move', x=10, y=20)   # 在 pynput 回调里调用
+    cap.stop()
+
+    :param decimator: 可选的流式抽稀器 (decimate.MoveDecimator)，写盘前过滤 move 事件
+    """
+    def __init__(self, filename, ring_size=65536, flush_interval=0.5, chunk_size=8192,
+                 compression=None, decimator=None):
+        self.filename = filename
+        self.ring = CaptureRing(ring_size)
+        self.sink = open_sink(filename, compression)
+        self.flush_interval = flush_interval
+        self.chunk_size = chunk_size
+        self.decimator = decimator
+        self.start_time = None
+        self.written = 0
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = None
+        self._ids_lock = threading.Lock()
+
+        # 回调耗时统计 (ns)
+        self.cb_count = 0
+        self.cb_total_ns = 0
+        self.cb_max_ns = 0
+
+    def start(self):
+        self.start_time = time.perf_counter() * 1000
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name='minke-capture', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop = True
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        self.sink.close()
+
+    @property
+    def dropped(self):
+        return self.ring.dropped
+
+    def string_id(self, name):
+        with self._ids_lock:
+            return self.sink.string_id(name)
+
+    def record(self, event_type, x=0, y=0, s=0, name=None):
+        """
+        写入一条事件 (回调线程调用)
+        :param name: click 的按键名 / key 的键名
+        """
+        t_enter = time.perf_counter_ns()
+        t = int(t_enter / 1e6 - self.start_time)
+        k = self.string_id(name) if name is not None else 0
+        self.ring.put(t, EVENT_CODES[event_type], s, x, y, k)
+        if len(self.ring) >= self.chunk_size:
+            self._wake.set()
+
+        cost = time.perf_counter_ns() - t_enter
+        self.cb_count += 1
+        self.cb_total_ns += cost
+        if cost > self.cb_max_ns:
+            self.cb_max_ns = cost
+
+    def stats(self):
+        return {
+            'captured': self.ring.head,
+            'written': self.written,
+            'dropped': self.ring.dropped,
+            'backlog': len(self.ring),
+            'callback_avg_us': self.cb_total_ns / self.cb_count / 1000 if self.cb_count else 0.0,
+            'callback_max_us': self.cb_max_ns / 1000,
+        }
+
+    def _flush(self):
+        while True:
+            rows = self.ring.drain(self.chunk_size)
+            if not len(rows):
+                return
+            if self.decimator is not None:
+                rows = self.decimator.feed(rows)
+            self._write(rows)
+
+    def _write(self, rows):
+        if len(rows):
+            self.sink.write(rows)
+            self.written += len(rows)
+
+    def _run(self):
+        while not self._stop:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._flush()
+        self._flush()
+        if self.decimator is not None:
+            self._write(self.decimator.finish())
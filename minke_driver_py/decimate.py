@@ -0,0 +1,197 @@
+# ================= 鼠标移动抽稀 =================
+# 录制到的 move 事件频率往往远高于 HID 轮询率 (bInterval = 10ms)，回放时每个点一帧，
+# 串口带宽 (~1000 帧/秒) 和固件队列都被浪费。
+# 两步抽稀，只作用于连续的 move 段，点击/按键等事件原样保留，保留点的时间戳不变:
+#   1. 轮询合并: 同一个轮询周期内只保留最后一个位置
+#   2. RDP (Ramer–Douglas–Peucker): 去掉与前后点共线 (偏差 < tolerance 像素) 的中间点
+import argparse
+
+import numpy as np
+
+from capture import open_sink
+from hid_driver import HID_POLL_INTERVAL
+from record_format import ROW_DTYPE, Recording, encode_event, is_binary_recording, iter_jsonl
+
+MOVE = 1
+
+
+def rdp_mask(x, y, tolerance):
+    """RDP 折线简化 -> 保留点的布尔掩码 (首尾必保留)"""
+    n = len(x)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    if n < 3:
+        return keep
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        dx, dy = x[b] - x[a], y[b] - y[a]
+        px, py = x[a + 1:b] - x[a], y[a + 1:b] - y[a]
+        norm = np.hypot(dx, dy)
+        if norm == 0:
+            dist = np.hypot(px, py)
+        else:
+            dist = np.abs(px * dy - py * dx) / norm
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            m = a + 1 + i
+            keep[m] = True
+            stack.append((a, m))
+            stack.append((m, b))
+    return keep
+
+
+def poll_mask(t, poll_ms):
+    """同一轮询周期内只保留最后一个点 (段首点也保留，作为起点)"""
+    n = len(t)
+    keep = np.ones(n, dtype=bool)
+    if n < 2 or poll_ms <= 0:
+        return keep
+    bucket = np.asarray(t, dtype=np.int64) // poll_ms   # poll_ms 可为小数 (时间戳为整毫秒，同一毫秒内的点合并)
+    keep[:-1] = bucket[:-1] != bucket[1:]
+    keep[0] = True
+    return keep
+
+
+def decimate_run(t, x, y, poll_ms, tolerance):
+    """单段连续 move -> 保留点的布尔掩码"""
+    keep = poll_mask(t, poll_ms)
+    if tolerance > 0:
+        idx = np.flatnonzero(keep)
+        sub = rdp_mask(x[idx], y[idx], tolerance)
+        keep[:] = False
+        keep[idx[sub]] = True
+    return keep
+
+
+def decimate_rows(rows, poll_ms, tolerance):
+    """结构化记录数组 (ROW_DTYPE) -> 保留点的布尔掩码"""
+    e = rows['e']
+    keep = np.ones(len(rows), dtype=bool)
+    is_move = e == MOVE
+    if not is_move.any():
+        return keep
+    # 找出所有连续 move 段 [start, end)
+    edges = np.diff(np.concatenate(([0], is_move.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    t, x, y = rows['t'], rows['x'], rows['y']
+    for a, b in zip(starts.tolist(), ends.tolist()):
+        keep[a:b] = decimate_run(t[a:b], x[a:b], y[a:b], poll_ms, tolerance)
+    return keep
+
+
+class DecimationReport:
+    def __init__(self):
+        self.events_in = 0
+        self.events_out = 0
+        self.moves_in = 0
+        self.moves_out = 0
+
+    def add(self, rows, kept):
+        moves = rows['e'] == MOVE
+        self.events_in += len(rows)
+        self.events_out += len(kept)
+        self.moves_in += int(moves.sum())
+        self.moves_out += int((kept['e'] == MOVE).sum())
+
+    @property
+    def ratio(self):
+        """事件总数缩减倍数"""
+        return self.events_in / self.events_out if self.events_out else 0.0
+
+    def __str__(self):
+        move_ratio = self.moves_in / self.moves_out if self.moves_out else 0.0
+        return (f"事件 {self.events_in} -> {self.events_out} (x{self.ratio:.1f})，"
+                f"移动 {self.moves_in} -> {self.moves_out} (x{move_ratio:.1f})")
+
+
+class MoveDecimator:
+    """
+    流式抽稀 (用于录制时的写盘线程)
+    结尾未结束的 move 段先留着，等下一块数据或 finish() 时一起处理，避免在块边界多留点。
+    """
+    def __init__(self, poll_ms=HID_POLL_INTERVAL * 1000, tolerance=1.0, max_hold=16384):
+        # 整毫秒时用整数除法分桶 (快一个数量级)；小数不截断 (0.5 截成 0 会关掉合并)
+        self.poll_ms = int(poll_ms) if float(poll_ms).is_integer() else float(poll_ms)
+        self.tolerance = tolerance
+        self.max_hold = max_hold
+        self.report = DecimationReport()
+        self._held = np.empty(0, dtype=ROW_DTYPE)
+
+    def feed(self, rows):
+        rows = np.concatenate([self._held, rows]) if len(self._held) else rows
+        cut = len(rows)
+        non_move = np.flatnonzero(rows['e'] != MOVE)
+        tail_start = non_move[-1] + 1 if len(non_move) else 0
+        if tail_start < len(rows) and len(rows) - tail_start < self.max_hold:
+            cut = tail_start
+        self._held = rows[cut:].copy()
+        return self._process(rows[:cut])
+
+    def finish(self):
+        rows, self._held = self._held, np.empty(0, dtype=ROW_DTYPE)
+        return self._process(rows)
+
+    def _process(self, rows):
+        if not len(rows):
+            return rows
+        kept = rows[decimate_rows(rows, self.poll_ms, self.tolerance)]
+        self.report.add(rows, kept)
+        return kept
+
+
+def _read_chunks(filename, string_id, chunk=65536):
+    """录制文件 -> 结构化记录块 (键名统一映射到输出文件的字符串表)"""
+    if is_binary_recording(filename):
+        with Recording(filename) as rec:
+            remap = np.array([string_id(s) for s in rec.strings] or [0], dtype=np.uint16)
+            for i in range(len(rec.blocks)):
+                rows = rec.rows(i)
+                rows['k'] = remap[rows['k']]
+                yield rows
+    else:
+        buf = []
+        for event in iter_jsonl(filename):
+            buf.append(encode_event(event, string_id))
+            if len(buf) >= chunk:
+                yield np.array(buf, dtype=ROW_DTYPE)
+                buf = []
+        if buf:
+            yield np.array(buf, dtype=ROW_DTYPE)
+
+
+def decimate_file(src, dst, poll_ms=HID_POLL_INTERVAL * 1000, tolerance=1.0, compression=None):
+    """离线抽稀: src -> dst (格式由 dst 扩展名决定)，返回 DecimationReport"""
+    dec = MoveDecimator(poll_ms, tolerance)
+    sink = open_sink(dst, compression)
+    try:
+        for rows in _read_chunks(src, sink.string_id):
+            kept = dec.feed(rows)
+            if len(kept):
+                sink.write(kept)
+        kept = dec.finish()
+        if len(kept):
+            sink.write(kept)
+    finally:
+        sink.close()
+    return dec.report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="录制文件鼠标移动抽稀")
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    parser.add_argument("--poll-ms", type=float, default=HID_POLL_INTERVAL * 1000, help="轮询合并周期 (ms)")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="RDP 容差 (像素)")
+    parser.add_argument("--compression", choices=["none", "zstd", "lz4"], default="none")
+    args = parser.parse_args()
+
+    report = decimate_file(args.src, args.dst, args.poll_ms, args.tolerance, args.compression)
+    print(f"✅ 抽稀完成: {report}")
@@ -0,0 +1,385 @@
+# ================= 多设备池 =================
+# 一台控制机驱动几十块 Minke: 每块板子一个工作线程 (串口 I/O 与 sleep 都释放 GIL，线程足够)，
+# 从共享任务队列里取活，空闲的板子先拿到，负载自然均衡。
+#   - 打开: 所有端口并行连接 (就绪握手通常 0.1 秒左右，板子刚复位或不应答时最多等 READY_TIMEOUT 秒，
+#           并行打开时这些等待不会叠加)
+#   - 任务: fn(target, *args) 在某块板子上执行，target 为该板子的 HumanHID (或 factory 产物)
+#   - 掉线: 串口异常 / 端口从系统里消失时，板子标记为 lost，正在执行的任务整体换到别的板子重跑
+#           (最多 max_retries 次)；端口重新出现后自动重连并恢复接活
+#   - 健康与负载: stats() 给出每块板子的状态、完成数、失败数、重连次数与设备指标
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import serial
+from serial.tools import list_ports
+
+from hid_worker import CommandHandle
+from human_hid import HumanHID
+from metrics import prometheus_text
+from repalyer import ActionReplayer
+
+def discover_ports(vid=None, pid=None, match=None):
+    """
+    列出候选串口
+    :param vid, pid: 只保留指定 USB VID / PID 的端口
+    :param match: 端口描述 / 硬件 ID / 设备名中需要包含的子串
+    :return: 设备名列表 (如 ['COM3', 'COM4'] 或 ['/dev/ttyUSB0', ...])
+    """
+    ports = []
+    for p in list_ports.comports():
+        if p.vid is None:
+            continue   # 主板自带串口等非 USB 设备
+        if vid is not None and p.vid != vid:
+            continue
+        if pid is not None and p.pid != pid:
+            continue
+        if match and not any(match in (s or '') for s in (p.device, p.description, p.hwid)):
+            continue
+        ports.append(p.device)
+    return sorted(ports)
+
+
+def _present_ports():
+    return {p.device for p in list_ports.comports()}
+
+
+def _is_disconnect(exc):
+    """串口断开 (拔线 / 板子复位) 与脚本自身的错误区分开"""
+    return isinstance(exc, (serial.SerialException, OSError))
+
+
+class PoolJob(CommandHandle):
+    """池任务句柄: 在哪块板子上执行、重试了几次"""
+    def __init__(self, fn, args, kwargs, board=None):
+        super().__init__(getattr(fn, '__name__', 'job'))
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.pinned = board     # 指定板子 (端口名)，None 表示任意
+        self.board = None       # 最后一次执行所在的板子
+        self.attempts = 0
+
+
+class Board:
+    """池中的一块板子"""
+    IDLE, BUSY, LOST, CLOSED = 'idle', 'busy', 'lost', 'closed'
+
+    def __init__(self, port, target):
+        self.port = port
+        self.target = target
+        self.state = Board.LOST
+        self.queue = deque()    # 指定到本板的任务
+        self.current = None
+        self.completed = 0
+        self.failed = 0
+        self.lost_count = 0
+        self.busy_time = 0.0
+        self.last_error = None
+        self.thread = None
+
+    @property
+    def healthy(self):
+        return self.state in (Board.IDLE, Board.BUSY)
+
+    @property
+    def device(self):
+        return getattr(self.target, 'device', self.target)
+
+    def stats(self):
+        return {
+            'port': self.port,
+            'state': self.state,
+            'running': self.current.name if self.current else None,
+            'pinned_queued': len(self.queue),
+            'completed': self.completed,
+            'failed': self.failed,
+            'lost': self.lost_count,
+            'busy_time': self.busy_time,
+            'last_error': repr(self.last_error) if self.last_error else None,
+            'metrics': self.device.metrics.snapshot()['counters'],
+        }
+
+
+class DevicePool:
+    """
+    多设备池
+
+    with DevicePool(discover_ports(vid=0x1A86)) as pool:   # 0x1A86: CH340 串口模块
+        jobs = [pool.submit(lambda bot, x: bot.click_at(x, 0.5), x) for x in (0.1, 0.2, 0.3)]
+        pool.replay('actions.mkr')                  # 任意一块空闲的板子
+        pool.broadcast(lambda bot: bot.type("hi"))  # 每块板子各一次
+        pool.join()
+        print(pool.stats())
+
+    :param ports: 端口列表；None 时调用 discover_ports(**discover)
+    :param factory: 每个端口创建执行对象的工厂 factory(port, **kwargs)，默认 HumanHID
+    :param max_retries: 板子掉线时任务换板重跑的次数上限
+    :param monitor_interval: 检查端口存在 / 尝试重连的间隔 (秒)，None 关闭
+    """
+    def __init__(self, ports=None, factory=HumanHID, max_retries=2, monitor_interval=1.0,
+                 discover=None, **factory_kwargs):
+        if ports is None:
+            ports = discover_ports(**(discover or {}))
+        self.boards = [Board(port, factory(port, **factory_kwargs)) for port in ports]
+        self.max_retries = max_retries
+        self.monitor_interval = monitor_interval
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._monitor = None
+        self.submitted = 0
+        self.failovers = 0
+
+    # ---------- 生命周期 ----------
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(cancel_pending=exc_type is not None)
+
+    def open(self):
+        """并行连接所有端口，至少一块成功才返回"""
+        with ThreadPoolExecutor(max_workers=max(1, len(self.boards))) as ex:
+            list(ex.map(self._connect, self.boards))
+        if not any(b.healthy for b in self.boards):
+            raise RuntimeError(f"没有可用的设备: {[b.port for b in self.boards]}")
+        for b in self.boards:
+            b.thread = threading.Thread(target=self._run, args=(b,), name=f'minke-pool-{b.port}',
+                                        daemon=True)
+            b.thread.start()
+        if self.monitor_interval:
+            self._monitor = threading.Thread(target=self._watch, name='minke-pool-monitor', daemon=True)
+            self._monitor.start()
+        return self
+
+    def close(self, cancel_pending=False):
+        """
+        停止所有工作线程并断开设备
+        :param cancel_pending: True 时取消排队中的任务；否则先执行完
+        """
+        if cancel_pending:
+            self.cancel_all()
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        for b in self.boards:
+            if b.thread:
+                b.thread.join()
+        if self._monitor:
+            self._monitor.join()
+        self.cancel_all()   # 所有板子都掉线时共享队列里剩下的任务
+        for b in self.boards:
+            if b.healthy:
+                try:
+                    b.device.close()
+                except Exception:
+                    pass
+            b.state = Board.CLOSED
+
+    def _connect(self, board):
+        try:
+            board.device.connect()
+        except Exception as e:
+            board.last_error = e
+            board.state = Board.LOST
+            return False
+        with self._cond:
+            board.state = Board.IDLE
+            self._cond.notify_all()
+        return True
+
+    # ---------- 提交 ----------
+    def submit(self, fn, *args, board=None, **kwargs):
+        """
+        提交任务 fn(target, *args, **kwargs)
+        :param board: 指定端口执行 (该板掉线时任务失败，不换板)
+        :return: PoolJob (Future)
+        """
+        job = PoolJob(fn, args, kwargs, board)
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("DevicePool 已关闭")
+            if board is None:
+                self._queue.append(job)
+            elif self._board(board).healthy:
+                self._board(board).queue.append(job)
+            else:
+                job.set_running_or_notify_cancel()
+                job.set_exception(serial.SerialException(f"{board} 不可用"))
+                return job
+            self.submitted += 1
+            self._cond.notify_all()
+        return job
+
+    def map(self, fn, items):
+        """每个元素一个任务 fn(target, item)"""
+        return [self.submit(fn, item) for item in items]
+
+    def broadcast(self, fn, *args, **kwargs):
+        """在每块健康的板子上各执行一次"""
+        return [self.submit(fn, *args, board=b.port, **kwargs) for b in self.boards if b.healthy]
+
+    def replay(self, filename, screen_res=(1920, 1080), speed=1.0, start_ms=None, end_ms=None,
+               board=None):
+        """在一块板子上回放录制文件 (计时方式跟随该板设备的 device_timed)"""
+        def replay(target):
+            player = ActionReplayer(target.device.port, screen_res, target.device.device_timed)
+            return player.replay(target, filename, speed, start_ms, end_ms)
+        return self.submit(replay, board=board)
+
+    def cancel_all(self):
+        with self._cond:
+            jobs = list(self._queue)
+            self._queue.clear()
+            for b in self.boards:
+                jobs.extend(b.queue)
+                b.queue.clear()
+            self._cond.notify_all()
+        return sum(1 for job in jobs if job.cancel())
+
+    def join(self, timeout=None):
+        """等待所有任务执行完 (包括换板重跑)"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending(), timeout)
+
+    def _pending(self):
+        if any(b.healthy and (b.queue or b.current) for b in self.boards):
+            return True
+        return bool(self._queue) and any(b.healthy for b in self.boards)
+
+    def _board(self, port):
+        for b in self.boards:
+            if b.port == port:
+                return b
+        raise KeyError(port)
+
+    # ---------- 工作线程 ----------
+    def _next_job(self, board):
+        """在锁内调用: 本板指定任务优先，其次共享队列"""
+        if board.state != Board.IDLE:
+            return None
+        if board.queue:
+            return board.queue.popleft()
+        if self._queue:
+            return self._queue.popleft()
+        return None
+
+    def _run(self, board):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closing or self._next_job_ready(board))
+                job = self._next_job(board)
+                if job is None:
+                    return   # 正在关闭且没有活了
+                board.state = Board.BUSY
+                board.current = job
+
+            if job.attempts == 0 and not job.set_running_or_notify_cancel():
+                self._finish(board)
+                continue
+            job.attempts += 1
+            job.board = board.port
+            job.started_at = time.perf_counter()
+            try:
+                result = job.fn(board.target, *job.args, **job.kwargs)
+            except BaseException as e:
+                if _is_disconnect(e):
+                    self._lost(board, e, job)
+                    continue
+                board.failed += 1
+                job.finished_at = time.perf_counter()
+                job.set_exception(e)
+            else:
+                board.completed += 1
+                job.finished_at = time.perf_counter()
+                job.set_result(result)
+            board.busy_time += job.finished_at - job.started_at
+            self._finish(board)
+
+    def _next_job_ready(self, board):
+        return board.state == Board.IDLE and (board.queue or self._queue)
+
+    def _finish(self, board):
+        with self._cond:
+            board.current = None
+            if board.state == Board.BUSY:
+                board.state = Board.IDLE
+            self._cond.notify_all()
+
+    def _lost(self, board, exc, job=None):
+        """
+        板子掉线: 关闭串口，指定到本板的任务失败
+        job 为掉线时正在执行的任务: 未指定板子且未超过重试次数时放回队首换板重跑
+        (监控线程先发现掉线时，工作线程随后带着 job 再调用一次)
+        """
+        failed = []
+        with self._cond:
+            first = board.healthy
+            if first:
+                board.state = Board.LOST
+                board.lost_count += 1
+                board.last_error = exc
+                failed = list(board.queue)
+                board.queue.clear()
+            if job is not None:
+                board.current = None
+                if job.pinned is None and job.attempts <= self.max_retries:
+                    self._queue.appendleft(job)
+                    self.failovers += 1
+                    job = None
+            self._cond.notify_all()
+        if first:
+            try:
+                board.device.ser.close()
+            except Exception:
+                pass
+            print(f"⚠️ 设备 {board.port} 掉线: {exc}")
+
+        for j in failed:
+            if j.set_running_or_notify_cancel():
+                j.set_exception(exc)
+        if job is not None:
+            job.finished_at = time.perf_counter()
+            job.set_exception(exc)
+
+    # ---------- 健康检查 ----------
+    def _watch(self):
+        while True:
+            with self._cond:
+                if self._cond.wait_for(lambda: self._closing, self.monitor_interval):
+                    return
+            try:
+                present = _present_ports()
+            except Exception:
+                continue
+            for b in self.boards:
+                is_url = '://' in b.port
+                if b.healthy and not is_url and b.port not in present:
+                    self._lost(b, serial.SerialException(f"{b.port} 已从系统中移除"))
+                elif b.state == Board.LOST and (is_url or b.port in present) and not self._closing:
+                    if self._connect(b):
+                        print(f"🔌 设备 {b.port} 已重新连接")
+
+    # ---------- 统计 ----------
+    def stats(self):
+        boards = [b.stats() for b in self.boards]
+        return {
+            'boards': boards,
+            'healthy': sum(1 for b in self.boards if b.healthy),
+            'queued': len(self._queue),
+            'submitted': self.submitted,
+            'completed': sum(b.completed for b in self.boards),
+            'failed': sum(b.failed for b in self.boards),
+            'failovers': self.failovers,
+        }
+
+    def metrics(self):
+        """所有板子的设备指标 (可直接交给 MetricsServer)"""
+        return [b.device.metrics for b in self.boards]
+
+    def prometheus(self):
+        return prometheus_text(self.metrics())
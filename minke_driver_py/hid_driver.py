@@ -1,6 +1,16 @@
 import serial
+import math
+import random
+import threading
 import time
 import struct
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from metrics import Metrics, timed
+from scheduler import Scheduler
 
 # ================= 1. 基础键值表 =================
 HID_KEY_MAP = {
@@ -43,11 +53,772 @@ MODIFIERS = {
 
 MOUSE_BTNS = {'left': 0x01, 'right': 0x02, 'middle': 0x04}
 
+# ================= 4. 协议与固件参数 =================
+FRAME_HEAD = 0xAA
+FRAME_TAIL = 0x55
+FRAME_LEN = 11
+
+EVENT_QUEUE_SIZE = 64       # 固件事件队列深度 (main.c: EVENT_QUEUE_SIZE)
+HID_POLL_INTERVAL = 0.010   # HID 端点轮询间隔 (usb_descriptors.c: bInterval = 10ms)
+FIRMWARE_TICK_MS = 10       # FreeRTOS 滴答 (sdkconfig: CONFIG_FREERTOS_HZ=100)
+WATCHDOG_TIMEOUT_MS = 3000  # 固件看门狗 (main.c: WATCHDOG_TIMEOUT_MS)
+MAX_FRAME_DELAY_MS = 2000   # 单帧最大延迟 (更长的拆到心跳帧上)，留足余量避免触发看门狗
+
+EVENT_TYPE_KEYBOARD = 0x01
+EVENT_TYPE_MOUSE_REL = 0x02
+EVENT_TYPE_MOUSE_ABS = 0x03
+EVENT_TYPE_SYSTEM = 0x04
+SYS_CMD_HEARTBEAT = 0xFF
+SYS_CMD_PROTOCOL = 0x20     # 协议版本协商 (v1 帧): [0x20, 最高版本, nonce]，应答 Buf[5] = PROTOCOL_ACK
+PROTOCOL_ACK = 0x01
+
+# v2 变长记录 (uart_protocol.h): [SYNC][LEN][TYPE][delay_ms 可选][载荷][CRC8]
+FRAME2_SYNC = 0xA5
+FRAME2_MAX_BODY = 255       # LEN 上限 (TYPE + delay + 载荷)
+REC_FLAG_DELAY = 0x80       # TYPE 最高位: 后跟 u16 delay_ms
+REC_TYPE_MASK = 0x3F
+REC_REL_BURST = 0x12        # [Buttons, Step_ms, (dx, dy) * N]
+REC_ABS_BURST = 0x13        # [Buttons, Step_ms, X, Y, (dx, dy) * N]，首点之后为 12 位差分 (每点 3 字节)
+ABS_DELTA_MAX = 2047
+MAX_BURST = 32              # 单条突发记录的事件数上限
+REC_MAX_BODY = 1 + 2 + 6 + 3 * (MAX_BURST - 1)   # 合法记录的最大 LEN (带延迟的满 ABS 突发)，更大的 LEN 必是错位
+PROTOCOL_VERSION = 2
+NEGOTIATE_TIMEOUT = 0.1     # 协商应答超时 (秒)，超时按 v1
+
+READY_TIMEOUT = 2.0         # 握手超时 (秒)，超时后照常放行，等价于原来的固定等待
+KEEPALIVE_INTERVAL = 1.0    # 有键/鼠标按钮按住时，线路空闲超过该秒数就补一帧心跳 (看门狗 3 秒)
+RECONNECT_TIMEOUT = 5.0     # 串口断开后自动重连的最长时间 (秒)
+BOOT_MARKERS = (b'UART Listening', b'System Ready')   # 固件启动日志 (与控制串口同为 UART0)
+
+_FRAME = struct.Struct('<BBBBBBBBHB')
+_FRAME_TAIL = struct.Struct('<HB')   # 预编译帧前缀之后的 delay_ms + 帧尾
+
+# 11 字节帧的结构化视图 (同一块内存可按需用三种字段解释)
+FRAME_DTYPE = np.dtype([('head', 'u1'), ('type', 'u1'), ('args', 'u1', (6,)),
+                        ('delay', '<u2'), ('tail', 'u1')])
+MOUSE_FRAME_DTYPE = np.dtype([('head', 'u1'), ('type', 'u1'), ('buttons', 'u1'), ('wheel', 'i1'),
+                              ('x', '<i2'), ('y', '<i2'), ('delay', '<u2'), ('tail', 'u1')])
+KEY_FRAME_DTYPE = np.dtype([('head', 'u1'), ('type', 'u1'), ('code', 'u1'), ('flags', 'u1'),
+                            ('mod', 'u1'), ('pad', 'u1', (3,)), ('delay', '<u2'), ('tail', 'u1')])
+
+# 键盘布局: 名称 -> (键值表, 需要 Shift 的符号表)
+KEYBOARD_LAYOUTS = {'us': (HID_KEY_MAP, SHIFT_SYMBOLS)}
+TEXT_KEYS = {'\n': 'enter', '\t': 'tab'}
+
+
+def resolve_key(key, modifiers=()):
+    """键名 + 修饰键列表 -> (HID 键值, 修饰键掩码)"""
+    key = str(key).lower()
+    mod_mask = 0
+    for m in modifiers:
+        mod_mask |= MODIFIERS.get(m.lower(), 0)
+
+    if key in MODIFIERS:
+        mod_mask |= MODIFIERS[key]
+        code = 0
+    else:
+        code = HID_KEY_MAP.get(key, 0)
+    return code, mod_mask
+
+
+def split_hotkey(args):
+    """
+    组合键拆分: 最后一个普通键为目标键，其余修饰键一起按下
+    只有修饰键时 (如 hotkey('ctrl', 'shift'))，最后一个修饰键作为目标
+    :return: (target, modifiers)，没有可按的键时 target 为 None
+    """
+    mods = []
+    keys = []
+    for k in args:
+        k = str(k).lower()
+        if k in MODIFIERS:
+            mods.append(k)
+        else:
+            keys.append(k)
+
+    if keys:
+        return keys[-1], mods
+    if mods:
+        return mods[-1], mods[:-1]
+    return None, []
+
+
+def encode_frame(type, b2, b3, b4, b5, b6, b7, delay_ms=0):
+    """打包一帧 11 字节协议数据"""
+    return _FRAME.pack(FRAME_HEAD, type, b2, b3, b4, b5, b6, b7, delay_ms, FRAME_TAIL)
+
+
+def heartbeat_frame(nonce=0):
+    """心跳帧 (刷新固件看门狗)；nonce 放在 data 字节里，用于识别握手回显"""
+    return encode_frame(EVENT_TYPE_SYSTEM, SYS_CMD_HEARTBEAT, nonce, 0, 0, 0, 0)
+
+
+def protocol_frame(version, nonce=0):
+    """协议协商帧 (v1 格式，旧固件当作未知系统指令忽略)"""
+    return encode_frame(EVENT_TYPE_SYSTEM, SYS_CMD_PROTOCOL, version, nonce, 0, 0, 0)
+
+
+def _crc8_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+_CRC8_TABLE = _crc8_table()
+
+
+def crc8(data):
+    """CRC-8 (多项式 0x07，初值 0)，与 uart_protocol.c: crc8 一致"""
+    crc = 0
+    table = _CRC8_TABLE
+    for b in data:
+        crc = table[crc ^ b]
+    return crc
+
+
+def encode_record(type, payload, delay_ms=0):
+    """打包一条 v2 记录 (delay_ms 为 0 时省略延迟字段)"""
+    if delay_ms:
+        body = bytes((0, type | REC_FLAG_DELAY, delay_ms & 0xFF, delay_ms >> 8)) + payload
+    else:
+        body = bytes((0, type)) + payload
+    body = bytearray(body)
+    body[0] = len(body) - 1
+    return bytes((FRAME2_SYNC,)) + body + bytes((crc8(body),))
+
+
+class ProtocolProbe:
+    """
+    协议版本协商 (同步 / 异步共用，由调用方负责收发)
+    固件回复 [0x20, 版本, nonce, PROTOCOL_ACK]；没有应答 (旧固件) 或超时 -> v1
+    """
+    def __init__(self, version=PROTOCOL_VERSION, timeout=NEGOTIATE_TIMEOUT):
+        nonce = random.randrange(256)
+        self.frame = protocol_frame(version, nonce)
+        # 应答帧 -> 版本 (串口回环原样送回的请求没有应答标记，不会误判)
+        self.replies = {encode_frame(EVENT_TYPE_SYSTEM, SYS_CMD_PROTOCOL, v, nonce, PROTOCOL_ACK, 0, 0): v
+                        for v in range(1, version + 1)}
+        self.buf = bytearray()
+        self.deadline = time.perf_counter() + timeout
+
+    def feed(self, data, now):
+        """喂入收到的字节，得出结果时返回协议版本，否则 None"""
+        if data:
+            self.buf += data
+            for reply, version in self.replies.items():
+                if reply in self.buf:
+                    return version
+            del self.buf[:-FRAME_LEN]
+        if now >= self.deadline:
+            return 1
+        return None
+
+
+class ReadyProbe:
+    """
+    连接就绪握手 (同步 / 异步共用的状态机，由调用方负责收发)
+    打开串口后反复发心跳帧:
+      - 固件回显心跳帧                      -> 'ack'   (UART 解析已在运行)
+      - 旧固件不回显，但线路上出现启动日志  -> 'log'   (打开串口触发了复位，已启动完)
+      - quiet 秒内线路上什么都没有          -> 'quiet' (板子没有复位，早已在运行)
+      - 以上都没有                          -> 'timeout' (超时后照常放行)
+    """
+    def __init__(self, timeout=READY_TIMEOUT, quiet=0.3, probe_interval=0.05):
+        self.timeout = timeout
+        self.quiet = quiet
+        self.probe_interval = probe_interval
+        self.frame = heartbeat_frame(random.randrange(256))
+        self.buf = bytearray()
+        self.start = time.perf_counter()
+        self._next_probe = self.start
+
+    def probe(self, now):
+        """到了发心跳的时候返回心跳帧，否则 None"""
+        if now < self._next_probe:
+            return None
+        self._next_probe = now + self.probe_interval
+        return self.frame
+
+    def feed(self, data, now):
+        """喂入收到的字节，就绪时返回原因，否则 None"""
+        if data:
+            self.buf += data
+            if self.frame in self.buf:
+                return 'ack'
+            if any(m in self.buf for m in BOOT_MARKERS):
+                return 'log'
+            del self.buf[:-64]   # 只需保留能跨块匹配的尾部
+        elapsed = now - self.start
+        if not self.buf and elapsed >= self.quiet:
+            return 'quiet'
+        if elapsed >= self.timeout:
+            return 'timeout'
+        return None
+
+
+class FrameEncoder:
+    """
+    批量帧编码器
+    所有帧直接写进一块预分配的结构化数组 (FRAME_DTYPE，与 11 字节帧逐字节对应)，
+    不再逐帧 struct.pack / 拼 bytes；返回的 memoryview 可以直接交给 ser.write。
+    注意: 返回的视图指向内部缓冲区，下一次编码会覆盖，需要保留时请自行拷贝。
+
+    enc = FrameEncoder()
+    ser.write(enc.mouse_abs(xs, ys, delay_ms=10))
+    """
+    def __init__(self, capacity=1024):
+        self._raw = np.zeros(capacity, dtype=FRAME_DTYPE)
+
+    def frames(self, n):
+        """取 n 帧的结构化视图 (帧头帧尾已填好，其余字段清零)，调用方直接填字段"""
+        if n > len(self._raw):
+            self._raw = np.zeros(max(n, 2 * len(self._raw)), dtype=FRAME_DTYPE)
+        f = self._raw[:n]
+        f.view(np.uint8)[:] = 0
+        f['head'] = FRAME_HEAD
+        f['tail'] = FRAME_TAIL
+        return f
+
+    @staticmethod
+    def view(frames):
+        """结构化帧数组 -> 字节 memoryview (零拷贝)"""
+        return memoryview(frames.view(np.uint8))
+
+    def encode(self, type, args, delay_ms=0):
+        """通用编码: type 与 delay_ms 可为标量或数组，args 为 (n, 6)"""
+        args = np.asarray(args, dtype=np.uint8).reshape(-1, 6)
+        f = self.frames(len(args))
+        f['type'] = type
+        f['args'] = args
+        f['delay'] = delay_ms
+        return self.view(f)
+
+    def mouse_abs(self, x, y, delay_ms=0, buttons=0):
+        """绝对移动 (HID 坐标 0 ~ 32767)"""
+        x, y = np.broadcast_arrays(x, y)
+        f = self.frames(x.size)
+        m = f.view(MOUSE_FRAME_DTYPE)
+        m['type'] = EVENT_TYPE_MOUSE_ABS
+        m['buttons'] = buttons
+        m['x'] = x.ravel()
+        m['y'] = y.ravel()
+        m['delay'] = delay_ms
+        return self.view(f)
+
+    def mouse_rel(self, x, y, wheel=0, delay_ms=0, buttons=0):
+        """相对移动 (每帧 ±127 以内，拆分见 RelativeEncoder)"""
+        x, y = np.broadcast_arrays(x, y)
+        f = self.frames(x.size)
+        m = f.view(MOUSE_FRAME_DTYPE)
+        m['type'] = EVENT_TYPE_MOUSE_REL
+        m['buttons'] = buttons
+        m['wheel'] = wheel
+        m['x'] = x.ravel()
+        m['y'] = y.ravel()
+        m['delay'] = delay_ms
+        return self.view(f)
+
+    def keyboard(self, code, flags=0, mod=0, delay_ms=0):
+        """键盘帧 (flags 0x80 = 抬起)"""
+        code = np.atleast_1d(code)
+        f = self.frames(code.size)
+        kf = f.view(KEY_FRAME_DTYPE)
+        kf['type'] = EVENT_TYPE_KEYBOARD
+        kf['code'] = code.ravel()
+        kf['flags'] = flags
+        kf['mod'] = mod
+        kf['delay'] = delay_ms
+        return self.view(f)
+
+
+class KeystrokeCompiler:
+    """
+    按键帧预编译
+    每个字符的按下帧只编码一次 (帧前 8 字节，不含 delay_ms 与帧尾) 并按布局缓存；
+    整段文本编译成 [(帧前缀, delay_ms), ...]，按键节奏写进 delay_ms 由固件执行，
+    上位机一次 write 发出，不再逐字符查表、拼修饰键、sleep。
+    """
+    _compilers = {}
+    RELEASE = _FRAME.pack(FRAME_HEAD, EVENT_TYPE_KEYBOARD, 0, 0x80, 0, 0, 0, 0, 0, FRAME_TAIL)[:8]
+
+    @classmethod
+    def for_layout(cls, layout='us'):
+        """同一布局共享一份编译表"""
+        compiler = cls._compilers.get(layout)
+        if compiler is None:
+            compiler = cls._compilers[layout] = cls(layout)
+        return compiler
+
+    def __init__(self, layout='us'):
+        self.layout = layout
+        self.key_map, self.shift_map = KEYBOARD_LAYOUTS[layout]
+        self._table = {}
+
+    def keystroke(self, char):
+        """字符 -> 按下帧前缀 (不可输入的字符返回 None)"""
+        try:
+            return self._table[char]
+        except KeyError:
+            pass
+        if char in self.shift_map:
+            code, mod = self.key_map.get(self.shift_map[char], 0), MODIFIERS['shift']
+        else:
+            code, mod = self.key_map.get(TEXT_KEYS.get(char, char), 0), 0
+        down = _FRAME.pack(FRAME_HEAD, EVENT_TYPE_KEYBOARD, code, 0, mod, 0, 0, 0, 0, FRAME_TAIL)[:8] if code else None
+        self._table[char] = down
+        return down
+
+    def compile(self, text, hold_ms=50, gap_ms=50, fast=False):
+        """
+        文本 -> ([(帧前缀, delay_ms), ...], 末尾剩余等待毫秒)
+        :param hold_ms: 按下到抬起的时长
+        :param gap_ms: 每个字符抬起后的间隔，数字或与 text 等长的序列
+        :param fast: 批量录入，不加任何等待；相邻不同键省略抬起帧 (键盘报告直接切换到下一个键)，
+                     速度只受串口与 HID 轮询限制
+        """
+        frames = []
+        release = self.RELEASE
+        if fast:
+            prev = None
+            for char in text:
+                down = self.keystroke(char)
+                if down is None:
+                    continue
+                if prev is not None and down[2] == prev[2]:
+                    # 同一个键 (只看键码，修饰键不同也算，如 'aA'、'1!') 必须先抬起才能再次触发
+                    frames.append((release, 0))
+                frames.append((down, 0))
+                prev = down
+            if prev is not None:
+                frames.append((release, 0))
+            return frames, 0
+
+        gaps = [gap_ms] * len(text) if isinstance(gap_ms, (int, float)) else gap_ms
+        before = 0
+        for char, gap in zip(text, gaps):
+            down = self.keystroke(char)
+            if down is not None:
+                frames.append((down, before))
+                frames.append((release, hold_ms))
+                before = 0
+            before += gap
+        return frames, before
+
+
+class RelativeEncoder:
+    """
+    相对移动编码器
+    - X / Y / 滚轮合并进同一帧 (帧里本来就有三个字段)，斜向移动不再先 X 后 Y 走成 L 形
+    - 超出单帧 ±127 时按最长轴分成 n 段，沿向量均匀分布
+    - 取整后的小数余量留到下一次调用，浮点增量 (瞄准/跟踪) 长时间累积也不漂移
+    """
+    MAX_STEP = 127
+
+    def __init__(self):
+        self.rem_x = 0.0
+        self.rem_y = 0.0
+        self.rem_wheel = 0.0
+
+    def reset(self):
+        self.rem_x = self.rem_y = self.rem_wheel = 0.0
+
+    def steps(self, dx, dy, wheel=0):
+        """(dx, dy, wheel) -> [(x, y, wheel), ...] 每步都在 ±127 以内"""
+        fx, fy, fw = dx + self.rem_x, dy + self.rem_y, wheel + self.rem_wheel
+        ix, iy, iw = round(fx), round(fy), round(fw)
+        self.rem_x, self.rem_y, self.rem_wheel = fx - ix, fy - iy, fw - iw
+
+        n = math.ceil(max(abs(ix), abs(iy), abs(iw)) / self.MAX_STEP)
+        if n <= 1:
+            return [(ix, iy, iw)] if (ix or iy or iw) else []
+        # 第 i 段 = floor(总量*(i+1)/n) - floor(总量*i/n)，各段相差不超过 1，总和严格等于总量
+        return [(ix * (i + 1) // n - ix * i // n,
+                 iy * (i + 1) // n - iy * i // n,
+                 iw * (i + 1) // n - iw * i // n) for i in range(n)]
+
+
+class RecordEncoder:
+    """
+    v2 变长记录编码器
+    - 单帧: 去掉帧头帧尾与空字段，delay_ms 为 0 时不占字节 (键盘 6 字节，绝对移动 8 字节)
+    - 连续的同类鼠标帧 (同按钮、无滚轮、间隔 delay 相同且 ≤255ms) 合并成突发记录:
+      相对移动每次 2 字节 (int8 位移)，绝对移动存首点 + 相邻点的 12 位差分 (每点 3 字节)
+    - 位移 / 差分超出范围时断开，另起一条记录
+    固件把突发记录展开成逐个事件入队，报告节奏与逐帧发送完全一致。
+    """
+    def __init__(self, max_burst=MAX_BURST):
+        self.max_burst = max_burst
+
+    @staticmethod
+    def small_rel(b3, b4, b5, b6, b7):
+        """相对移动帧字段 -> 能放进突发记录时返回 (x, y)，否则 None (有滚轮或超出 int8)"""
+        if b3:
+            return None
+        x = b4 | (b5 << 8)
+        y = b6 | (b7 << 8)
+        x -= (x & 0x8000) << 1
+        y -= (y & 0x8000) << 1
+        if -127 <= x <= 127 and -127 <= y <= 127:
+            return x, y
+        return None
+
+    @staticmethod
+    def record(type, b2, b3, b4, b5, b6, b7, delay_ms=0):
+        """v1 帧字段 -> 一条 v2 记录"""
+        if type == EVENT_TYPE_KEYBOARD:
+            payload = bytes((b2, b3, b4))
+        elif type == EVENT_TYPE_MOUSE_ABS:
+            payload = bytes((b2, b4, b5, b6, b7))
+        elif type == EVENT_TYPE_MOUSE_REL:
+            if RecordEncoder.small_rel(b3, b4, b5, b6, b7):
+                return encode_record(REC_REL_BURST, bytes((b2, 0, b4, b6)), delay_ms)
+            payload = bytes((b2, b3, b4, b5, b6, b7))
+        else:
+            payload = bytes((b2, b3))
+        return encode_record(type, payload, delay_ms)
+
+    @staticmethod
+    def _pack12(dx, dy):
+        """两组 12 位有符号差分交错打包，每点 3 字节 (见 uart_protocol.h: ABS_BURST)"""
+        dx = dx & 0xFFF
+        dy = dy & 0xFFF
+        out = np.empty((len(dx), 3), dtype=np.uint8)
+        out[:, 0] = dx & 0xFF
+        out[:, 1] = (dx >> 8) | ((dy & 0x0F) << 4)
+        out[:, 2] = dy >> 4
+        return out.tobytes()
+
+    def pack(self, frames, delays):
+        """
+        FRAME_DTYPE 帧数组 + 每帧 delay_ms -> (记录字节, 每个事件的字节数, 每个事件的 delay_ms)
+        字节数按事件记: 记录的第一个事件计整条记录长度，同一记录的后续事件计 0 (见 FrameTransmitter)
+        """
+        n = len(frames)
+        m = frames.view(MOUSE_FRAME_DTYPE)
+        t = m['type']
+        b = m['buttons']
+        x = m['x'].astype(np.int32)
+        y = m['y'].astype(np.int32)
+        d = np.asarray(delays, dtype=np.int64)
+
+        rel = (t == EVENT_TYPE_MOUSE_REL) & (m['wheel'] == 0) & (np.abs(x) <= 127) & (np.abs(y) <= 127)
+        dx = np.diff(x, prepend=x[:1])
+        dy = np.diff(y, prepend=y[:1])
+        absd = (t == EVENT_TYPE_MOUSE_ABS) & (np.abs(dx) <= ABS_DELTA_MAX) & (np.abs(dy) <= ABS_DELTA_MAX)
+        # follow[i]: 帧 i 可以接在帧 i-1 所在的突发记录后面
+        follow = np.zeros(n, dtype=bool)
+        follow[1:] = ((t[1:] == t[:-1]) & (b[1:] == b[:-1]) & (d[1:] <= 0xFF)
+                      & ((rel[1:] & rel[:-1]) | (absd[1:] & (t[:-1] == EVENT_TYPE_MOUSE_ABS))))
+        # 第二个及以后的后续帧还要求 delay 与前一帧相同 (一条记录只有一个 Step_ms)
+        steady = np.zeros(n, dtype=bool)
+        steady[2:] = d[2:] == d[1:-1]
+
+        follow_l, steady_l, d_l = follow.tolist(), steady.tolist(), d.tolist()
+        out = bytearray()
+        sizes = []
+        i = 0
+        while i < n:
+            j = i + 1
+            if j < n and follow_l[j]:
+                j += 1
+                limit = min(n, i + self.max_burst)
+                while j < limit and follow_l[j] and steady_l[j]:
+                    j += 1
+            if j - i > 1 or rel[i]:
+                step = d_l[i + 1] if j - i > 1 else 0
+                if t[i] == EVENT_TYPE_MOUSE_REL:
+                    payload = bytes((int(b[i]), step)) + np.column_stack((x[i:j], y[i:j])).astype(np.int8).tobytes()
+                    rec = encode_record(REC_REL_BURST, payload, d_l[i])
+                else:
+                    payload = (bytes((int(b[i]), step)) + struct.pack('<HH', x[i] & 0xFFFF, y[i] & 0xFFFF)
+                               + self._pack12(dx[i + 1:j], dy[i + 1:j]))
+                    rec = encode_record(REC_ABS_BURST, payload, d_l[i])
+            else:
+                rec = self.record(int(t[i]), *frames['args'][i].tolist(), d_l[i])
+            out += rec
+            sizes.append(len(rec))
+            sizes.extend([0] * (j - i - 1))
+            i = j
+        return out, sizes, d_l
+
+
+class FrameTransmitter:
+    """
+    合并发送 + 节流引擎
+    帧先攒进同一个缓冲区，flush 时尽量一次 write 写出；
+    节奏由 UART 字节预算和固件队列占用决定，而不是每帧固定 sleep。
+
+    固件模型 (main.c):
+      - uart_rx_task 收到整帧后放进深度为 64 的事件队列
+      - hid_process_task 取出一帧 -> vTaskDelay(delay_ms) -> 等 USB 空闲 -> 发报告
+      所以一帧的报告时刻 ≈ max(取出时刻 + delay_ms(按滴答取整), 上一份报告 + HID 轮询周期)。
+    v2 突发记录在收齐时一次展开成多个事件入队，因此按事件记账: 每个事件带 delay_ms 与字节数，
+    记录的第一个事件计整条记录的字节数，其余事件计 0 (与前一个事件同时到达)。
+    """
+    def __init__(self, ser, baud_rate=115200, queue_depth=EVENT_QUEUE_SIZE,
+                 hid_interval=HID_POLL_INTERVAL, tick_ms=FIRMWARE_TICK_MS, metrics=None):
+        self.ser = ser
+        self.metrics = metrics or Metrics()
+        self.byte_time = 10 / baud_rate               # 8N1: 每字节 10 bit
+        self.frame_time = FRAME_LEN * self.byte_time
+        self.queue_depth = queue_depth
+        self.hid_interval = hid_interval
+        self.tick_ms = tick_ms
+
+        self._buf = bytearray()
+        self._delays = []          # 待发送事件的 delay_ms
+        self._sizes = []           # 待发送事件的字节数 (见类说明)
+        self._run = None           # 尚未封口的 v2 相对移动突发记录 [buttons, delays, (dx, dy) 字节]
+        self._link_free = 0.0      # UART 线路预计空闲时刻
+        self._device_free = 0.0    # 设备端 HID 任务预计空闲时刻
+        self._dequeue = deque()    # 已发送帧被 HID 任务取出队列的预计时刻
+        self.hold = 0              # batch 嵌套层数, >0 时只攒不发
+        self.lock = threading.Lock()   # 串口写锁 (保活线程的心跳与正常发送不交错)
+        self.last_write = 0.0
+        self.on_disconnect = None  # 写入失败时的回调 on_disconnect(exc, ser) -> 是否已恢复 (可重试)
+
+    @property
+    def pending(self):
+        return len(self._delays) + (len(self._run[1]) if self._run else 0)
+
+    @property
+    def lead_time(self):
+        """设备缓冲领先真实时间多少秒 (已发出的帧在设备端全部执行完还需要的时间)"""
+        return max(0.0, self._device_free - time.perf_counter())
+
+    @property
+    def idle_time(self):
+        """距离设备最后一次处理帧 (按模型估算) 已过去的秒数"""
+        return time.perf_counter() - max(self.last_write, self._device_free)
+
+    @property
+    def device_queued(self):
+        """估算的固件队列占用帧数"""
+        now = time.perf_counter()
+        return sum(1 for t in self._dequeue if t > now)
+
+    def push(self, frame, delay_ms=0):
+        """追加一帧 (v1 帧或只含一个事件的 v2 记录)"""
+        self._seal()
+        self._buf += frame
+        self._delays.append(delay_ms)
+        self._sizes.append(len(frame))
+
+    def push_many(self, frames, delays):
+        """一次追加多帧 (frames 为连续的 v1 帧字节，delays 为每帧 delay_ms 列表)"""
+        self._seal()
+        self._buf += frames
+        self._delays.extend(delays)
+        self._sizes.extend([FRAME_LEN] * len(delays))
+
+    def push_packed(self, data, sizes, delays):
+        """追加 RecordEncoder.pack 的结果 (v2 记录字节 + 每个事件的字节数与 delay_ms)"""
+        self._seal()
+        self._buf += data
+        self._delays.extend(delays)
+        self._sizes.extend(sizes)
+
+    def push_rel(self, buttons, x, y, delay_ms=0):
+        """
+        v2: 追加一次小幅相对移动 (|x|、|y| ≤ 127，无滚轮)
+        与紧挨着的上一次合并进同一条突发记录 (同按钮、delay 与记录的 Step_ms 一致)，
+        记录在下一次追加其他帧或 flush 时封口
+        """
+        run = self._run
+        if run is not None:
+            delays = run[1]
+            if (run[0] == buttons and len(delays) < MAX_BURST and delay_ms <= 0xFF
+                    and (len(delays) == 1 or delay_ms == delays[-1])):
+                delays.append(delay_ms)
+                run[2] += bytes((x & 0xFF, y & 0xFF))
+                return
+            self._seal()
+        self._run = [buttons, [delay_ms], bytearray((x & 0xFF, y & 0xFF))]
+
+    def _seal(self):
+        """把未封口的突发记录编码进缓冲区"""
+        run = self._run
+        if run is None:
+            return
+        self._run = None
+        buttons, delays, pairs = run
+        step = delays[1] if len(delays) > 1 else 0
+        rec = encode_record(REC_REL_BURST, bytes((buttons, step)) + pairs, delays[0])
+        self._buf += rec
+        self._delays.extend(delays)
+        self._sizes.append(len(rec))
+        self._sizes.extend([0] * (len(delays) - 1))
+
+    def _device_delay(self, delay_ms):
+        # pdMS_TO_TICKS 向下取整到滴答
+        return (delay_ms // self.tick_ms) * self.tick_ms / 1000.0
+
+    def _take(self):
+        self._seal()
+        buf, delays, sizes = self._buf, self._delays, self._sizes
+        self._buf, self._delays, self._sizes = bytearray(), [], []
+        return buf, delays, sizes
+
+    def reset_model(self):
+        """设备重启后 (队列已清空) 重置节流模型"""
+        self._dequeue.clear()
+        self._link_free = self._device_free = 0.0
+
+    def _write(self, data):
+        """加锁写入；串口断开时交给 on_disconnect 恢复后重试"""
+        while True:
+            ser = self.ser
+            try:
+                with self.lock:
+                    ser.write(data)
+                    self.last_write = time.perf_counter()
+                return
+            except serial.SerialTimeoutException:
+                raise
+            except (serial.SerialException, OSError) as e:
+                if self.on_disconnect is None or not self.on_disconnect(e, ser):
+                    raise
+
+    def write_now(self, frame):
+        """绕过缓冲立即写出一帧 (心跳 / 状态恢复)"""
+        with self.lock:
+            self.ser.write(frame)
+            self.last_write = time.perf_counter()
+
+    def _count(self, buf, delays, sizes):
+        """记账 + 逐帧追踪钩子 (没有钩子时不逐帧遍历)"""
+        m = self.metrics
+        c = m.counters
+        c['frames_sent_total'] += len(sizes) - sizes.count(0)
+        c['bytes_sent_total'] += len(buf)
+        c['flushes_total'] += 1
+        if m.frame_hooks:
+            view = memoryview(buf)
+            t = time.perf_counter()
+            pos = 0
+            for size, delay_ms in zip(sizes, delays):
+                if not size:
+                    continue
+                frame = view[pos:pos + size]
+                pos += size
+                for hook in m.frame_hooks:
+                    hook(frame, delay_ms, t)
+
+    def _plan(self, buf, delays, sizes):
+        """
+        节流计划：依次产出要写的字节块 (bytes) 或需要等待的秒数 (float)
+        同步 / 异步发送器共用这一套固件队列模型，只是执行方式不同。
+        """
+        start = 0    # 已写出的字节位置
+        pos = 0      # 当前记录的起始字节位置
+        n = len(delays)
+        link = max(time.perf_counter(), self._link_free)
+        arrive = link
+        for i, delay_ms in enumerate(delays):
+            size = sizes[i]
+            if size:
+                # 新记录: 它的所有事件在记录收齐时一起入队，需要一起留出队列位置
+                group = 1
+                while i + group < n and not sizes[i + group]:
+                    group += 1
+                transfer = size * self.byte_time
+                arrive = link + transfer
+                while self._dequeue and self._dequeue[0] <= arrive:
+                    self._dequeue.popleft()
+
+                over = len(self._dequeue) + group - self.queue_depth
+                if over > 0:
+                    # 队列将满: 先把已攒的写出去，再等到腾出足够的位置
+                    if pos > start:
+                        yield buf[start:pos]
+                        start = pos
+                    wait = self._dequeue[min(over, len(self._dequeue)) - 1] - transfer - time.perf_counter()
+                    if wait > 0:
+                        yield wait
+                    link = max(time.perf_counter(), link)
+                    arrive = link + transfer
+                    while self._dequeue and self._dequeue[0] <= arrive:
+                        self._dequeue.popleft()
+                pos += size
+                link = arrive
+                self._link_free = link
+
+            begin = max(arrive, self._device_free)
+            self._device_free = max(begin + self._device_delay(delay_ms),
+                                    self._device_free + self.hid_interval)
+            self._dequeue.append(begin)
+
+        if start < len(buf):
+            yield buf[start:]
+
+    def flush(self):
+        """按字节预算与队列深度写出所有待发帧"""
+        self._seal()
+        if not self._delays:
+            return
+        buf, delays, sizes = self._take()
+        if not self.ser:
+            return
+        self._count(buf, delays, sizes)
+        c = self.metrics.counters
+        for step in self._plan(buf, delays, sizes):
+            if isinstance(step, float):
+                time.sleep(step)
+                c['throttle_seconds_total'] += step
+            else:
+                t = time.perf_counter()
+                self._write(step)
+                c['write_seconds_total'] += time.perf_counter() - t
+
+
 class InputDevice:
-    def __init__(self, port, baud_rate=115200):
+    def __init__(self, port, baud_rate=115200, device_timed=False, ready_timeout=READY_TIMEOUT,
+                 keepalive=KEEPALIVE_INTERVAL, auto_reconnect=True, reconnect_timeout=RECONNECT_TIMEOUT,
+                 protocol=None):
+        """
+        :param device_timed: 设备计时模式。wait() 不再在上位机 sleep，而是把时间折算进
+                             下一帧的 delay_ms，由固件 vTaskDelay 执行；帧序列提前上传，
+                             上位机调度抖动和串口延迟不再影响动作节奏。
+        :param ready_timeout: 连接握手超时 (秒)，见 ReadyProbe
+        :param keepalive: 有键/按钮按住时的保活间隔 (秒)，None 关闭保活线程
+        :param auto_reconnect: 写入时串口断开则自动重连，并恢复按住的键与按钮
+        :param protocol: 串口协议版本。None: 连接时协商 (固件不支持 v2 时退回 v1)；
+                         1 / 2: 固定版本，不协商
+        """
         self.port = port
         self.baud = baud_rate
         self.ser = None
+        self.metrics = Metrics({'port': port})
+        self.metrics.gauge('lead_time_seconds', lambda: self.tx.lead_time)
+        self.metrics.gauge('device_queued_frames', lambda: self.tx.device_queued)
+        self.tx = FrameTransmitter(None, baud_rate, metrics=self.metrics)
+        self.tx.on_disconnect = self._reconnect
+        self.ready_timeout = ready_timeout
+        self.keepalive = keepalive
+        self.auto_reconnect = auto_reconnect
+        self.reconnect_timeout = reconnect_timeout
+        self.ready = None              # 最近一次握手的结果 (见 ReadyProbe)
+        self.protocol_request = protocol
+        self.protocol = protocol or 1  # 实际使用的协议版本 (协商结果)
+        self.records = RecordEncoder()
+        self.held_key = (0, 0)         # 当前按住的 (键值, 修饰键)，固件只报告一个键
+        self.held_buttons = 0          # 当前按住的鼠标按钮掩码
+        self._keepalive_thread = None
+        self._keepalive_stop = threading.Event()
+        self._reconnect_lock = threading.Lock()
+        # 发送锁: 入缓冲与 flush 串行，后台线程 (RelStream / MoveHandle) 与调用方可共用一个设备
+        self.send_lock = threading.RLock()
+        self.rel = RelativeEncoder()
+        self.keystrokes = KeystrokeCompiler.for_layout('us')
+        self.encoder = FrameEncoder()
+        self.scheduler = Scheduler()   # 上位机计时: 绝对截止时刻 + 自旋，迟到统计见 scheduler.stats()
+        self.device_timed = device_timed
+        self._pending_delay = 0.0   # 设备计时模式: 尚未附着到帧上的等待时间 (秒)
+        self._delay_carry = 0.0     # 目标时间轴领先设备预计报告时刻的毫秒数 (见 _device_delays)
         self.abs_max_x = 32767
         self.abs_max_y = 32767
         # ================= 安全边距配置 =================
@@ -64,44 +835,384 @@ class InputDevice:
 
     def connect(self):
         try:
-            self.ser = serial.Serial(self.port, self.baud, timeout=1)
-            time.sleep(2) 
-            print(f"Device connected on {self.port}")
+            self._open()
+            t = time.perf_counter()
+            self.ready = self._handshake()
+            self.protocol = self._negotiate()
+            self._count_connect()
+            print(f"Device connected on {self.port} ({self.ready}, v{self.protocol}, "
+                  f"{(time.perf_counter() - t) * 1000:.0f} ms)")
         except Exception as e:
+            self.metrics.inc('connect_errors_total')
             print(f"Connection failed: {e}")
             raise
+        self._start_keepalive()
+
+    def _open(self):
+        # serial_for_url: 既支持 COM3 / /dev/ttyUSB0，也支持 loop:// 等 URL (虚拟设备测试)
+        self.ser = serial.serial_for_url(self.port, self.baud, timeout=1)
+        self.tx.ser = self.ser
+
+    def _handshake(self):
+        """发心跳直到设备就绪 (取代固定 sleep 2 秒)，返回就绪原因"""
+        probe = ReadyProbe(self.ready_timeout)
+        while True:
+            now = time.perf_counter()
+            frame = probe.probe(now)
+            if frame:
+                self.ser.write(frame)
+            n = self.ser.in_waiting
+            data = self.ser.read(n) if n else b''
+            result = probe.feed(data, now)
+            if result:
+                return result
+            if not data:
+                time.sleep(0.005)
+
+    def _negotiate(self):
+        """协商串口协议版本；不回显心跳的旧固件直接用 v1，不等待"""
+        if self.protocol_request:
+            return self.protocol_request
+        if self.ready != 'ack':
+            return 1
+        probe = ProtocolProbe()
+        self.ser.write(probe.frame)
+        while True:
+            n = self.ser.in_waiting
+            data = self.ser.read(n) if n else b''
+            version = probe.feed(data, time.perf_counter())
+            if version:
+                return version
+            if not data:
+                time.sleep(0.002)
+
+    def _count_connect(self):
+        c = self.metrics.counters
+        if c['connects_total']:
+            c['reconnects_total'] += 1
+        c['connects_total'] += 1
 
     def close(self):
+        self._stop_keepalive()
         if self.ser and self.ser.is_open:
+            self._flush()
+            if self.device_timed:
+                self.sync()
             self.ser.close()
             print("Device disconnected")
 
+    # ================= 保活与重连 =================
+    @property
+    def held(self):
+        """是否有键或鼠标按钮处于按住状态 (固件看门狗超时会把它们松开)"""
+        return bool(self.held_key[0] or self.held_key[1] or self.held_buttons)
+
+    def _start_keepalive(self):
+        if not self.keepalive or (self._keepalive_thread and self._keepalive_thread.is_alive()):
+            return
+        self._keepalive_stop.clear()
+        self._keepalive_thread = threading.Thread(target=self._keepalive_run, name='minke-keepalive',
+                                                  daemon=True)
+        self._keepalive_thread.start()
+
+    def _stop_keepalive(self):
+        self._keepalive_stop.set()
+        if self._keepalive_thread and self._keepalive_thread is not threading.current_thread():
+            self._keepalive_thread.join()
+        self._keepalive_thread = None
+
+    def _keepalive_run(self):
+        """有键/按钮按住且设备空闲时补发心跳，防止看门狗把它们松开"""
+        frame = heartbeat_frame()
+        while not self._keepalive_stop.wait(self.keepalive / 2):
+            if not self.held or self.tx.idle_time < self.keepalive:
+                continue
+            ser = self.ser
+            try:
+                self.tx.write_now(frame)
+                self.metrics.inc('keepalives_total')
+            except (serial.SerialException, OSError) as e:
+                # 按住状态下断线: 不等下一次正常发送，直接重连并恢复
+                self._reconnect(e, ser)
+
+    def _reconnect(self, exc, failed_ser=None):
+        """
+        串口断开后重新打开 + 握手，并恢复按住的键与按钮
+        :return: 是否已恢复 (调用方可重试写入)
+        """
+        if not self.auto_reconnect:
+            return False
+        with self._reconnect_lock:
+            if failed_ser is not None and self.ser is not failed_ser and self.ser.is_open:
+                return True   # 另一个线程已经重连过了
+            print(f"⚠️ 串口断开: {exc}，尝试重连 {self.port} ...")
+            try:
+                self.ser.close()
+            except Exception:
+                pass
+            deadline = time.perf_counter() + self.reconnect_timeout
+            backoff = 0.05
+            while time.perf_counter() < deadline and not self._keepalive_stop.is_set():
+                try:
+                    self._open()
+                    self.ready = self._handshake()
+                    self.protocol = self._negotiate()
+                except (serial.SerialException, OSError):
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 1.0)
+                    continue
+                self._count_connect()
+                self.tx.reset_model()
+                self._restore_held()
+                print(f"🔌 已重新连接 {self.port} ({self.ready})")
+                return True
+            self.metrics.inc('connect_errors_total')
+            return False
+
+    def _restore_held(self):
+        """设备可能已复位: 重新按下断线前按住的键与按钮"""
+        code, mod = self.held_key
+        if code or mod:
+            self.tx.write_now(encode_frame(EVENT_TYPE_KEYBOARD, code, 0, mod, 0, 0, 0))
+        if self.held_buttons:
+            self.tx.write_now(encode_frame(EVENT_TYPE_MOUSE_REL, self.held_buttons, 0, 0, 0, 0, 0))
+
     def _send_packet(self, type, b2, b3, b4, b5, b6, b7, delay_ms=0):
         if not self.ser: return
-        payload = struct.pack('<BBBBBBBBH', 
-                              0xAA, type, b2, b3, b4, b5, b6, b7, delay_ms)
-        self.ser.write(payload + bytes([0x55]))
-        time.sleep(0.005) 
+        with self.send_lock:
+            self._push(type, b2, b3, b4, b5, b6, b7, delay_ms)
+            if not self.tx.hold:
+                self.tx.flush()
+
+    def _push(self, type, b2, b3, b4, b5, b6, b7, delay_ms):
+        with self.send_lock:
+            if self.device_timed:
+                delay_ms = self._take_delay(delay_ms)
+            if self.protocol >= 2:
+                small = type == EVENT_TYPE_MOUSE_REL and RecordEncoder.small_rel(b3, b4, b5, b6, b7)
+                if small:
+                    self.tx.push_rel(b2, *small, delay_ms)
+                else:
+                    self.tx.push(self.records.record(type, b2, b3, b4, b5, b6, b7, delay_ms), delay_ms)
+            else:
+                self.tx.push(encode_frame(type, b2, b3, b4, b5, b6, b7, delay_ms), delay_ms)
+
+    def _push_compiled(self, frames):
+        """
+        写入预编译帧 [(帧前缀, delay_ms), ...]，节奏由每帧的 delay_ms 决定
+        已协商 v2 时按前缀里的字段改编成 v2 记录 (键盘记录 7~9 字节，v1 帧 11 字节)
+        """
+        tx = self.tx
+        record = self.records.record if self.protocol >= 2 else None
+        with self.send_lock:
+            for prefix, delay_ms in frames:
+                delay_ms = int(delay_ms)
+                if self.device_timed:
+                    delay_ms = self._take_delay(delay_ms)
+                else:
+                    delay_ms = self._split_delay(delay_ms)
+                if record:
+                    tx.push(record(prefix[1], *prefix[2:8], delay_ms), delay_ms)
+                else:
+                    tx.push(prefix + _FRAME_TAIL.pack(delay_ms, FRAME_TAIL), delay_ms)
+
+    @staticmethod
+    def _frame_array(frames):
+        """memoryview / bytes / 结构化数组 -> FRAME_DTYPE 数组"""
+        if isinstance(frames, np.ndarray):
+            return frames.view(FRAME_DTYPE)
+        return np.frombuffer(frames, dtype=FRAME_DTYPE)
+
+    def _push_frames(self, frames, gaps=None, delays=None):
+        """
+        整批入缓冲 (不等待)
+        设备计时模式下每帧 delay_ms 加上前一帧之后的间隔 gaps[i-1] 与累计等待，按 _device_delays 对齐到时间线，
+        结果与逐帧 _take_delay 一致。两种模式下超长延迟都拆到心跳帧上。最后一帧之后的间隔由调用方 wait。
+        """
+        if not len(frames):
+            return
+        with self.send_lock:
+            self._push_frames_locked(frames, gaps, delays)
+
+    def _push_frames_locked(self, frames, gaps, delays):
+        if self.device_timed:
+            total = np.array(frames['delay'] if delays is None else delays, dtype=np.float64)
+            if gaps is not None:
+                total[1:] += gaps[:-1] * 1000.0
+            ms = np.array(self._device_delays(total.tolist()), dtype=np.int64)
+        elif delays is None:
+            self._push_run(frames, frames['delay'])
+            return
+        else:
+            ms = np.asarray(delays).astype(np.int64)
+
+        frames = frames.copy()  # 改写 delay 字段，不动调用方的数据
+        long = np.flatnonzero(ms > MAX_FRAME_DELAY_MS)
+        start = 0
+        for i in long.tolist():
+            self._push_frame_run(frames[start:i], ms[start:i])
+            ms[i] = self._split_delay(int(ms[i]))
+            start = i
+        self._push_frame_run(frames[start:], ms[start:])
+
+    def _push_frame_run(self, frames, ms):
+        if len(frames):
+            frames['delay'] = ms
+            self._push_run(frames, ms)
+
+    def _push_run(self, frames, delays):
+        """一段帧数组入缓冲: v2 打包成变长 / 突发记录，v1 原样追加"""
+        if self.protocol >= 2:
+            self.tx.push_packed(*self.records.pack(frames, delays))
+        else:
+            self.tx.push_many(FrameEncoder.view(frames), delays.tolist())
+
+    @timed('send_frames')
+    def send_frames(self, frames, interval=0.0, delays=None):
+        """
+        发送 FrameEncoder 编码好的一批帧
+        :param interval: 每帧之后的等待 (秒)，语义同逐帧调用 wait()；标量或每帧一个的数组 (不等间隔)；
+                         设备计时模式下折算进 delay_ms，整批一次写出
+        :param delays: 覆盖每帧 delay_ms 的数组 (毫秒，可超出 u16 范围，超过 MAX_FRAME_DELAY_MS 时拆到心跳帧上)
+        """
+        if not self.ser: return
+        frames = self._frame_array(frames)
+        if not len(frames): return
+        gaps = self._gaps(interval, len(frames))
+        if delays is not None:
+            delays = np.asarray(delays)
+        with self.batch():
+            if self.device_timed or not gaps.any():
+                self._push_frames(frames, gaps, delays)
+                self.wait(gaps[-1])
+                return
+            for i in range(len(frames)):
+                self._push_frames(frames[i:i + 1], None, None if delays is None else delays[i:i + 1])
+                self.wait(gaps[i])
+
+    @staticmethod
+    def _gaps(interval, n):
+        """send_frames 的 interval -> 每帧之后的等待秒数 (n,)，负值按 0 处理"""
+        return np.maximum(np.broadcast_to(np.asarray(interval, dtype=np.float64), (n,)), 0.0)
+
+    def _take_delay(self, delay_ms):
+        """
+        把累计的等待时间折算成本帧 delay_ms (时间线见 _device_delays)
+        超过 MAX_FRAME_DELAY_MS 的部分拆到心跳帧上 (心跳同时刷新看门狗)
+        """
+        return self._split_delay(self._device_delays([delay_ms])[0])
+
+    def _split_delay(self, ms):
+        """超过 MAX_FRAME_DELAY_MS 的部分拆到前置的心跳帧上 (心跳同时刷新看门狗)，返回留给本帧的毫秒数"""
+        while ms > MAX_FRAME_DELAY_MS:
+            self.tx.push(encode_frame(EVENT_TYPE_SYSTEM, SYS_CMD_HEARTBEAT, 0, 0, 0, 0, 0,
+                                      MAX_FRAME_DELAY_MS), MAX_FRAME_DELAY_MS)
+            ms -= MAX_FRAME_DELAY_MS
+        return ms
+
+    def _device_delays(self, gaps_ms):
+        """
+        设备计时: 每帧相对上一帧的目标间隔 (毫秒) -> 写进帧的 delay_ms 列表
+        delay_ms 是相对上一帧的，而固件上一帧的报告时刻 = max(上一份报告 + delay_ms (按滴答向下取整),
+        上一份报告 + HID 轮询周期)，短于轮询周期的间隔会把帧推迟到下一次轮询。
+        _delay_carry 记录目标时间轴领先预计报告时刻的毫秒数 (取整余数为正，被推迟时为负)，
+        每帧按 目标时刻 - 上一帧预计报告时刻 取延迟，取整余数和推迟量都由后面的间隔补回，长序列不漂移。
+        设备已执行完 (队列空) 时下一帧从到达时刻重新起算，旧的欠账作废。
+        """
+        tx = self.tx
+        tick = tx.tick_ms
+        hid_ms = tx.hid_interval * 1000.0
+        carry = self._delay_carry
+        # 设备空闲时第一帧从到达时刻起算，不受上一份报告的轮询间隔约束
+        idle = not tx.pending and tx.lead_time <= 0
+        if idle:
+            carry = max(carry, 0.0)
+        carry += self._pending_delay * 1000.0
+        self._pending_delay = 0.0
+        floor = 0.0 if idle else hid_ms
+        out = []
+        for gap in gaps_ms:
+            want = carry + gap
+            ms = int(want // tick) * tick if want > 0 else 0
+            # 拆出的心跳帧各占 MAX_FRAME_DELAY_MS，只有最后一段受轮询周期限制
+            beats = max(0, -(-ms // MAX_FRAME_DELAY_MS) - 1)
+            rest = ms - beats * MAX_FRAME_DELAY_MS
+            carry = want - beats * MAX_FRAME_DELAY_MS - max(rest, floor)
+            floor = hid_ms
+            out.append(ms)
+        self._delay_carry = carry
+        return out
+
+    @contextmanager
+    def batch(self):
+        """批量模式：块内的帧合并到一次 write，退出时统一发送"""
+        self.tx.hold += 1
+        try:
+            yield self
+        finally:
+            self.tx.hold -= 1
+            if not self.tx.hold:
+                self._flush()
+
+    def _flush(self):
+        with self.send_lock:
+            self.tx.flush()
+
+    def flush(self):
+        self._flush()
+
+    def wait(self, seconds):
+        """
+        先把缓冲区里的帧发出去，再等待 (seconds<=0 时不打断合并)
+        连续的 wait 串成一条时间线 (见 Scheduler)，上一步的迟到在这一步扣回
+        设备计时模式下只记账，等待时间附着到下一帧的 delay_ms 上
+        """
+        if seconds <= 0:
+            return
+        if self.device_timed:
+            self._pending_delay += seconds
+            return
+        self._flush()
+        self.scheduler.wait(seconds)
+
+    def wait_until(self, deadline):
+        """
+        等到 scheduler.now() 时间轴上的绝对时刻 deadline
+        已过期时不打断合并，只记录迟到量
+        :return: 迟到秒数 (设备计时模式下为 0)
+        """
+        if self.device_timed:
+            self.wait(deadline - self.scheduler.now())
+            return 0.0
+        if deadline > self.scheduler.now():
+            self._flush()
+        return self.scheduler.wait_until(deadline)
+
+    @property
+    def lead_time(self):
+        """设备缓冲领先真实时间的秒数 (设备计时模式下即上传进度)"""
+        return self.tx.lead_time
+
+    def sync(self):
+        """等待设备把已上传的帧全部执行完，与真实时间对齐"""
+        self._flush()
+        lead = self.tx.lead_time
+        if lead > 0:
+            time.sleep(lead)
 
     # ================= 鼠标 API =================
 
+    @timed('mouse_move')
     def mouse_move(self, dx, dy, wheel=0):
-        """相对移动"""
-        if wheel != 0:
-            self._send_packet(0x02, 0, wheel & 0xFF, 0, 0, 0, 0)
-        
-        max_step = 127
-        while dx != 0:
-            step = min(dx, max_step) if dx > 0 else max(dx, -max_step)
-            x_bytes = struct.pack('<h', step)
-            self._send_packet(0x02, 0, 0, x_bytes[0], x_bytes[1], 0, 0)
-            dx -= step
-        while dy != 0:
-            step = min(dy, max_step) if dy > 0 else max(dy, -max_step)
-            y_bytes = struct.pack('<h', step)
-            self._send_packet(0x02, 0, 0, 0, 0, y_bytes[0], y_bytes[1])
-            dy -= step
+        """相对移动 (支持浮点增量，不足 1 像素的部分累积到下一次)"""
+        with self.batch():
+            self._mouse_move(dx, dy, wheel)
+
+    def _mouse_move(self, dx, dy, wheel):
+        for x, y, w in self.rel.steps(dx, dy, wheel):
+            self._send_packet(0x02, 0, w & 0xFF, x & 0xFF, (x >> 8) & 0xFF, y & 0xFF, (y >> 8) & 0xFF)
 
+    @timed('mouse_move_to')
     def mouse_move_to(self, x_percent, y_percent):
         """
         绝对移动 (含边界保护)
@@ -121,83 +1232,83 @@ class InputDevice:
         target_x = max(min_val, min(target_x, max_x))
         target_y = max(min_val, min(target_y, max_y))
         
-        # 3. 发送
-        bx = struct.pack('<h', target_x)
-        by = struct.pack('<h', target_y)
+        # 3. 发送 (走私有实现: 异步子类覆盖了 mouse_move_abs)
+        self._mouse_move_abs(target_x, target_y)
+
+    @timed('mouse_move_abs')
+    def mouse_move_abs(self, x, y):
+        """绝对移动 (HID 原始坐标 0 ~ 32767，调用方负责钳制)"""
+        self._mouse_move_abs(x, y)
+
+    def _mouse_move_abs(self, x, y):
+        bx = struct.pack('<h', x)
+        by = struct.pack('<h', y)
         self._send_packet(0x03, 0, 0, bx[0], bx[1], by[0], by[1])
 
+    @timed('mouse_click')
     def mouse_click(self, button='left'):
         btn_mask = MOUSE_BTNS.get(button, 0)
         self._send_packet(0x02, btn_mask, 0, 0, 0, 0, 0)
-        time.sleep(0.05)
+        self.wait(0.05)
         self._send_packet(0x02, 0, 0, 0, 0, 0, 0)
 
+    @timed('mouse_down')
     def mouse_down(self, button='left'):
         btn_mask = MOUSE_BTNS.get(button, 0)
+        self.held_buttons = btn_mask
         self._send_packet(0x02, btn_mask, 0, 0, 0, 0, 0)
 
+    @timed('mouse_up')
     def mouse_up(self, button='left'):
+        self.held_buttons = 0
         self._send_packet(0x02, 0, 0, 0, 0, 0, 0)
 
+    @timed('mouse_scroll')
     def mouse_scroll(self, steps):
         self.mouse_move(0, 0, wheel=steps)
 
     # ================= 键盘 API =================
 
+    @timed('key_press')
     def key_press(self, key):
         self.key_down(key)
-        time.sleep(0.05)
+        self.wait(0.05)
         self.key_up(key)
 
+    @timed('key_down')
     def key_down(self, key, modifiers=[]):
-        key = str(key).lower()
-        code = 0
-        mod_mask = 0
-        for m in modifiers:
-            mod_mask |= MODIFIERS.get(m.lower(), 0)
-
-        if key in MODIFIERS:
-            mod_mask |= MODIFIERS[key]
-            code = 0 
-        else:
-            code = HID_KEY_MAP.get(key, 0)
-
+        code, mod_mask = resolve_key(key, modifiers)
+        self.held_key = (code, mod_mask)
         self._send_packet(0x01, code, 0x00, mod_mask, 0, 0, 0)
 
+    @timed('key_up')
     def key_up(self, key):
+        self.held_key = (0, 0)
         self._send_packet(0x01, 0, 0x80, 0, 0, 0, 0)
 
-    def type_string(self, text, interval=0.05):
-        for char in text:
-            if char in SHIFT_SYMBOLS:
-                raw_key = SHIFT_SYMBOLS[char]
-                self.key_down(raw_key, modifiers=['shift'])
-                time.sleep(0.02)
-                self.key_up(raw_key)
-            else:
-                self.key_press(char)
-            time.sleep(interval)
+    @timed('type_string')
+    def type_string(self, text, interval=0.05, hold=0.05, fast=False):
+        """
+        输入字符串: 整段预编译成帧序列，一次 write 发出，按键节奏由固件按 delay_ms 执行
+        :param interval: 每个字符之间的间隔 (秒)，也可以是与 text 等长的序列
+        :param hold: 每个键按住的时长 (秒)
+        :param fast: 批量录入模式，不加等待，速度只受串口与 HID 轮询限制
+        """
+        gaps = interval * 1000 if isinstance(interval, (int, float)) else [g * 1000 for g in interval]
+        frames, tail_ms = self.keystrokes.compile(text, hold * 1000, gaps, fast)
+        with self.batch():
+            self._push_compiled(frames)
+            self.wait(tail_ms / 1000)
 
+    @timed('hotkey')
     def hotkey(self, *args):
-        mods = []
-        keys = []
-        for k in args:
-            k = str(k).lower()
-            if k in MODIFIERS:
-                mods.append(k)
-            else:
-                keys.append(k)
-        
-        if not keys and mods:
-            target = mods[-1]
-            others = mods[:-1]
-            self.key_down(target, modifiers=others)
-            time.sleep(0.1)
-            self.key_up(target)
-            return
+        with self.batch():
+            self._hotkey(*args)
 
-        if keys:
-            target_key = keys[-1]
-            self.key_down(target_key, modifiers=mods)
-            time.sleep(0.1)
-            self.key_up(target_key)
\ No newline at end of file
+    def _hotkey(self, *args):
+        target, mods = split_hotkey(args)
+        if target is None:
+            return
+        self.key_down(target, modifiers=mods)
+        self.wait(0.1)
+        self.key_up(target)
@@ -0,0 +1,299 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future
+
+
+class CommandHandle(Future):
+    """
+    命令句柄 (基于 concurrent.futures.Future)
+    - result(timeout) 阻塞等待；在协程里可以直接 await
+    - cancel() 取消尚未开始执行的命令
+    - then(fn) 串联：本命令成功后在 I/O 线程里执行 fn(result)
+    """
+    def __init__(self, name=''):
+        super().__init__()
+        self.name = name
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+
+    def __await__(self):
+        return asyncio.wrap_future(self).__await__()
+
+    def then(self, fn, *args, **kwargs):
+        """
+        :param fn: 回调 fn(result, *args, **kwargs)；若返回另一个 Future，则等待其结果
+        :return: 新的 CommandHandle
+        """
+        nxt = CommandHandle(getattr(fn, '__name__', 'then'))
+
+        def _resolve(src, dst):
+            if dst.done():
+                return
+            if src.cancelled():
+                # fn 返回的 Future 被取消时 dst 已是 RUNNING，cancel() 不起作用，改为以 CancelledError 结束
+                if not dst.cancel():
+                    dst.set_exception(CancelledError())
+            elif src.exception() is not None:
+                dst.set_exception(src.exception())
+            else:
+                dst.set_result(src.result())
+
+        def _run(done):
+            if done.cancelled() or done.exception() is not None:
+                _resolve(done, nxt)
+                return
+            if not nxt.set_running_or_notify_cancel():
+                return
+            try:
+                ret = fn(done.result(), *args, **kwargs)
+            except BaseException as e:
+                nxt.set_exception(e)
+                return
+            if isinstance(ret, Future):
+                ret.add_done_callback(lambda f: _resolve(f, nxt))
+            else:
+                nxt.set_result(ret)
+
+        self.add_done_callback(_run)
+        return nxt
+
+    @property
+    def latency(self):
+        """从提交到完成的耗时 (秒)，未完成时为 None"""
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.submitted_at
+
+
+class CommandWorker:
+    """
+    有界命令队列 + 专用写线程
+    调用方只负责入队，串口读写和 sleep 都发生在后台线程里。
+    队列满时的行为 (背压) 由 block / timeout 决定：阻塞等待，或抛出 queue.Full。
+    """
+    def __init__(self, maxsize=256, name='minke-io'):
+        self.maxsize = maxsize
+        self.name = name
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closing = False
+        self.current = None  # 正在执行的命令句柄
+
+        # 统计信息
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self.blocked_time = 0.0  # 调用方因队列满而阻塞的累计时间 (秒)
+
+    # ---------- 生命周期 ----------
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def close(self, cancel_pending=False, timeout=None):
+        """
+        停止写线程
+        :param cancel_pending: True 时取消所有排队命令；否则先把队列执行完
+        """
+        if cancel_pending:
+            self.cancel_all()
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    # ---------- 队列状态 ----------
+    @property
+    def depth(self):
+        """排队中 (尚未开始) 的命令数"""
+        return len(self._queue)
+
+    @property
+    def full(self):
+        return len(self._queue) >= self.maxsize
+
+    @property
+    def busy(self):
+        return self.current is not None or bool(self._queue)
+
+    def stats(self):
+        return {
+            'depth': self.depth,
+            'maxsize': self.maxsize,
+            'max_depth': self.max_depth,
+            'running': self.current.name if self.current else None,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'cancelled': self.cancelled,
+            'rejected': self.rejected,
+            'blocked_time': self.blocked_time,
+        }
+
+    # ---------- 提交 ----------
+    def submit(self, fn, *args, block=True, timeout=None, **kwargs):
+        """
+        入队一条命令
+        :param block: 队列满时是否等待
+        :param timeout: 等待上限 (秒)，超时抛出 queue.Full
+        :return: CommandHandle
+        """
+        handle = CommandHandle(getattr(fn, '__name__', 'command'))
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("CommandWorker 已关闭")
+            # 写线程自己 (例如 then 回调) 提交时不受容量限制，避免自锁
+            if threading.current_thread() is not self._thread and len(self._queue) >= self.maxsize:
+                if not block:
+                    self.rejected += 1
+                    raise queue.Full
+                t0 = time.perf_counter()
+                ok = self._cond.wait_for(lambda: len(self._queue) < self.maxsize or self._closing,
+                                         timeout)
+                self.blocked_time += time.perf_counter() - t0
+                if not ok:
+                    self.rejected += 1
+                    raise queue.Full
+                if self._closing:
+                    raise RuntimeError("CommandWorker 已关闭")
+            self._queue.append((handle, fn, args, kwargs))
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._cond.notify_all()
+        return handle
+
+    def cancel_all(self):
+        """取消所有尚未开始的命令，返回取消数量"""
+        with self._cond:
+            items = list(self._queue)
+            self._queue.clear()
+            self._cond.notify_all()
+        n = 0
+        for handle, _, _, _ in items:
+            if handle.cancel():
+                n += 1
+        self.cancelled += n
+        return n
+
+    def join(self, timeout=None):
+        """等待队列清空且当前命令执行完毕"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self.busy, timeout)
+
+    # ---------- 写线程 ----------
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._closing)
+                if not self._queue:
+                    return
+                handle, fn, args, kwargs = self._queue.popleft()
+                self._cond.notify_all()
+
+            if not handle.set_running_or_notify_cancel():
+                self.cancelled += 1
+                continue
+
+            self.current = handle
+            handle.started_at = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                handle.finished_at = time.perf_counter()
+                self.failed += 1
+                handle.set_exception(e)
+            else:
+                handle.finished_at = time.perf_counter()
+                self.completed += 1
+                handle.set_result(result)
+            finally:
+                with self._cond:
+                    self.current = None
+                    self._cond.notify_all()
+
+
+class BackgroundHID:
+    """
+    非阻塞包装器：InputDevice / HumanHID 的任意公开方法都变成 "入队 + 返回句柄"
+
+    with BackgroundHID(HumanHID('COM3')) as bot:
+        h = bot.move_to(0.5, 0.5, duration=0.8)   # 立即返回
+        h.then(lambda _: bot.click())
+        ...                                       # 决策循环继续运行
+        h.result()
+
+    注意：被包装对象只能由写线程访问，不要在其他线程里直接调用它。
+    """
+    def __init__(self, target, maxsize=256, block=True, timeout=None):
+        """
+        :param target: InputDevice 或 HumanHID 实例
+        :param maxsize: 队列容量
+        :param block, timeout: 队列满时的默认背压策略 (见 CommandWorker.submit)
+        """
+        self.target = target
+        self.block = block
+        self.timeout = timeout
+        self.worker = CommandWorker(maxsize)
+
+    def __enter__(self):
+        self.target.__enter__()
+        self.worker.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(cancel_pending=exc_type is not None)
+        self.target.__exit__(exc_type, exc_val, exc_tb)
+
+    def start(self):
+        self.worker.start()
+
+    def close(self, cancel_pending=False):
+        self.worker.close(cancel_pending=cancel_pending)
+
+    def __getattr__(self, name):
+        attr = getattr(self.target, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def submit(*args, **kwargs):
+            return self.worker.submit(attr, *args, block=self.block, timeout=self.timeout, **kwargs)
+        submit.__name__ = name
+        submit.__doc__ = attr.__doc__
+        return submit
+
+    def submit(self, fn, *args, block=None, timeout=None, **kwargs):
+        """提交任意可调用对象，例如 bot.submit(lambda: ...)"""
+        return self.worker.submit(fn, *args,
+                                  block=self.block if block is None else block,
+                                  timeout=self.timeout if timeout is None else timeout,
+                                  **kwargs)
+
+    # ---------- 队列状态 ----------
+    @property
+    def depth(self):
+        return self.worker.depth
+
+    @property
+    def full(self):
+        return self.worker.full
+
+    def stats(self):
+        return self.worker.stats()
+
+    def cancel_all(self):
+        return self.worker.cancel_all()
+
+    def join(self, timeout=None):
+        return self.worker.join(timeout)
@@ -1,22 +1,51 @@
-import time
 import random
 import math
-from hid_driver import InputDevice
+import time
+import numpy as np
+from hid_driver import (EVENT_TYPE_MOUSE_ABS, EVENT_TYPE_MOUSE_REL, MOUSE_BTNS, MOUSE_FRAME_DTYPE,
+                        InputDevice)
+from metrics import timed
+from bezier import bezier_at, bezier_at_batch, bezier_path, human_controls, human_paths, to_hid
+from step_planner import StepPlanner, arc_length, arc_lengths, polyline_length, resample
+from move_handle import MoveHandle
+from rel_stream import RelativeStream
+from tour_planner import TourPlan, fitts_durations, plan_tour
+from trajectory_lib import TrajectoryLibrary
 
 class HumanHID:
-    def __init__(self, port, screen_width=1920, screen_height=1080):
+    # 底层设备类型 (异步版本替换为 AsyncInputDevice)
+    device_class = InputDevice
+    handle_class = MoveHandle
+
+    def __init__(self, port, screen_width=1920, screen_height=1080, device_timed=False,
+                 trajectory_library=None):
         """
         :param port: 串口号
         :param screen_width: 屏幕宽度 (像素), 用于计算精确的抖动距离
         :param screen_height: 屏幕高度 (像素)
+        :param device_timed: 设备计时模式。轨迹步进、按键间隔等全部折算成帧的 delay_ms
+                             提前上传，由固件负责计时 (见 InputDevice)。
+                             此模式下接口返回时动作可能仍在设备上执行，进度见 lead_time。
+        :param trajectory_library: 预计算轨迹库 (文件路径或 TrajectoryLibrary)。
+                                   设置后 move_to 查表取轨迹，不再实时生成。
         """
-        self.device = InputDevice(port)
+        self.device = self.device_class(port, device_timed=device_timed)
+        self.metrics = self.device.metrics
         self.screen_w = screen_width
         self.screen_h = screen_height
         
+        self.rng = np.random.default_rng()
+        if isinstance(trajectory_library, str):
+            trajectory_library = TrajectoryLibrary(trajectory_library)
+        self.library = trajectory_library
+        # 步进规划: 帧率预算取 HID 轮询率与串口帧率中较小的一个
+        tx = self.device.tx
+        self.planner = StepPlanner(tx.hid_interval, link_rate=1.0 / tx.frame_time)
+
         # 记录当前逻辑坐标 (0.0 ~ 1.0)
         self.current_x = 0.5
         self.current_y = 0.5
+        self.active_move = None    # 进行中的 MoveHandle
 
     def __enter__(self):
         self.device.connect()
@@ -27,17 +56,15 @@ class HumanHID:
 
     # ================= 核心算法: 像素级贝塞尔曲线 =================
     def _get_bezier_points(self, start, end, control1, control2, steps):
-        path = []
-        for t in range(steps + 1):
-            t /= steps
-            x = (1-t)**3 * start[0] + 3*(1-t)**2 * t * control1[0] + \
-                3*(1-t) * t**2 * control2[0] + t**3 * end[0]
-            y = (1-t)**3 * start[1] + 3*(1-t)**2 * t * control1[1] + \
-                3*(1-t) * t**2 * control2[1] + t**3 * end[1]
-            path.append((x, y))
-        return path
+        """-> (steps+1, 2) float32 百分比坐标 (向量化实现见 bezier.py)"""
+        return bezier_path(start, control1, control2, end, steps)
 
     def _generate_human_path(self, start_x, start_y, end_x, end_y, steps):
+        start, c1, c2, end = self._human_controls(start_x, start_y, end_x, end_y)
+        return self._get_bezier_points(start, end, c1, c2, steps)
+
+    def _human_controls(self, start_x, start_y, end_x, end_y):
+        """-> (起点, 控制点1, 控制点2, 终点) 百分比坐标"""
         # 1. 将百分比坐标转为虚拟像素坐标 (方便计算距离)
         sx_px, sy_px = start_x * self.screen_w, start_y * self.screen_h
         ex_px, ey_px = end_x * self.screen_w, end_y * self.screen_h
@@ -48,7 +75,7 @@ class HumanHID:
         # 距离越远，弧度可以越大，但也限制最大值
         # 偏移量在 [20px, 150px] 之间波动，或者距离的 20%
         offset_limit_px = min(dist_px * 0.2, 150)
-        offset_limit_px = max(20, offset_limit_px) # 最小偏移 20px
+        offset_limit_px = max(min(20, dist_px * 0.5), offset_limit_px) # 最小偏移 20px (短距离按距离的一半)
 
         # 生成随机偏移 (像素)
         def get_random_offset():
@@ -67,51 +94,236 @@ class HumanHID:
         c1 = (c1x_px / self.screen_w, c1y_px / self.screen_h)
         c2 = (c2x_px / self.screen_w, c2y_px / self.screen_h)
 
-        return self._get_bezier_points((start_x, start_y), (end_x, end_y), c1, c2, steps)
+        return (start_x, start_y), c1, c2, (end_x, end_y)
 
-    # ================= 对外接口: 拟人移动 =================
-    def move_to(self, x, y, duration=0.5, jitter_pixels=3):
+    def generate_paths(self, starts, ends, steps):
         """
-        拟人化绝对移动
-        :param x, y: 目标百分比 (0.0 - 1.0)
-        :param duration: 移动耗时 (秒)
-        :param jitter_pixels: 终点随机抖动范围 (单位: 像素)。设为 0 关闭抖动。
+        批量生成拟人轨迹 (一次矩阵乘法)
+        :param starts, ends: (N, 2) 百分比坐标
+        :return: (N, steps+1, 2) float32
         """
-        target_x, target_y = x, y
+        return human_paths(starts, ends, steps, self.screen_w, self.screen_h, self.rng)
 
+    def _path_to_hid(self, path):
+        """百分比轨迹 -> int16 HID 绝对坐标 (N, 2)"""
+        dev = self.device
+        return to_hid(path, dev.abs_max_x, dev.abs_max_y, dev.safe_margin)
+
+    # ================= 轨迹规划 =================
+    def _plan_move(self, x, y, duration, jitter_pixels):
+        """
+        计算一次拟人移动的轨迹
+        :return: (path, gaps, target_x, target_y)
+                 path[0] 为起点；gaps[i] 为第 i 帧之后的等待秒数 (按速度剖面与像素抽稀，不等间隔)
+        """
         # 1. 像素级抖动处理 (Jitter)
+        target_x, target_y = self._jitter_target(x, y, jitter_pixels)
+
+        # 2. 计算步数 (基于轨迹长度与帧率预算，见 StepPlanner)
+        shape, length_px = self._plan_shape(self.current_x, self.current_y, target_x, target_y, duration)
+        n = self.planner.count(length_px, duration)
+        u, times = self.planner.schedule(n, duration)
+        path = shape(u)
+
+        # 3. 丢掉落在同一像素上的步
+        path, gaps = self.planner.thin(path, times, self.screen_w, self.screen_h)
+        return path, gaps, target_x, target_y
+
+    def _jitter_target(self, x, y, jitter_pixels):
+        """终点加上 ±jitter_pixels 像素的随机偏移 (百分比坐标)"""
         if jitter_pixels > 0:
             # 将像素转换为百分比偏移量
             offset_x_percent = jitter_pixels / self.screen_w
             offset_y_percent = jitter_pixels / self.screen_h
             
-            target_x += random.uniform(-offset_x_percent, offset_x_percent)
-            target_y += random.uniform(-offset_y_percent, offset_y_percent)
+            x += random.uniform(-offset_x_percent, offset_x_percent)
+            y += random.uniform(-offset_y_percent, offset_y_percent)
+        return x, y
 
-        # 2. 计算步数 (基于移动距离和时间，保证平滑度)
-        # 最小每秒 60 帧，或者每移动 10 像素至少 1 帧
-        steps = int(max(duration * 60, 5))
-        
-        path = self._generate_human_path(self.current_x, self.current_y, 
-                                         target_x, target_y, steps)
-        
-        dt = duration / steps
-        for px, py in path:
-            self.device.mouse_move_to(px, py)
-            time.sleep(dt)
+    def _plan_shape(self, start_x, start_y, end_x, end_y, duration):
+        """
+        轨迹形状 (与时间无关)
+        :return: (shape, length_px)，shape(u) 把曲线参数 u (0~1) 映射为 (len(u), 2) 百分比坐标
+        """
+        scale = np.array((self.screen_w, self.screen_h), dtype=np.float32)
+        if self.library is not None:
+            # 查表：取库里的轨迹形状，再按规划的参数重新取点
+            dense = self.library.lookup(start_x, start_y, end_x, end_y,
+                                        duration, self.screen_w, self.screen_h)
+            return (lambda u: resample(dense, u)), polyline_length(dense * scale)
+        ctrl = np.array(self._human_controls(start_x, start_y, end_x, end_y), dtype=np.float32)
+        return (lambda u: bezier_at(u, ctrl)), arc_length(ctrl * scale)
+
+    def _plan_strokes(self, starts, ends, durations):
+        """
+        批量规划首尾相接的多段移动 (步数、速度剖面、像素抽稀的规则与 _plan_move 相同)
+        :param starts, ends: (N, 2) 百分比坐标，starts[i+1] == ends[i]
+        :return: (path, offsets, seg)，各段去掉起点后的采样 (百分比坐标)、相对本段开始的时刻、所属段号
+        """
+        scale = np.array((self.screen_w, self.screen_h), dtype=np.float64)
+        if self.library is None:
+            ctrl = human_controls(starts, ends, self.screen_w, self.screen_h, self.rng)
+            lengths = arc_lengths(ctrl * scale)
+        else:
+            shapes = [self._plan_shape(*start, *end, d) for start, end, d in zip(starts, ends, durations)]
+            lengths = [length for _, length in shapes]
+        counts = self.planner.counts(lengths, durations)
+        seg = np.repeat(np.arange(len(counts)), counts)
+        first = np.cumsum(counts) - counts
+        tau = (np.arange(len(seg)) - first[seg] + 1) / counts[seg]
+        u = self.planner.profile(tau)
+        if self.library is None:
+            path = bezier_at_batch(u, ctrl, seg)
+        else:
+            path = np.concatenate([shape(u[i:i + c]) for (shape, _), i, c in zip(shapes, first, counts)])
+        # 与前一个采样 (段首为本段起点) 落在同一像素的步丢掉，时间并入下一步；各段终点保留
+        px = np.rint(path * scale)
+        prev = np.vstack([np.rint(starts[:1] * scale), px[:-1]])
+        keep = np.any(px != prev, axis=1)
+        keep[first + counts - 1] = True
+        return path[keep], (tau * durations[seg])[keep], seg[keep]
+
+    def _plan_clicks(self, targets, button, jitter_pixels):
+        """
+        批量点击的整体计划: 访问顺序 + 全部移动与按键帧排在同一条时间线上
+        :return: (plan, frames, times, end)
+                 times[i] 为第 i 帧相对开始的发送时刻；end 为最后一个点击点 (百分比坐标)
+        """
+        scale = np.array((self.screen_w, self.screen_h), dtype=np.float64)
+        pts = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+        start = np.array((self.current_x, self.current_y))
+        t = time.perf_counter()
+        order = plan_tour(pts * scale, start * scale, extent=scale)
+        plan_seconds = time.perf_counter() - t
+        n = len(order)
+        if not n:
+            return TourPlan(order, np.zeros(0), 0.0, plan_seconds, 0.0), None, None, None
+
+        # 1. 终点抖动，各段时长按 Fitts 定律由距离决定
+        ends = pts[order] + self.rng.uniform(-1.0, 1.0, (n, 2)) * (jitter_pixels / scale)
+        starts = np.vstack([start, ends[:-1]])
+        distance = np.hypot(*((ends - starts) * scale).T)
+        durations = fitts_durations(distance)
+        # 到达后的停顿与按键时长同 move_to + click
+        settle = self.rng.uniform(0.05, 0.12, n)
+        hold = self.rng.uniform(0.06, 0.14, n)
+        seg_start = np.concatenate([[0.0], np.cumsum(durations + settle + hold)])
+
+        # 2. 轨迹与按键帧合到一条时间线
+        path, offsets, seg = self._plan_strokes(starts, ends, durations)
+        t_down = seg_start[:-1] + durations + settle
+        times = np.concatenate([seg_start[seg] + offsets, t_down, t_down + hold])
+        rank = np.argsort(times, kind='stable')
+        hid = self._path_to_hid(path)
+        clicks = np.zeros(2 * n, dtype=np.int16)
+        frames = self.device.encoder.frames(len(times)).copy()
+        m = frames.view(MOUSE_FRAME_DTYPE)
+        m['type'] = np.concatenate([np.full(len(path), EVENT_TYPE_MOUSE_ABS),
+                                    np.full(2 * n, EVENT_TYPE_MOUSE_REL)])[rank]
+        m['buttons'] = np.concatenate([np.zeros(len(path), dtype=np.uint8),
+                                       np.full(n, MOUSE_BTNS.get(button, 0), dtype=np.uint8),
+                                       np.zeros(n, dtype=np.uint8)])[rank]
+        m['x'] = np.concatenate([hid[:, 0], clicks])[rank]
+        m['y'] = np.concatenate([hid[:, 1], clicks])[rank]
+
+        plan = TourPlan(order, durations, float(distance.sum()), plan_seconds, float(seg_start[-1]))
+        self.metrics.observe('tour_seconds', 'plan', plan_seconds)
+        self.metrics.observe('tour_seconds', 'estimated', plan.estimated)
+        return plan, frames, times[rank], (float(ends[-1, 0]), float(ends[-1, 1]))
+
+    def _finish_clicks(self, plan, t_start, end):
+        """发送完毕: 实际总时长 = 已用时间 + 设备上还没执行完的部分"""
+        plan.actual = time.perf_counter() - t_start + self.device.lead_time
+        self.metrics.observe('tour_seconds', 'actual', plan.actual)
+        self.metrics.inc('tour_clicks_total', len(plan.order))
+        self.current_x, self.current_y = end
+
+    def _type_delays(self, text, wpm):
+        """逐字符产出 (char, 按键后的停顿秒数)"""
+        # 计算打字间隔
+        base_interval = 60 / (wpm * 5)
         
+        for char in text:
+            # 高斯分布延迟
+            delay = abs(random.gauss(base_interval, base_interval * 0.4))
+            delay = max(0.03, delay)
+            
+            if random.random() < 0.05: # 5% 概率思考卡顿
+                delay += random.uniform(0.2, 0.5)
+            yield char, delay
+
+    # ================= 对外接口: 拟人移动 =================
+    @timed('human.move_to')
+    def move_to(self, x, y, duration=0.5, jitter_pixels=3):
+        """
+        拟人化绝对移动
+        :param x, y: 目标百分比 (0.0 - 1.0)
+        :param duration: 移动耗时 (秒)
+        :param jitter_pixels: 终点随机抖动范围 (单位: 像素)。设为 0 关闭抖动。
+        """
+        self._preempt()   # 进行中的 start_move 先停在当前位置
+        path, gaps, target_x, target_y = self._plan_move(x, y, duration, jitter_pixels)
+
+        hid = self._path_to_hid(path)
+        frames = self.device.encoder.mouse_abs(hid[:, 0], hid[:, 1])
+        self.device.send_frames(frames, interval=gaps)
+
         self.current_x = target_x
         self.current_y = target_y
         
         # 3. 拟人停顿
-        time.sleep(random.uniform(0.05, 0.12))
+        self.device.wait(random.uniform(0.05, 0.12))
+
+    # ================= 对外接口: 可改目标的移动 =================
+    def start_move(self, x, y, duration=0.5, jitter_pixels=3, click=None):
+        """
+        后台开始一次拟人移动，立即返回 MoveHandle (可 retarget / cancel / wait)
+        已有进行中的移动时先取消它，新移动从它的运动平滑接上
+        :param click: 到达后点击的按钮，None 不点击
+        """
+        prev = self._preempt()
+        self.active_move = self.handle_class(self, x, y, duration, jitter_pixels, click, prev).start()
+        return self.active_move
+
+    def start_click_at(self, x, y, button='left', duration=0.6, jitter_pixels=3):
+        """start_move 的点击版本: 到达 (最后一次改的目标) 后点击"""
+        return self.start_move(x, y, duration, jitter_pixels, click=button)
+
+    def _preempt(self):
+        prev = self.active_move
+        if prev is None or prev.done:
+            return None
+        prev.cancel()
+        prev.join()
+        return prev
+
+    # ================= 对外接口: 相对模式流式运动 =================
+    def rel_stream(self, **kwargs):
+        """
+        启动相对模式流式运动引擎 (FPS 视角 / 跟枪)，参数见 RelativeStream
+        with human.rel_stream(rate=1000) as aim:
+            aim.aim(dx, dy)
+        """
+        return RelativeStream(self.device, **kwargs).start()
+
+    @property
+    def lead_time(self):
+        """设备缓冲领先真实时间的秒数 (设备计时模式)"""
+        return self.device.lead_time
+
+    def sync(self):
+        """等待设备执行完已上传的动作"""
+        self.device.sync()
 
     # ================= 对外接口: 拟人点击 =================
+    @timed('human.click')
     def click(self, button='left'):
-        self.device.mouse_down(button)
-        time.sleep(random.uniform(0.06, 0.14)) # 随机按键时长
-        self.device.mouse_up(button)
+        with self.device.batch():
+            self.device.mouse_down(button)
+            self.device.wait(random.uniform(0.06, 0.14)) # 随机按键时长
+            self.device.mouse_up(button)
 
+    @timed('human.click_at')
     def click_at(self, x, y, button='left', duration=0.6, jitter_pixels=3):
         """
         移动并点击
@@ -120,33 +332,46 @@ class HumanHID:
         self.move_to(x, y, duration=duration, jitter_pixels=jitter_pixels)
         self.click(button)
 
+    # ================= 对外接口: 批量点击 =================
+    @timed('human.click_many')
+    def click_many(self, targets, button='left', jitter_pixels=3):
+        """
+        按一条短路线依次点击一批目标 (顺序与各段时长预先整体规划，整批一次下发)
+        plan = bot.click_many(detections)
+        print(plan.estimated, plan.actual)
+        :param targets: [(x, y), ...] 百分比坐标，顺序无关 (从当前逻辑坐标出发重新排)
+        :param jitter_pixels: 每个点击点的随机误差 (像素)
+        :return: TourPlan (访问顺序、各段时长、预计与实际总时长)
+        """
+        self._preempt()
+        plan, frames, times, end = self._plan_clicks(targets, button, jitter_pixels)
+        if frames is None:
+            plan.actual = 0.0
+            return plan
+        t = time.perf_counter()
+        self.device.wait(times[0])
+        self.device.send_frames(frames, interval=np.diff(times, append=times[-1]))
+        self._finish_clicks(plan, t, end)
+        return plan
+
     # ================= 对外接口: 拟人输入 =================
+    @timed('human.type')
     def type(self, text, wpm=80):
-        # 计算打字间隔
-        base_interval = 60 / (wpm * 5)
-        
-        for char in text:
-            # 高斯分布延迟
-            delay = abs(random.gauss(base_interval, base_interval * 0.4))
-            delay = max(0.03, delay)
-            
-            if random.random() < 0.05: # 5% 概率思考卡顿
-                delay += random.uniform(0.2, 0.5)
-
-            # 调用底层无延迟输入，由这里控制节奏
-            self.device.type_string(char, interval=0.0)
-            time.sleep(delay)
+        # 整段文本连同拟人间隔一起预编译，一次发出
+        self.device.type_string(text, interval=[d for _, d in self._type_delays(text, wpm)])
 
     # ================= 对外接口: 拖拽 =================
+    @timed('human.drag_drop')
     def drag_drop(self, start_x, start_y, end_x, end_y, duration=1.0):
-        # 移动到起点 (允许 3 像素误差)
-        self.move_to(start_x, start_y, duration=duration*0.4, jitter_pixels=3)
-        
-        self.device.mouse_down('left')
-        time.sleep(random.uniform(0.1, 0.2))
-        
-        # 拖拽到终点 (允许 3 像素误差)
-        self.move_to(end_x, end_y, duration=duration, jitter_pixels=3)
-        
-        time.sleep(random.uniform(0.1, 0.2))
-        self.device.mouse_up('left')
\ No newline at end of file
+        with self.device.batch():
+            # 移动到起点 (允许 3 像素误差)
+            self.move_to(start_x, start_y, duration=duration*0.4, jitter_pixels=3)
+            
+            self.device.mouse_down('left')
+            self.device.wait(random.uniform(0.1, 0.2))
+            
+            # 拖拽到终点 (允许 3 像素误差)
+            self.move_to(end_x, end_y, duration=duration, jitter_pixels=3)
+            
+            self.device.wait(random.uniform(0.1, 0.2))
+            self.device.mouse_up('left')
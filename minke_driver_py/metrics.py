@@ -0,0 +1,278 @@
+# ================= 运行指标 =================
+# 每个 InputDevice 带一份 Metrics (HumanHID / ActionReplayer 共用设备上的那份):
+#   - 计数器   : 发送帧数 / 字节数、写串口耗时、节流等待耗时、连接与重连次数、回放事件数 ...
+#   - 直方图   : 各 API 调用耗时、回放迟到量、流式运动 / 可改目标移动从命令到生效的延迟、视觉流水线各段耗时、
+#                批量点击的规划耗时与预计 / 实际总时长 (固定桶，与 Prometheus histogram 一致)
+#   - 仪表     : 取值时现算的回调 (设备缓冲领先时间、估算的固件队列占用)
+#   - 帧钩子   : 每帧回调 fn(frame, delay_ms, t)，用于逐帧追踪；没有钩子时热路径只多一次判空
+#                (由 FrameTransmitter.flush 调用)
+# 导出: snapshot() -> JSON 字典，prometheus() -> Prometheus 文本，MetricsServer 在本地端口提供两者。
+import bisect
+import contextvars
+import functools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = 'minke_'
+
+# 秒: 100us ~ 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 直方图的标签名 (其余为 kind)
+HISTOGRAM_LABELS = {'api_latency_seconds': 'api', 'replay_lateness_seconds': 'mode',
+                    'stream_latency_seconds': 'event', 'pipeline_latency_seconds': 'stage',
+                    'tour_seconds': 'phase'}
+
+COUNTERS = {
+    'frames_sent_total': '发送的帧数',
+    'bytes_sent_total': '写入串口的字节数',
+    'flushes_total': '合并发送 (flush) 次数',
+    'write_seconds_total': '阻塞在串口 write 上的累计时间',
+    'throttle_seconds_total': '因固件队列将满而等待的累计时间',
+    'connects_total': '成功连接次数',
+    'reconnects_total': '断开后重新连接的次数',
+    'connect_errors_total': '连接失败次数',
+    'keepalives_total': '按住键/按钮时补发的保活心跳数',
+    'replay_events_total': '回放的事件数',
+    'stream_ticks_total': '相对流引擎的采样次数',
+    'pipeline_dropped_total': '视觉流水线中未被处理就被新数据覆盖的帧 / 结果数',
+    'tour_clicks_total': '批量点击 (click_many) 点过的目标数',
+}
+
+
+class Histogram:
+    """固定桶直方图 (累计计数在导出时计算)"""
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # 最后一格为 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        out, acc = [], 0
+        for c in self.counts:
+            acc += c
+            out.append(acc)
+        return out
+
+    def quantile(self, q):
+        """按桶上界估算分位数"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, acc in zip(self.buckets + (float('inf'),), self.cumulative()):
+            if acc >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """
+    一台设备的指标集合
+
+    dev.metrics.add_frame_hook(lambda frame, delay_ms, t: trace.append(bytes(frame)))
+    print(dev.metrics.prometheus())
+    :param labels: 附加到每条时间序列上的标签，例如 {'port': 'COM3'}
+    """
+    def __init__(self, labels=None):
+        self.labels = dict(labels or {})
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.histograms = {}     # (指标名, 标签值) -> Histogram
+        self.gauges = {}         # 指标名 -> 无参回调
+        self.frame_hooks = []
+        # 正在计时的最外层 API，嵌套调用不重复计时；按线程 / asyncio 任务各自独立
+        self.api_active = contextvars.ContextVar(f'minke_api_active_{id(self):x}', default=None)
+
+    # ---------- 记录 ----------
+    def inc(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, label, value):
+        h = self.histograms.get((name, label))
+        if h is None:
+            h = self.histograms[(name, label)] = Histogram()
+        h.observe(value)
+
+    def gauge(self, name, fn):
+        self.gauges[name] = fn
+
+    # ---------- 帧钩子 ----------
+    def add_frame_hook(self, fn):
+        """fn(frame: 一帧的 memoryview (v1 为 11 字节，v2 为整条记录), delay_ms, t: 写出时刻 perf_counter)"""
+        self.frame_hooks.append(fn)
+        return fn
+
+    def remove_frame_hook(self, fn):
+        self.frame_hooks.remove(fn)
+
+    # ---------- 导出 ----------
+    def snapshot(self):
+        """JSON 友好的快照"""
+        hist = {}
+        for (name, label), h in list(self.histograms.items()):
+            hist.setdefault(name, {})[label] = {
+                'count': h.count, 'sum': h.sum,
+                'p50': h.quantile(0.5), 'p95': h.quantile(0.95), 'p99': h.quantile(0.99),
+                'buckets': dict(zip([str(b) for b in h.buckets] + ['+Inf'], h.cumulative())),
+            }
+        return {
+            'labels': self.labels,
+            'time': time.time(),
+            'counters': dict(self.counters),
+            'gauges': {name: fn() for name, fn in list(self.gauges.items())},
+            'histograms': hist,
+        }
+
+    def json(self):
+        return json.dumps(self.snapshot())
+
+    def prometheus(self):
+        return prometheus_text([self])
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(base, **extra):
+    pairs = {**base, **extra}
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs.items()) + '}'
+
+
+def prometheus_text(metrics_list):
+    """多份 Metrics (例如多台设备) 合成一份 Prometheus 文本，同名指标共享 TYPE 声明"""
+    lines = {}
+
+    def emit(name, kind, line):
+        entry = lines.get(name)
+        if entry is None:
+            entry = lines[name] = [f'# TYPE {PREFIX}{name} {kind}']
+            if name in COUNTERS:
+                entry.insert(0, f'# HELP {PREFIX}{name} {COUNTERS[name]}')
+        entry.append(line)
+
+    for m in metrics_list:
+        for name, value in list(m.counters.items()):
+            emit(name, 'counter', f'{PREFIX}{name}{_labels(m.labels)} {value}')
+        for name, fn in list(m.gauges.items()):
+            emit(name, 'gauge', f'{PREFIX}{name}{_labels(m.labels)} {fn()}')
+        for (name, label), h in list(m.histograms.items()):
+            key = {HISTOGRAM_LABELS.get(name, 'kind'): label}
+            for bound, acc in zip(h.buckets + ('+Inf',), h.cumulative()):
+                emit(name, 'histogram', f'{PREFIX}{name}_bucket{_labels(m.labels, **key, le=bound)} {acc}')
+            emit(name, 'histogram', f'{PREFIX}{name}_sum{_labels(m.labels, **key)} {h.sum}')
+            emit(name, 'histogram', f'{PREFIX}{name}_count{_labels(m.labels, **key)} {h.count}')
+    return '\n'.join(line for entry in lines.values() for line in entry) + '\n'
+
+
+# ================= API 计时 =================
+def timed(api):
+    """同步 API 计时装饰器: 只统计最外层调用 (self.metrics.api_latency_seconds{api=...})"""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            m = self.metrics
+            if m.api_active.get() is not None:
+                return fn(self, *args, **kwargs)
+            token = m.api_active.set(api)
+            t = time.perf_counter()
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                m.api_active.reset(token)
+                m.observe('api_latency_seconds', api, time.perf_counter() - t)
+        return wrapper
+    return deco
+
+
+def async_timed(api):
+    """timed 的协程版本"""
+    def deco(fn):
+        @functools.wraps(fn)
+        async def wrapper(self, *args, **kwargs):
+            m = self.metrics
+            if m.api_active.get() is not None:
+                return await fn(self, *args, **kwargs)
+            token = m.api_active.set(api)
+            t = time.perf_counter()
+            try:
+                return await fn(self, *args, **kwargs)
+            finally:
+                m.api_active.reset(token)
+                m.observe('api_latency_seconds', api, time.perf_counter() - t)
+        return wrapper
+    return deco
+
+
+# ================= 本地导出 =================
+class MetricsServer:
+    """
+    本地 HTTP 导出: /metrics (Prometheus 文本)，/metrics.json (JSON 快照列表)
+
+    with MetricsServer([dev.metrics], port=9464):
+        ...
+    :param sources: Metrics 列表，或返回该列表的无参回调 (设备数量会变化时)
+    """
+    def __init__(self, sources, host='127.0.0.1', port=9464):
+        self.sources = sources
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _metrics(self):
+        return self.sources() if callable(self.sources) else self.sources
+
+    def start(self):
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path == '/metrics':
+                    body, ctype = prometheus_text(owner._metrics()), 'text/plain; version=0.0.4'
+                elif path == '/metrics.json':
+                    body, ctype = json.dumps([m.snapshot() for m in owner._metrics()]), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='minke-metrics', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
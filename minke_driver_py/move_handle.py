@@ -0,0 +1,247 @@
+# ================= 可改目标 / 可取消的移动 =================
+# move_to / click_at 一次规划整条贝塞尔轨迹并睡完全程，目标中途移动时只能等这一段走完再开下一段。
+# MoveHandle 把一次移动放到后台逐步执行 (同步版为线程，异步版为 asyncio 任务)，每一步 (HID 轮询间隔)
+# 检查一次新目标 / 取消，所以反应延迟不超过一个步长，而不是整段 duration:
+#   - 笔画 (Stroke): 轨迹形状 (贝塞尔或轨迹库) + 速度剖面，按连续时间求点
+#   - 改目标: 不重新起步，而是在进行中的运动上叠加一层平滑位移 (新目标 - 旧目标)·s(τ)，
+#             s 为最小加加速度剖面 (起点处速度、加速度为 0)，原有速度完整保留；
+#             按相机帧率连续改目标时各层互相叠加，轨迹始终连续
+#   - 取消: 停在当前逻辑坐标
+import asyncio
+import threading
+import time
+
+import numpy as np
+
+from hid_driver import EVENT_TYPE_MOUSE_ABS
+from scheduler import Scheduler
+from step_planner import minimum_jerk
+
+MIN_RETARGET = 0.1       # 改目标后修正段时长的下限 (秒)
+
+
+class Stroke:
+    """一笔移动: shape(u) 为轨迹形状，u 按速度剖面随时间从 0 走到 1"""
+    __slots__ = ('shape', 'start', 'duration', 'profile', 'end')
+
+    def __init__(self, shape, start, duration, profile=minimum_jerk):
+        self.shape = shape
+        self.start = start
+        self.duration = duration
+        self.profile = profile
+        self.end = start + duration
+
+    def at(self, t):
+        tau = min(max((t - self.start) / self.duration, 0.0), 1.0)
+        return self.shape(np.array([self.profile(tau)]))[0].astype(np.float64)
+
+
+class Motion:
+    """基础笔画 + 改目标时叠加的修正层 [(位移, 开始时刻, 时长), ...]"""
+    def __init__(self, stroke):
+        self.stroke = stroke
+        self.offset = np.zeros(2)   # 已走完的修正层之和
+        self.layers = []
+        self.end = stroke.end
+
+    def shift(self, delta, start, duration):
+        self.layers.append((np.asarray(delta, dtype=np.float64), start, duration))
+        self.end = max(self.end, start + duration)
+
+    def at(self, t):
+        """t 需单调不减 (走完的修正层并入 offset)"""
+        p = self.stroke.at(t) + self.offset
+        live = []
+        for layer in self.layers:
+            delta, start, duration = layer
+            tau = (t - start) / duration
+            if tau >= 1.0:
+                self.offset += delta
+                p += delta
+            else:
+                p += delta * minimum_jerk(max(tau, 0.0))
+                live.append(layer)
+        self.layers = live
+        return p
+
+
+class MoveHandle:
+    """
+    一次进行中的拟人移动 (由 HumanHID.start_move / start_click_at 创建)
+
+    h = bot.start_move(0.3, 0.4)
+    while not h.done:
+        x, y = detect()
+        h.retarget(x, y)          # 任何线程都可以调用，下一步生效
+    h.wait()
+    执行期间由该移动独占设备的鼠标移动；同一 HumanHID 上再开新移动会先取消旧的，并从旧移动平滑接上
+    (相当于对旧移动改目标)。
+    """
+    def __init__(self, human, x, y, duration=0.5, jitter_pixels=3, click=None, prev=None):
+        """
+        :param click: 到达后点击的按钮 (None 不点击)；取消时不点击
+        :param prev: 被抢占的旧移动，新移动接着它的运动改目标 (duration 为修正段时长)
+        """
+        self.human = human
+        self.jitter_pixels = jitter_pixels
+        self.click = click
+        self.step = 1.0 / human.planner.max_rate
+        self.scheduler = Scheduler()
+        self.target = None
+        self.cancelled = False
+        self.finished = threading.Event()
+
+        self._lock = threading.Lock()
+        self._cancel = False
+        self._retarget = None          # 待生效的 (x, y, duration, 命令时刻)
+        self._last_px = None           # 上一次发出的像素坐标
+
+        now = time.perf_counter()
+        if prev is not None:
+            self.target = prev.target
+            self._motion = prev._motion
+            self._shift(now, x, y, duration)
+        else:
+            self.target = human._jitter_target(x, y, jitter_pixels)
+            shape, _ = human._plan_shape(human.current_x, human.current_y, *self.target, duration)
+            self._motion = Motion(Stroke(shape, now, max(duration, self.step)))
+
+    # ---------- 命令 ----------
+    def retarget(self, x, y, duration=None):
+        """
+        改目标: 下一步在当前运动上叠加一段修正，平滑移到新目标
+        :param duration: 修正段时长 (秒)，None 时沿用原计划的剩余时间 (不少于 MIN_RETARGET)
+        """
+        with self._lock:
+            self._retarget = (x, y, duration, time.perf_counter())
+
+    def cancel(self):
+        """取消: 下一步停下，逻辑坐标停在当前位置"""
+        with self._lock:
+            self._cancel = True
+
+    @property
+    def done(self):
+        return self.finished.is_set()
+
+    @property
+    def remaining(self):
+        """按当前计划还需要的秒数"""
+        return max(0.0, self._motion.end - time.perf_counter())
+
+    # ---------- 规划 ----------
+    def _shift(self, now, x, y, duration):
+        old = self.target
+        self.target = self.human._jitter_target(x, y, self.jitter_pixels)
+        if duration is None:
+            duration = self._motion.end - now
+        duration = max(duration, MIN_RETARGET)
+        self._motion.shift(np.subtract(self.target, old), now, duration)
+
+    def _tick(self, now):
+        """
+        推进一步
+        :return: (要发送的 HID 坐标或 None, 是否结束)
+        """
+        h = self.human
+        with self._lock:
+            if self._cancel:
+                self.cancelled = True
+                return None, True
+            command = self._retarget
+            self._retarget = None
+        if command is not None:
+            x, y, duration, t_command = command
+            self._shift(now, x, y, duration)
+            h.metrics.observe('stream_latency_seconds', 'retarget', time.perf_counter() - t_command)
+
+        finished = now >= self._motion.end
+        if finished:
+            point = np.array(self.target, dtype=np.float64)
+        else:
+            point = self._motion.at(now)
+        h.current_x, h.current_y = float(point[0]), float(point[1])
+
+        px = (round(point[0] * h.screen_w), round(point[1] * h.screen_h))
+        if px == self._last_px:
+            return None, finished
+        self._last_px = px
+        return h._path_to_hid(point[None].astype(np.float32))[0], finished
+
+    def _send(self, hid):
+        dev = self.human.device
+        x, y = int(hid[0]), int(hid[1])
+        dev._push(EVENT_TYPE_MOUSE_ABS, dev.held_buttons, 0,
+                  x & 0xFF, (x >> 8) & 0xFF, y & 0xFF, (y >> 8) & 0xFF, 0)
+
+    # ---------- 执行 (线程) ----------
+    def start(self):
+        self._last_px = self._pixel()
+        self._thread = threading.Thread(target=self._run, name='minke-move', daemon=True)
+        self._thread.start()
+        return self
+
+    def _pixel(self):
+        h = self.human
+        return round(h.current_x * h.screen_w), round(h.current_y * h.screen_h)
+
+    def _run(self):
+        dev = self.human.device
+        try:
+            while True:
+                hid, finished = self._tick(time.perf_counter())
+                if hid is not None:
+                    # 与调用方线程的发送 (如 click) 互斥
+                    with dev.send_lock:
+                        self._send(hid)
+                        dev.tx.flush()
+                if finished:
+                    break
+                self.scheduler.wait(self.step)
+            if self.click and not self.cancelled:
+                self.human.click(self.click)
+        finally:
+            self.finished.set()
+
+    def wait(self, timeout=None):
+        """等待移动结束，返回 True 表示到达 (未取消)"""
+        self.finished.wait(timeout)
+        return self.done and not self.cancelled
+
+    def join(self):
+        """取消后等待执行线程退出 (最多一步)"""
+        self.finished.wait()
+
+
+class AsyncMoveHandle(MoveHandle):
+    """MoveHandle 的 asyncio 版本 (AsyncHumanHID)，在事件循环里以任务执行"""
+    def start(self):
+        self._last_px = self._pixel()
+        self._task = asyncio.get_running_loop().create_task(self._arun())
+        return self
+
+    async def _arun(self):
+        dev = self.human.device
+        try:
+            while True:
+                hid, finished = self._tick(time.perf_counter())
+                if hid is not None:
+                    self._send(hid)
+                    await dev.flush()
+                if finished:
+                    break
+                await self.scheduler.async_wait(self.step)
+            if self.click and not self.cancelled:
+                await self.human.click(self.click)
+        finally:
+            self.finished.set()
+
+    async def wait(self, timeout=None):
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.done and not self.cancelled
+
+    async def join(self):
+        await self._task
@@ -0,0 +1,406 @@
+# ================= 二进制列式录制格式 (.mkr) =================
+# 文件结构 (小端):
+#   header (32B) : '<4sHBBQIIQ' magic 'MKRC', version, codec, flags, n_events, n_blocks, reserved, index_offset
+#   block * N    : block header (48B) '<IQQ7I' n, t0, t_end, 6 列的存储字节数, 字符串增量字节数
+#                  + 6 列数据 (各自 8 字节对齐，可按块压缩)
+#                  + 字符串增量 (JSON 数组: 本块之前尚未写出的新字符串，8 字节对齐，可为空)
+#   index        : '<I' 字符串表长度 + 字符串表 (JSON 数组: 键名/鼠标按键名)
+#                  + 块索引 uint64[n_blocks, 4] (offset, t0, t_end, n)
+# 列定义:
+#   dt  uint32  与上一事件的时间差 (ms)，每块第一个事件为 0，绝对时间见块头 t0
+#   e   uint8   事件类型 (EVENT_CODES)
+#   s   uint8   按下/松开状态
+#   x   int16   move: x
+#   y   int16   move: y / scroll: dy
+#   k   uint16  click: 按键名 / key: 键名 在字符串表中的下标
+# 不压缩时通过 mmap 直接得到 NumPy 视图 (零拷贝)；压缩时按块解压。
+# index_offset 为 0 表示文件未正常收尾 (例如录制中断)，读取时会顺序扫描块头，并用各块的字符串增量拼出字符串表。
+# 版本 1 的块头没有字符串增量字段 (该位置为填充的 0)，按版本 2 读取等价于增量为空。
+import argparse
+import json
+import mmap
+import struct
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+MAGIC = b'MKRC'
+VERSION = 2
+EXTENSION = '.mkr'
+
+CODEC_NONE, CODEC_ZSTD, CODEC_LZ4 = 0, 1, 2
+CODECS = {None: CODEC_NONE, 'none': CODEC_NONE, 'zstd': CODEC_ZSTD, 'lz4': CODEC_LZ4}
+
+EVENT_CODES = {'move': 1, 'click': 2, 'scroll': 3, 'key': 4}
+EVENT_NAMES = {v: k for k, v in EVENT_CODES.items()}
+
+COLUMNS = (('dt', np.dtype('<u4')), ('e', np.dtype('u1')), ('s', np.dtype('u1')),
+           ('x', np.dtype('<i2')), ('y', np.dtype('<i2')), ('k', np.dtype('<u2')))
+
+# 按行的结构化记录 (绝对时间戳)，录制环形缓冲区、抽稀与批量回放共用
+ROW_DTYPE = np.dtype([('t', '<i8'), ('e', 'u1'), ('s', 'u1'),
+                      ('x', '<i2'), ('y', '<i2'), ('k', '<u2')])
+
+_HEADER = struct.Struct('<4sHBBQIIQ')
+_BLOCK = struct.Struct('<IQQ7I')
+_BLOCK_SIZE = 48
+
+
+def _pad8(n):
+    return (n + 7) & ~7
+
+
+def _compress(codec, data):
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor().compress(data)
+    if codec == CODEC_LZ4:
+        return lz4.frame.compress(data)
+    return data
+
+
+def _decompress(codec, data, size):
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=size)
+    if codec == CODEC_LZ4:
+        return lz4.frame.decompress(data)
+    return data
+
+
+def is_binary_recording(filename):
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(4) == MAGIC
+    except OSError:
+        return False
+
+
+def encode_event(event, string_id):
+    """事件字典 -> (t, e, s, x, y, k)，键名经 string_id 映射为字符串表下标"""
+    etype = event['e']
+    if etype == 'move':
+        return event['t'], 1, 0, event['x'], event['y'], 0
+    if etype == 'click':
+        return event['t'], 2, event['s'], 0, 0, string_id(event['b'])
+    if etype == 'scroll':
+        return event['t'], 3, 0, 0, event['dy'], 0
+    if etype == 'key':
+        return event['t'], 4, event['s'], 0, 0, string_id(event['k'])
+    raise ValueError(f"未知事件类型: {etype}")
+
+
+class RecordingWriter:
+    """
+    流式写入器：事件按块落盘，内存占用只与 block_size 有关
+
+    with RecordingWriter('actions.mkr', compression='zstd') as w:
+        w.append({'t': 0, 'e': 'move', 'x': 10, 'y': 20})
+    """
+    def __init__(self, filename, compression=None, block_size=65536):
+        codec = CODECS.get(compression)
+        if codec is None:
+            raise ValueError(f"未知压缩算法: {compression}")
+        if codec == CODEC_ZSTD and zstandard is None:
+            raise ValueError("zstd 压缩需要安装 zstandard: pip install zstandard")
+        if codec == CODEC_LZ4 and lz4 is None:
+            raise ValueError("lz4 压缩需要安装 lz4: pip install lz4")
+
+        self.filename = filename
+        self.codec = codec
+        self.block_size = block_size
+        self.strings = []
+        self._string_ids = {}
+        self._strings_written = 0   # 已随块写出的字符串数 (之后的作为下一块的增量)
+        self._index = []
+        self._rows = []       # 待写入的行 (t, e, s, x, y, k)
+        self._last_t = None
+        self.n_events = 0
+        self._f = open(filename, 'wb')
+        self._f.write(_HEADER.pack(MAGIC, VERSION, codec, 0, 0, 0, 0, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def string_id(self, name):
+        sid = self._string_ids.get(name)
+        if sid is None:
+            sid = self._string_ids[name] = len(self.strings)
+            self.strings.append(name)
+        return sid
+
+    def encode(self, event):
+        """事件字典 -> (t, e, s, x, y, k)"""
+        return encode_event(event, self.string_id)
+
+    def append(self, event):
+        self._rows.append(self.encode(event))
+        if len(self._rows) >= self.block_size:
+            self.flush()
+
+    def extend(self, events):
+        for event in events:
+            self.append(event)
+
+    def append_columns(self, t, e, s, x, y, k):
+        """直接写入一块列数据 (t 为绝对时间 ms)"""
+        self.flush()
+        self._write_block(np.asarray(t, dtype=np.int64), e, s, x, y, k)
+
+    def flush(self):
+        if not self._rows:
+            return
+        cols = np.array(self._rows, dtype=np.int64).T
+        self._rows = []
+        self._write_block(*cols)
+
+    def _write_block(self, t, e, s, x, y, k):
+        n = len(t)
+        if n == 0:
+            return
+        dt = np.empty(n, dtype=np.int64)
+        dt[0] = 0
+        np.subtract(t[1:], t[:-1], out=dt[1:])
+        if (dt < 0).any():
+            raise ValueError("事件时间戳必须单调不减")
+
+        arrays = [dt, e, s, x, y, k]
+        payloads = []
+        for (name, dtype), arr in zip(COLUMNS, arrays):
+            payloads.append(_compress(self.codec, np.asarray(arr).astype(dtype).tobytes()))
+
+        f = self._f
+        offset = f.tell()
+        t0, t_end = int(t[0]), int(t[-1])
+        if self._last_t is not None and t0 < self._last_t:
+            raise ValueError("事件时间戳必须单调不减")
+        self._last_t = t_end
+        # 新字符串随块写出，未收尾的文件也能还原字符串表
+        new = self.strings[self._strings_written:]
+        delta = json.dumps(new).encode('utf-8') if new else b''
+        self._strings_written += len(new)
+        f.write(_BLOCK.pack(n, t0, t_end, *[len(p) for p in payloads], len(delta)))
+        for p in payloads + [delta]:
+            f.write(p)
+            f.write(b'\0' * (_pad8(len(p)) - len(p)))
+        self._index.append((offset, t0, t_end, n))
+        self.n_events += n
+
+    def close(self):
+        if self._f.closed:
+            return
+        self.flush()
+        f = self._f
+        index_offset = f.tell()
+        strings = json.dumps(self.strings).encode('utf-8')
+        f.write(struct.pack('<I', len(strings)))
+        f.write(strings)
+        f.write(b'\0' * (_pad8(f.tell()) - f.tell()))
+        f.write(np.array(self._index, dtype='<u8').reshape(-1, 4).tobytes())
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, self.codec, 0, self.n_events, len(self._index), 0, index_offset))
+        f.close()
+
+
+class Recording:
+    """
+    只读录制文件 (mmap)
+
+    with Recording('actions.mkr') as rec:
+        t = rec.timestamps()          # int64 绝对时间
+        x, y = rec.column('x'), rec.column('y')
+        for event in rec.iter_events(): ...
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, codec, _, n_events, n_blocks, _, index_offset = _HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise ValueError(f"{filename} 不是 Minke 录制文件")
+        if not 1 <= version <= VERSION:
+            raise ValueError(f"不支持的录制格式版本: {version}")
+        self.codec = codec
+        if codec == CODEC_ZSTD and zstandard is None:
+            raise ValueError("该文件使用 zstd 压缩，需要安装 zstandard")
+        if codec == CODEC_LZ4 and lz4 is None:
+            raise ValueError("该文件使用 lz4 压缩，需要安装 lz4")
+
+        if index_offset:
+            (slen,) = struct.unpack_from('<I', self._mm, index_offset)
+            pos = index_offset + 4
+            self.strings = json.loads(bytes(self._mm[pos:pos + slen]).decode('utf-8'))
+            pos = _pad8(pos + slen)
+            index = np.frombuffer(self._mm, dtype='<u8', count=n_blocks * 4, offset=pos).reshape(-1, 4)
+            self.blocks = [tuple(int(v) for v in row) for row in index]
+        else:
+            # 未收尾的文件: 顺序扫描块头，字符串表由各块的增量拼出
+            self.blocks, self.strings = self._scan_blocks()
+        self.n_events = sum(b[3] for b in self.blocks)
+
+    def _scan_blocks(self):
+        blocks, strings = [], []
+        pos = _HEADER.size
+        size = len(self._mm)
+        while pos + _BLOCK_SIZE <= size:
+            n, t0, t_end, *sizes, slen = _BLOCK.unpack_from(self._mm, pos)
+            end = pos + _BLOCK_SIZE + sum(_pad8(s) for s in sizes)
+            if n == 0 or end + slen > size:
+                break
+            if slen:
+                strings.extend(json.loads(bytes(self._mm[end:end + slen]).decode('utf-8')))
+            blocks.append((pos, t0, t_end, n))
+            pos = end + _pad8(slen)
+        return blocks, strings
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self.n_events
+
+    def close(self):
+        # 仍有 NumPy 视图引用 mmap 时无法关闭，交给 GC
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+    @property
+    def start_time(self):
+        return self.blocks[0][1] if self.blocks else 0
+
+    @property
+    def end_time(self):
+        return self.blocks[-1][2] if self.blocks else 0
+
+    def block(self, i):
+        """第 i 块的列 -> dict(name -> ndarray)；不压缩时为 mmap 上的零拷贝视图"""
+        offset, _, _, n = self.blocks[i]
+        _, _, _, *sizes, _ = _BLOCK.unpack_from(self._mm, offset)
+        pos = offset + _BLOCK_SIZE
+        cols = {}
+        for (name, dtype), size in zip(COLUMNS, sizes):
+            if self.codec == CODEC_NONE:
+                cols[name] = np.frombuffer(self._mm, dtype=dtype, count=n, offset=pos)
+            else:
+                raw = _decompress(self.codec, self._mm[pos:pos + size], n * dtype.itemsize)
+                cols[name] = np.frombuffer(raw, dtype=dtype, count=n)
+            pos += _pad8(size)
+        return cols
+
+    def block_timestamps(self, i, cols=None):
+        cols = cols if cols is not None else self.block(i)
+        return self.blocks[i][1] + np.cumsum(cols['dt'], dtype=np.int64)
+
+    def column(self, name):
+        """整列数据；只有一块且不压缩时为零拷贝视图，否则拼接"""
+        parts = [self.block(i)[name] for i in range(len(self.blocks))]
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return np.empty(0, dtype=dict(COLUMNS)[name])
+        return np.concatenate(parts)
+
+    def timestamps(self):
+        """绝对时间戳 (ms), int64"""
+        if not self.blocks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.block_timestamps(i) for i in range(len(self.blocks))])
+
+    def rows(self, i, start=0, stop=None, cols=None, t=None):
+        """第 i 块 [start:stop) -> ROW_DTYPE 结构化数组"""
+        cols = cols if cols is not None else self.block(i)
+        if t is None:
+            t = self.block_timestamps(i, cols)
+        t = t[start:stop]
+        rows = np.empty(len(t), dtype=ROW_DTYPE)
+        rows['t'] = t
+        for name in ('e', 's', 'x', 'y', 'k'):
+            rows[name] = cols[name][start:stop]
+        return rows
+
+    def decode_block(self, i, start=0, stop=None, cols=None, t=None):
+        """第 i 块 [start:stop) -> 事件字典列表 (与 JSONL 格式一致)"""
+        cols = cols if cols is not None else self.block(i)
+        if t is None:
+            t = self.block_timestamps(i, cols)
+        t = t[start:stop].tolist()
+        e, s, x, y, k = (cols[n][start:stop].tolist() for n in ('e', 's', 'x', 'y', 'k'))
+        strings = self.strings
+        events = []
+        for j in range(len(t)):
+            code = e[j]
+            if code == 1:
+                events.append({"t": t[j], "e": "move", "x": x[j], "y": y[j]})
+            elif code == 2:
+                events.append({"t": t[j], "e": "click", "b": strings[k[j]], "s": s[j]})
+            elif code == 3:
+                events.append({"t": t[j], "e": "scroll", "dy": y[j]})
+            elif code == 4:
+                events.append({"t": t[j], "e": "key", "k": strings[k[j]], "s": s[j]})
+        return events
+
+    def iter_events(self, start_block=0):
+        for i in range(start_block, len(self.blocks)):
+            yield from self.decode_block(i)
+
+
+def iter_jsonl(filename):
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_events(filename):
+    """按文件内容自动识别格式，逐条产出事件字典"""
+    if is_binary_recording(filename):
+        with Recording(filename) as rec:
+            yield from rec.iter_events()
+    else:
+        yield from iter_jsonl(filename)
+
+
+def jsonl_to_binary(src, dst, compression=None, block_size=65536):
+    with RecordingWriter(dst, compression, block_size) as w:
+        w.extend(iter_jsonl(src))
+        return w.n_events
+
+
+def binary_to_jsonl(src, dst):
+    n = 0
+    with Recording(src) as rec, open(dst, 'w', encoding='utf-8') as f:
+        for event in rec.iter_events():
+            f.write(json.dumps(event) + "\n")
+            n += 1
+    return n
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="录制文件格式转换 (JSONL <-> .mkr)")
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    parser.add_argument("--compression", choices=["none", "zstd", "lz4"], default="none")
+    parser.add_argument("--block-size", type=int, default=65536)
+    args = parser.parse_args()
+
+    if is_binary_recording(args.src):
+        n = binary_to_jsonl(args.src, args.dst)
+    else:
+        n = jsonl_to_binary(args.src, args.dst, args.compression, args.block_size)
+    print(f"✅ 转换完成: {args.src} -> {args.dst}，共 {n} 条动作")
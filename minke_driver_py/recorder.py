@@ -1,14 +1,30 @@
 import time
-import json
-import threading
 from pynput import mouse, keyboard
+from capture import StreamingCapture
+from decimate import MoveDecimator
 
 class ActionRecorder:
-    def __init__(self, filename="actions.jsonl"):
+    def __init__(self, filename="actions.jsonl", ring_size=65536, flush_interval=0.5, compression=None,
+                 decimate=False, poll_ms=10, tolerance=1.0):
+        """
+        :param filename: 输出文件，以 .mkr 结尾时使用二进制列式格式
+        :param ring_size: 采集环形缓冲区容量 (条)，写盘跟不上时新事件会被丢弃并计数
+        :param flush_interval: 后台写盘间隔 (秒)
+        :param compression: .mkr 块压缩算法 (None / 'zstd' / 'lz4')
+        :param decimate: 写盘前对鼠标移动抽稀 (同一轮询周期合并 + 共线点剔除)，时间戳不变
+        :param poll_ms: 抽稀的轮询合并周期 (ms)，与目标机 HID 轮询间隔一致即可
+        :param tolerance: 共线点剔除容差 (像素)
+        """
         self.filename = filename
-        self.start_time = None
-        self.events = []
+        self.ring_size = ring_size
+        self.flush_interval = flush_interval
+        self.compression = compression
+        self.decimate = decimate
+        self.poll_ms = poll_ms
+        self.tolerance = tolerance
+        self.capture = None
         self.recording = False
+        self._last_key_down = None  # 用于过滤系统自动重复的按下事件
         
         # 键名清洗映射 (pynput -> hid_driver)
         self.key_map = {
@@ -26,8 +42,12 @@ class ActionRecorder:
         time.sleep(3)
         print("🔴 正在录制...")
         
-        self.events = []
-        self.start_time = time.perf_counter() * 1000 # 转为 ms
+        # 事件边录边写盘，内存占用恒定
+        decimator = MoveDecimator(self.poll_ms, self.tolerance) if self.decimate else None
+        self.capture = StreamingCapture(self.filename, self.ring_size, self.flush_interval,
+                                        compression=self.compression, decimator=decimator)
+        self.capture.start()
+        self._last_key_down = None
         self.recording = True
 
         # 启动监听线程
@@ -37,30 +57,25 @@ class ActionRecorder:
 
         self._save()
 
-    def _get_timestamp(self):
-        return int(time.perf_counter() * 1000 - self.start_time)
-
-    def _record(self, event_type, **kwargs):
+    def _record(self, event_type, x=0, y=0, s=0, name=None):
         if not self.recording: return
-        data = {
-            "t": self._get_timestamp(),
-            "e": event_type,
-            **kwargs
-        }
-        self.events.append(data)
+        self.capture.record(event_type, x, y, s, name)
 
     # --- 鼠标回调 ---
     def _on_move(self, x, y):
-        self._record("move", x=x, y=y)
+        self._last_key_down = None
+        self._record("move", x=int(x), y=int(y))
 
     def _on_click(self, x, y, button, pressed):
         btn = str(button).replace("Button.", "")
-        self._record("click", b=btn, s=1 if pressed else 0)
+        self._last_key_down = None
+        self._record("click", s=1 if pressed else 0, name=btn)
 
     def _on_scroll(self, x, y, dx, dy):
         # 记录滚轮 (dy 通常是 1 或 -1)
         if dy != 0:
-            self._record("scroll", dy=int(dy))
+            self._last_key_down = None
+            self._record("scroll", y=int(dy))
 
     # --- 键盘回调 ---
     def _clean_key(self, key):
@@ -76,23 +91,27 @@ class ActionRecorder:
         k_name = self._clean_key(key)
         # 避免长按时重复记录 "down" 事件 (系统自动重复)
         # 如果需要完全真实的物理表现，可以不去重；但为了文件体积，建议去重
-        if self.events and self.events[-1]['e'] == 'key' and \
-           self.events[-1]['k'] == k_name and self.events[-1]['s'] == 1:
+        if self._last_key_down == k_name:
             return
 
-        self._record("key", k=k_name, s=1)
+        self._last_key_down = k_name
+        self._record("key", s=1, name=k_name)
 
     def _on_release(self, key):
         if key == keyboard.Key.f12: return
         k_name = self._clean_key(key)
-        self._record("key", k=k_name, s=0)
+        self._last_key_down = None
+        self._record("key", s=0, name=k_name)
 
     def _save(self):
-        print(f"💾 录制结束，保存到 {self.filename}...")
-        with open(self.filename, 'w', encoding='utf-8') as f:
-            for event in self.events:
-                f.write(json.dumps(event) + "\n")
-        print(f"✅ 保存完成，共 {len(self.events)} 条动作")
+        print(f"💾 录制结束，写入剩余数据到 {self.filename}...")
+        self.capture.stop()
+        st = self.capture.stats()
+        print(f"✅ 保存完成，共 {st['written']} 条动作")
+        print(f"   丢弃: {st['dropped']} 条 | 回调耗时: 平均 {st['callback_avg_us']:.1f} us, "
+              f"最大 {st['callback_max_us']:.1f} us")
+        if self.capture.decimator is not None:
+            print(f"   抽稀: {self.capture.decimator.report}")
 
 if __name__ == "__main__":
     rec = ActionRecorder("combo_test.jsonl")
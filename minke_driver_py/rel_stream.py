@@ -0,0 +1,331 @@
+# ================= 相对模式流式运动 =================
+# HumanHID 的拟人化只覆盖绝对移动；FPS 视角控制用的相对模式只有 InputDevice.mouse_move
+# (一次性拆帧、阻塞发送)，跟枪时每次改目标都要等上一段发完。
+# RelativeStream 在后台线程里按固定采样率 (默认 1000Hz) 积分一条连续的运动:
+#   - 目标 aim()   : 五次多项式段 (最小加加速度)，从当前的位置/速度/加速度平滑接到新目标，
+#                    随时改目标不停顿；远距离时按概率先冲过头再回拉一小段
+#   - 速度 track() : 一阶平滑逼近目标速度 (跟随移动目标)，与目标段叠加
+#   - 微颤         : OU 过程的手部抖动，只在运动中叠加
+# 积分出的位移攒在浮点余量里；设备快要取下一帧时 (按 FrameTransmitter 的固件模型) 取整发出一帧。
+# 线上帧率 = min(采样率, HID 轮询率, 串口帧率)，固件队列里最多压一帧，帧里总是最新的状态；
+# 命令会立即唤醒线程，空闲时新目标从调用到写上串口只差一次唤醒。
+import math
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from hid_driver import EVENT_TYPE_MOUSE_REL, RelativeEncoder
+from scheduler import DEFAULT_SPIN
+
+STREAM_RATE = 1000          # 采样率 (Hz)
+
+# 目标段时长 (Fitts 定律): MOVE_BASE + MOVE_PER_BIT * log2(1 + 距离 / TARGET_WIDTH)，单位 HID 计数
+MOVE_BASE = 0.08
+MOVE_PER_BIT = 0.05
+TARGET_WIDTH = 20.0
+
+OVERSHOOT_MIN_DIST = 60.0   # 小于该距离的移动不冲过头
+TREMOR_TAU = 0.05           # 微颤的相关时间 (秒)
+
+
+def quintic(p0, v0, a0, p1, duration):
+    """
+    五次多项式段系数 (6, 2): 从 (位置, 速度, 加速度) 出发，duration 秒后停在 p1 (末速度、加速度为 0)
+    自变量为归一化时间 τ ∈ [0, 1]；v0 = a0 = 0 时即最小加加速度剖面 10τ³ - 15τ⁴ + 6τ⁵
+    """
+    d = p1 - p0
+    c1 = v0 * duration
+    c2 = a0 * duration ** 2 / 2
+    return np.array([p0, c1, c2,
+                     10 * d - 6 * c1 - 3 * c2,
+                     -15 * d + 8 * c1 + 3 * c2,
+                     6 * d - 3 * c1 - c2])
+
+
+class Segment:
+    """一段五次多项式运动 (时刻为 perf_counter)"""
+    __slots__ = ('start', 'duration', 'coef', 'end')
+
+    def __init__(self, start, duration, p0, v0, a0, p1):
+        self.start = start
+        self.duration = duration
+        self.coef = quintic(p0, v0, a0, p1, duration)
+        self.end = np.array(p1, dtype=np.float64)
+
+    def state(self, t):
+        """-> (位置, 速度, 加速度)，段结束后停在终点"""
+        T = self.duration
+        tau = (t - self.start) / T
+        if tau >= 1.0:
+            return self.end, np.zeros(2), np.zeros(2)
+        tau = max(tau, 0.0)
+        c0, c1, c2, c3, c4, c5 = self.coef
+        pos = c0 + tau * (c1 + tau * (c2 + tau * (c3 + tau * (c4 + tau * c5))))
+        vel = (c1 + tau * (2 * c2 + tau * (3 * c3 + tau * (4 * c4 + tau * 5 * c5)))) / T
+        acc = (2 * c2 + tau * (6 * c3 + tau * (12 * c4 + tau * 20 * c5))) / (T * T)
+        return pos, vel, acc
+
+
+def move_duration(distance):
+    """按 Fitts 定律估计一次瞄准的时长 (秒)"""
+    return MOVE_BASE + MOVE_PER_BIT * math.log2(1.0 + distance / TARGET_WIDTH)
+
+
+class RelativeStream:
+    """
+    相对模式流式运动引擎 (后台线程)，单位为 HID 相对计数
+
+    with human.rel_stream() as aim:
+        aim.aim(240, -35)        # 相对当前位置的位移，随时可以再调 (改目标)
+        aim.track(800, 0)        # 叠加跟随速度 (计数/秒)
+        aim.halt()               # 平滑刹停
+    运行期间由引擎独占设备的鼠标移动；按钮沿用 device.held_buttons (按住拖动时照常跟随)。
+    """
+    def __init__(self, device, rate=STREAM_RATE, jitter=0.4, overshoot=0.3, smoothing=0.05,
+                 speed=1.0, seed=None):
+        """
+        :param rate: 采样率 (Hz)，决定命令的响应粒度；线上帧率另受设备轮询率与串口限制
+        :param jitter: 微颤幅度 (计数，标准差)，0 关闭
+        :param overshoot: 远距离瞄准时冲过头的概率
+        :param smoothing: 速度指令的平滑时间常数 (秒)
+        :param speed: 目标段时长的倍率的倒数 (>1 更快)
+        """
+        self.device = device
+        self.rate = rate
+        self.jitter = jitter
+        self.overshoot = overshoot
+        self.smoothing = smoothing
+        self.speed = speed
+        self.rng = random.Random(seed)
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # 运动状态 (self._lock 保护)
+        self._segments = deque()        # 目标段队列 (第一段为当前段)
+        self._seg_pos = np.zeros(2)     # 目标段坐标系下上一次积分到的位置
+        self._v_target = np.zeros(2)
+        self._velocity = np.zeros(2)
+        self._tremor = np.zeros(2)
+        self._position = np.zeros(2)    # 累计指令位移 (浮点)
+        self._sent = np.zeros(2)        # 已发出的累计位移 (整数)
+        self._t = None                  # 上一次积分的时刻
+        self._command_t = None          # 尚未上线的最早一条命令的时刻 (统计命令到上线的延迟)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # ---------- 生命周期 ----------
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._t = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, name='minke-rel-stream', daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        """停止线程 (不等待未完成的运动)"""
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+
+    # ---------- 命令 ----------
+    def aim(self, dx, dy, duration=None):
+        """
+        瞄准: 目标 = 当前指令位置 + (dx, dy)，替换尚未完成的目标段
+        :param duration: 段时长 (秒)，None 时按距离 (Fitts 定律) 估计并加少量随机
+        """
+        with self._lock:
+            now = time.perf_counter()
+            self._advance(now)
+            self._plan(now, np.array((dx, dy), dtype=np.float64), duration)
+            self._notify(now)
+
+    def aim_to(self, x, y, duration=None):
+        """瞄准到累计坐标 (x, y) (以引擎启动时为原点)"""
+        with self._lock:
+            now = time.perf_counter()
+            self._advance(now)
+            self._plan(now, np.array((x, y), dtype=np.float64) - self._position, duration)
+            self._notify(now)
+
+    def track(self, vx, vy):
+        """跟随速度 (计数/秒)，与目标段叠加；track(0, 0) 平滑停止跟随"""
+        with self._lock:
+            now = time.perf_counter()
+            self._advance(now)
+            self._v_target = np.array((vx, vy), dtype=np.float64)
+            self._notify(now)
+
+    def halt(self, duration=0.1):
+        """平滑刹停: 清掉目标段与跟随速度，按当前速度滑行一小段后停下"""
+        with self._lock:
+            now = time.perf_counter()
+            self._advance(now)
+            pos, vel, acc = self._seg_state(now)
+            vel = vel + self._velocity
+            self._v_target[:] = 0.0
+            self._velocity[:] = 0.0
+            self._segments.clear()
+            # 匀减速的位移为 v·T/2
+            self._segments.append(Segment(now, duration, pos, vel, acc, pos + vel * duration / 2))
+            self._notify(now)
+
+    @property
+    def position(self):
+        """累计指令位移 (计数)"""
+        with self._lock:
+            return self._position.copy()
+
+    @property
+    def sent(self):
+        """已写上串口的累计位移 (计数)"""
+        with self._lock:
+            return self._sent.copy()
+
+    @property
+    def moving(self):
+        with self._lock:
+            return not self._idle()
+
+    def wait_idle(self, timeout=None):
+        """等到运动结束且余量全部发出"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while self.moving:
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+            time.sleep(0.002)
+        return True
+
+    # ---------- 运动模型 ----------
+    def _notify(self, now):
+        if self._command_t is None:
+            self._command_t = now
+        self._wake.set()
+
+    def _seg_state(self, now):
+        if not self._segments:
+            return self._seg_pos.copy(), np.zeros(2), np.zeros(2)
+        return self._segments[0].state(now)
+
+    def _plan(self, now, delta, duration):
+        """从当前段的状态接一段到 当前位置 + delta (必要时先冲过头)"""
+        pos, vel, acc = self._seg_state(now)
+        self._segments.clear()
+        dist = float(np.hypot(*delta))
+        if duration is None:
+            duration = move_duration(dist) / self.speed * self.rng.uniform(0.85, 1.15)
+        target = pos + delta
+        if dist > OVERSHOOT_MIN_DIST and self.rng.random() < self.overshoot:
+            over = target + delta * self.rng.uniform(0.03, 0.08)
+            first = duration * 0.8
+            self._segments.append(Segment(now, first, pos, vel, acc, over))
+            back = max(0.06, duration * 0.3)
+            self._segments.append(Segment(now + first, back, over, np.zeros(2), np.zeros(2), target))
+        else:
+            self._segments.append(Segment(now, max(duration, 1e-3), pos, vel, acc, target))
+
+    def _advance(self, now):
+        """把运动积分到 now，结果累加进 _position"""
+        dt = now - self._t
+        self._t = now
+        if dt <= 0:
+            return
+
+        # 目标段: 当前段结束后切到下一段 (下一段从上一段终点出发，位置连续)
+        segs = self._segments
+        while len(segs) > 1 and now >= segs[0].start + segs[0].duration:
+            segs.popleft()
+        moving = bool(segs)
+        if segs:
+            pos = segs[0].state(now)[0]
+            self._position += pos - self._seg_pos
+            self._seg_pos = pos
+            if now >= segs[0].start + segs[0].duration:
+                segs.popleft()
+
+        # 跟随速度: 一阶平滑
+        if self._v_target.any() or self._velocity.any():
+            alpha = 1.0 - math.exp(-dt / self.smoothing)
+            self._velocity += (self._v_target - self._velocity) * alpha
+            if not self._v_target.any() and np.abs(self._velocity).max() < 0.5:
+                self._velocity[:] = 0.0
+            self._position += self._velocity * dt
+            moving = True
+
+        # 微颤: OU 过程，只在运动中叠加
+        if moving and self.jitter:
+            k = dt / TREMOR_TAU
+            noise = self.jitter * math.sqrt(2 * k)
+            step = -self._tremor * k + (self.rng.gauss(0, noise), self.rng.gauss(0, noise))
+            self._tremor += step
+            self._position += step
+
+    def _idle(self):
+        return (not self._segments and not self._v_target.any() and not self._velocity.any()
+                and np.abs(self._position - self._sent).max() < 0.5)
+
+    # ---------- 发送 ----------
+    def _emit(self):
+        """设备快要取下一帧时，把攒下的整数位移作为一帧发出"""
+        dev = self.device
+        tx = dev.tx
+        # 调用方线程也可能在同一设备上发送: 判断余量、入缓冲与写出在发送锁内完成
+        with dev.send_lock:
+            if not dev.ser or tx.lead_time > tx.frame_time:
+                return False
+            limit = RelativeEncoder.MAX_STEP
+            x, y = (int(v) for v in np.clip(np.rint(self._position - self._sent), -limit, limit))
+            if not (x or y):
+                return False
+            dev._push(EVENT_TYPE_MOUSE_REL, dev.held_buttons, 0,
+                      x & 0xFF, (x >> 8) & 0xFF, y & 0xFF, (y >> 8) & 0xFF, 0)
+            tx.flush()
+        self._sent += (x, y)
+        if self._command_t is not None:
+            dev.metrics.observe('stream_latency_seconds', 'command', time.perf_counter() - self._command_t)
+            self._command_t = None
+        return True
+
+    def _run(self):
+        period = 1.0 / self.rate
+        metrics = self.device.metrics
+        deadline = time.perf_counter()
+        while not self._stop.is_set():
+            with self._lock:
+                self._advance(time.perf_counter())
+                self._emit()
+                idle = self._idle()
+                if idle:
+                    self._command_t = None
+            metrics.inc('stream_ticks_total')
+
+            if idle:
+                self._wake.wait()
+                self._wake.clear()
+                deadline = time.perf_counter()
+                continue
+
+            # 绝对截止时刻 (同 Scheduler)，落后太多时重新起算；命令到达立即醒来
+            deadline += period
+            now = time.perf_counter()
+            if now - deadline > 0.02:
+                deadline = now
+            remaining = deadline - now
+            if remaining > DEFAULT_SPIN and self._wake.wait(remaining - DEFAULT_SPIN):
+                self._wake.clear()
+                continue
+            while time.perf_counter() < deadline and not self._wake.is_set():
+                time.sleep(0)
+            self._wake.clear()
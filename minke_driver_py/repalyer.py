@@ -1,69 +1,157 @@
-import time
-import json
-import pyautogui
+import numpy as np
+from hid_driver import (MOUSE_BTNS, MOUSE_FRAME_DTYPE, KEY_FRAME_DTYPE, EVENT_TYPE_KEYBOARD,
+                        EVENT_TYPE_MOUSE_REL, EVENT_TYPE_MOUSE_ABS, resolve_key)
 from human_hid import HumanHID
+from stream_replay import EventStream
 
 class ActionReplayer:
-    def __init__(self, device_port, screen_res=(1920, 1080)):
+    def __init__(self, device_port, screen_res=(1920, 1080), device_timed=False):
+        """
+        :param device_timed: 设备计时回放。事件按块批量编码成帧，录制的时间差写进 delay_ms，
+                             由固件计时；上位机只负责按队列余量上传，不再逐条 sleep。
+        """
         self.port = device_port
         self.sw, self.sh = screen_res
+        self.device_timed = device_timed
 
-    def play(self, filename, speed=1.0):
+    def play(self, filename, speed=1.0, start_ms=None, end_ms=None, loop=False):
+        """
+        流式回放 (边读边放，内存占用与文件大小无关)
+        :param start_ms, end_ms: 只回放录制时间轴上的 [start_ms, end_ms) 区间 (毫秒)
+        :param loop: 循环回放该区间，Ctrl+C 结束
+        """
         print(f"▶️ 开始回放: {filename} (倍速: {speed})")
-        
-        # 加载所有数据到内存
-        actions = []
-        with open(filename, 'r', encoding='utf-8') as f:
-            for line in f:
-                actions.append(json.loads(line))
-
-        if not actions:
-            print("❌ 文件为空")
-            return
 
-        with HumanHID(self.port, self.sw, self.sh) as human:
-            # 初始时间基准
-            start_real_time = time.perf_counter() * 1000
-            start_record_time = actions[0]['t']
-
-            for action in actions:
-                # 1. 时间同步
-                target_offset = (action['t'] - start_record_time) / speed
-                current_offset = time.perf_counter() * 1000 - start_real_time
-                
-                wait_ms = target_offset - current_offset
-                if wait_ms > 0:
-                    time.sleep(wait_ms / 1000.0)
-
-                # 2. 执行动作
-                etype = action['e']
-                
-                if etype == 'move':
-                    # 像素转百分比 (包含安全边距处理在底层驱动中)
-                    # 注意：回放时直接用底层 move_to，不需要 jitter，因为录制的轨迹本身就是抖动的
-                    human.device.mouse_move_to(action['x'] / self.sw, action['y'] / self.sh)
-                
-                elif etype == 'click':
-                    btn = action['b']
-                    if action['s'] == 1:
-                        human.device.mouse_down(btn)
-                    else:
-                        human.device.mouse_up(btn)
-                
-                elif etype == 'scroll':
-                    # 录制的是 dy，通常为 1 或 -1
-                    human.device.mouse_scroll(action['dy'])
-
-                elif etype == 'key':
-                    key = action['k']
-                    if action['s'] == 1:
-                        # 对于组合键，这里会连续调用 key_down，例如先 ctrl_down 再 c_down
-                        # 底层驱动会自动处理 modifier 逻辑
-                        human.device.key_down(key)
-                    else:
-                        human.device.key_up(key)
+        with HumanHID(self.port, self.sw, self.sh, device_timed=self.device_timed) as human:
+            played = self.replay(human, filename, speed, start_ms, end_ms, loop)
+        if not played:
+            print("❌ 文件为空或区间内没有动作")
+            return
 
         print("🏁 回放结束")
+        if not self.device_timed:
+            st = human.device.scheduler.stats()
+            print(f"   计时: {st['count']} 个事件，迟到 平均 {st['mean_ms']:.2f} ms, "
+                  f"p95 {st['p95_ms']:.2f} ms, 最大 {st['max_ms']:.2f} ms")
+
+    def replay(self, human, filename, speed=1.0, start_ms=None, end_ms=None, loop=False):
+        """
+        在已连接的 HumanHID 上回放 (连接由调用方管理，例如 DevicePool)
+        计时方式跟随 human.device 的 device_timed
+        :return: 回放的事件数
+        """
+        dev = human.device
+        segment = self._play_segment_frames if dev.device_timed else self._play_segment
+        total = 0
+        with dev.batch():
+            dev.scheduler.reset_stats()
+            while True:
+                played = segment(human, filename, speed, start_ms, end_ms)
+                total += played
+                if not played or not loop:
+                    break
+        return total
+
+    def _play_segment(self, human, filename, speed, start_ms, end_ms):
+        dev = human.device
+        played = 0
+        start_real_time = start_record_time = None
+        for action in EventStream(filename, start_ms, end_ms):
+            if start_real_time is None:
+                # 初始时间基准
+                start_real_time = dev.scheduler.now()
+                start_record_time = action['t']
+
+            # 1. 时间同步: 每个事件对齐到绝对截止时刻，sleep 的误差不会逐条累积
+            # 同一时刻的动作会合并到一次 write，需要等待时才把缓冲区发出去
+            late = dev.wait_until(start_real_time + (action['t'] - start_record_time) / speed / 1000.0)
+            dev.metrics.observe('replay_lateness_seconds', 'host', late)
+
+            # 2. 执行动作
+            self._dispatch(human, action)
+            played += 1
+        dev.metrics.inc('replay_events_total', played)
+        return played
+
+    def _play_segment_frames(self, human, filename, speed, start_ms, end_ms):
+        dev = human.device
+        played = 0
+        prev_t = None
+        for rows, strings in EventStream(filename, start_ms, end_ms, raw=True):
+            t = rows['t']
+            delays = np.diff(t, prepend=t[0] if prev_t is None else prev_t) / speed
+            prev_t = int(t[-1])
+            dev.send_frames(self._encode_rows(dev, rows, strings), delays=delays)
+            # 外层 batch 不会自动发送；flush 受固件队列余量限制，读取进度自然跟着设备走
+            dev.flush()
+            played += len(rows)
+        dev.metrics.inc('replay_events_total', played)
+        return played
+
+    def _encode_rows(self, dev, rows, strings):
+        """ROW_DTYPE 记录 -> 结构化帧数组，与 _dispatch 逐条发送的帧逐字节一致"""
+        btn_lut = np.array([MOUSE_BTNS.get(name, 0) for name in strings] or [0], dtype=np.uint8)
+        keys = [resolve_key(name) for name in strings] or [(0, 0)]
+        code_lut = np.array([c for c, _ in keys], dtype=np.uint8)
+        mod_lut = np.array([m for _, m in keys], dtype=np.uint8)
+
+        frames = dev.encoder.frames(len(rows))
+        m = frames.view(MOUSE_FRAME_DTYPE)
+        kf = frames.view(KEY_FRAME_DTYPE)
+        e, s, k = rows['e'], rows['s'], rows['k']
+
+        # move: 与 mouse_move_to 相同的换算与边界钳制
+        move = e == 1
+        lo = dev.safe_margin
+        m['type'][move] = EVENT_TYPE_MOUSE_ABS
+        m['x'][move] = np.clip((rows['x'][move] / self.sw * dev.abs_max_x).astype(np.int32),
+                               lo, dev.abs_max_x - lo)
+        m['y'][move] = np.clip((rows['y'][move] / self.sh * dev.abs_max_y).astype(np.int32),
+                               lo, dev.abs_max_y - lo)
+
+        click = e == 2
+        m['type'][click] = EVENT_TYPE_MOUSE_REL
+        m['buttons'][click] = np.where(s[click] == 1, btn_lut[k[click]], 0)
+
+        scroll = e == 3
+        m['type'][scroll] = EVENT_TYPE_MOUSE_REL
+        m['wheel'][scroll] = np.clip(rows['y'][scroll], -127, 127)
+
+        down = (e == 4) & (s == 1)
+        up = (e == 4) & (s != 1)
+        kf['type'][down | up] = EVENT_TYPE_KEYBOARD
+        kf['code'][down] = code_lut[k[down]]
+        kf['mod'][down] = mod_lut[k[down]]
+        kf['flags'][up] = 0x80
+        return frames
+
+    def _dispatch(self, human, action):
+        etype = action['e']
+        
+        if etype == 'move':
+            # 像素转百分比 (包含安全边距处理在底层驱动中)
+            # 注意：回放时直接用底层 move_to，不需要 jitter，因为录制的轨迹本身就是抖动的
+            human.device.mouse_move_to(action['x'] / self.sw, action['y'] / self.sh)
+        
+        elif etype == 'click':
+            btn = action['b']
+            if action['s'] == 1:
+                human.device.mouse_down(btn)
+            else:
+                human.device.mouse_up(btn)
+        
+        elif etype == 'scroll':
+            # 录制的是 dy，通常为 1 或 -1
+            human.device.mouse_scroll(action['dy'])
+
+        elif etype == 'key':
+            key = action['k']
+            if action['s'] == 1:
+                # 对于组合键，这里会连续调用 key_down，例如先 ctrl_down 再 c_down
+                # 底层驱动会自动处理 modifier 逻辑
+                human.device.key_down(key)
+            else:
+                human.device.key_up(key)
 
 if __name__ == "__main__":
     # 请根据实际屏幕分辨率修改
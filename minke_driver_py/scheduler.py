@@ -0,0 +1,109 @@
+# ================= 高精度调度器 =================
+# time.sleep 经常多睡 1~15ms (Windows 默认时钟粒度 15.6ms)，按步 sleep 时误差逐步累积，
+# 轨迹总是比要求的 duration 晚结束。这里改为等绝对截止时刻:
+#   - 粗睡到截止前 spin 秒，最后一段自旋 (期间 sleep(0) 让出 GIL)
+#   - 连续等待串成一条时间线: 下一个截止时刻 = 上一个截止时刻 + 间隔，
+#     上一步迟到的部分在这一步扣回，误差不随步数累积
+#   - 距上一个截止时刻超过 max_lag 时 (中间做了别的事)，以当前时刻重新起算
+# 每次等待记录迟到量 (醒来时刻 - 截止时刻)，stats() 给出分布，用来验证负载下的计时精度。
+import asyncio
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+if sys.platform == 'win32' and sys.version_info < (3, 11):
+    DEFAULT_SPIN = 0.016   # 3.11 之前 Windows 上 sleep 按 15.6ms 时钟粒度唤醒
+else:
+    DEFAULT_SPIN = 0.002
+
+
+class Scheduler:
+    """
+    绝对截止时刻调度器
+
+    sched = Scheduler()
+    for point in path:
+        send(point)
+        sched.wait(dt)          # 截止时刻逐步累加，总时长 = len(path) * dt
+    print(sched.stats())
+    """
+    now = staticmethod(time.perf_counter)
+
+    def __init__(self, spin=DEFAULT_SPIN, max_lag=0.02, history=4096):
+        """
+        :param spin: 截止前最后多少秒改为自旋
+        :param max_lag: 距上一个截止时刻超过该秒数时重新起算时间线
+        :param history: 统计窗口 (最近多少次等待)
+        """
+        self.spin = spin
+        self.max_lag = max_lag
+        self.deadline = None
+        self._late = deque(maxlen=history)
+        self.count = 0
+
+    def next_deadline(self, seconds):
+        """在时间线上前进 seconds 秒，返回新的截止时刻"""
+        now = self.now()
+        if self.deadline is None or now - self.deadline > self.max_lag:
+            base = now
+        else:
+            base = self.deadline
+        self.deadline = base + seconds
+        return self.deadline
+
+    def _record(self, deadline):
+        late = self.now() - deadline
+        self._late.append(late)
+        self.count += 1
+        return late
+
+    def sleep_until(self, deadline):
+        """粗睡 + 自旋到 deadline (不记录统计)"""
+        remaining = deadline - self.now()
+        if remaining > self.spin:
+            time.sleep(remaining - self.spin)
+        while self.now() < deadline:
+            time.sleep(0)
+
+    def wait_until(self, deadline):
+        """等到绝对时刻 deadline (已过期则立即返回)，返回迟到秒数"""
+        self.deadline = deadline
+        self.sleep_until(deadline)
+        return self._record(deadline)
+
+    def wait(self, seconds):
+        """时间线上等待 seconds 秒，返回迟到秒数"""
+        return self.wait_until(self.next_deadline(seconds))
+
+    async def async_wait_until(self, deadline):
+        """asyncio 版本: 粗等交给事件循环，自旋阶段每轮让出一次"""
+        self.deadline = deadline
+        remaining = deadline - self.now()
+        if remaining > self.spin:
+            await asyncio.sleep(remaining - self.spin)
+        while self.now() < deadline:
+            await asyncio.sleep(0)
+        return self._record(deadline)
+
+    async def async_wait(self, seconds):
+        return await self.async_wait_until(self.next_deadline(seconds))
+
+    def reset_stats(self):
+        self._late.clear()
+        self.count = 0
+
+    def stats(self):
+        """最近 history 次等待的迟到分布 (毫秒)"""
+        if not self._late:
+            return {'count': self.count}
+        late = np.array(self._late) * 1000.0
+        return {
+            'count': self.count,
+            'mean_ms': float(late.mean()),
+            'p50_ms': float(np.percentile(late, 50)),
+            'p95_ms': float(np.percentile(late, 95)),
+            'p99_ms': float(np.percentile(late, 99)),
+            'max_ms': float(late.max()),
+        }
@@ -0,0 +1,114 @@
+# ================= 移动步进规划 =================
+# move_to 原来不论距离都按 steps = max(duration * 60, 5) 均匀取点、均匀间隔发送:
+# 4 像素的微调在 0.5 秒里也发 30 帧，大部分落在同一个屏幕像素上；长距离又被限制在 60 帧/秒。
+# 这里按距离与链路能力决定采样:
+#   - 步数: 轨迹长度每 min_step_px 像素一步，上限为 时长 x 帧率预算
+#           (帧率预算 = min(HID 轮询率, 串口帧率)；超过轮询率的帧只会在固件队列里排队，拉长动作)
+#   - 时刻: 等间隔时刻上按速度剖面取曲线参数 (默认最小加加速度: 起止慢、中段快，速度呈钟形)
+#   - 抽稀: 量化到屏幕像素后与前一步相同的步直接丢掉，它的时间并入下一步的间隔
+import math
+
+import numpy as np
+
+from hid_driver import HID_POLL_INTERVAL
+
+
+def minimum_jerk(tau):
+    """最小加加速度位置剖面 s(τ) = 10τ³ - 15τ⁴ + 6τ⁵ (起止处速度、加速度均为 0)"""
+    return tau ** 3 * (10.0 - 15.0 * tau + 6.0 * tau ** 2)
+
+
+def linear(tau):
+    """匀速剖面 (原来的均匀取点)"""
+    return tau
+
+
+def arc_length(ctrl_px):
+    """三次贝塞尔弧长估计 (像素): 弦长与控制多边形周长的平均"""
+    ctrl_px = np.asarray(ctrl_px, dtype=np.float64)
+    chord = math.hypot(*(ctrl_px[-1] - ctrl_px[0]))
+    poly = float(np.hypot(*np.diff(ctrl_px, axis=0).T).sum())
+    return (chord + poly) / 2
+
+
+def arc_lengths(ctrl_px):
+    """arc_length 的批量版本: (N, 4, 2) -> (N,)"""
+    ctrl_px = np.asarray(ctrl_px, dtype=np.float64)
+    chord = np.hypot(*(ctrl_px[:, -1] - ctrl_px[:, 0]).T)
+    poly = np.hypot(*np.diff(ctrl_px, axis=1).transpose(2, 0, 1)).sum(axis=1)
+    return (chord + poly) / 2
+
+
+def polyline_length(path_px):
+    path_px = np.asarray(path_px, dtype=np.float64)
+    return float(np.hypot(*np.diff(path_px, axis=0).T).sum())
+
+
+def resample(path, u):
+    """按曲线参数 u (0~1) 在均匀参数化的折线上线性插值 -> (len(u), 2)"""
+    idx = np.asarray(u, dtype=np.float64) * (len(path) - 1)
+    grid = np.arange(len(path))
+    return np.stack([np.interp(idx, grid, path[:, 0]), np.interp(idx, grid, path[:, 1])],
+                    axis=1).astype(np.float32)
+
+
+class StepPlanner:
+    """
+    按距离规划一次移动的采样
+
+    planner = StepPlanner(link_rate=1 / dev.tx.frame_time)
+    n = planner.count(length_px, duration)
+    u, times = planner.schedule(n, duration)     # 曲线参数与发送时刻
+    path = bezier_at(u, ctrl)
+    path, gaps = planner.thin(path, times, 1920, 1080)
+    """
+    def __init__(self, hid_interval=HID_POLL_INTERVAL, link_rate=None, min_step_px=1.0,
+                 min_steps=1, profile=minimum_jerk):
+        """
+        :param hid_interval: 目标 HID 轮询间隔 (秒)
+        :param link_rate: 串口每秒能送达的帧数，None 表示不受限
+        :param min_step_px: 每步的最小弧长 (像素)，更细的采样量化后只会重复同一个像素
+        :param profile: 速度剖面 τ -> s，[0, 1] 上单调，s(0) = 0，s(1) = 1
+        """
+        self.hid_interval = hid_interval
+        self.link_rate = link_rate
+        self.min_step_px = min_step_px
+        self.min_steps = min_steps
+        self.profile = profile
+
+    @property
+    def max_rate(self):
+        """帧率预算 (帧/秒)"""
+        rate = 1.0 / self.hid_interval
+        return min(rate, self.link_rate) if self.link_rate else rate
+
+    def count(self, length_px, duration):
+        """步数: 按弧长取，不超过帧率预算"""
+        n = math.ceil(length_px / self.min_step_px)
+        limit = max(1, int(duration * self.max_rate))
+        return max(self.min_steps, min(n, limit))
+
+    def counts(self, lengths_px, durations):
+        """count 的批量版本 -> int64 数组"""
+        n = np.ceil(np.asarray(lengths_px, dtype=np.float64) / self.min_step_px).astype(np.int64)
+        limit = np.maximum(1, (np.asarray(durations, dtype=np.float64) * self.max_rate).astype(np.int64))
+        return np.maximum(self.min_steps, np.minimum(n, limit))
+
+    def schedule(self, n, duration):
+        """n 步 -> (曲线参数 u, 发送时刻 秒)，各 n+1 个点 (含起点)"""
+        tau = np.linspace(0.0, 1.0, n + 1)
+        return self.profile(tau), tau * duration
+
+    @staticmethod
+    def thin(path, times, screen_w, screen_h):
+        """
+        丢掉屏幕像素不变的步
+        :param path: (n+1, 2) 百分比坐标，path[0] 为起点 (保留，对应第一帧)
+        :return: (path, gaps)，gaps[i] 为第 i 帧之后到下一帧的等待秒数，最后一帧为 0
+        """
+        px = np.rint(np.asarray(path, dtype=np.float64) * (screen_w, screen_h))
+        keep = np.ones(len(path), dtype=bool)
+        keep[1:] = np.any(px[1:] != px[:-1], axis=1)
+        keep[-1] = True
+        t = np.asarray(times)[keep]
+        return path[keep], np.diff(t, append=t[-1])
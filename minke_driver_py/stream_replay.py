@@ -0,0 +1,219 @@
+# ================= 流式、可定位的事件读取 =================
+# 回放不再一次性把整个文件读进内存：后台预读线程按块解码，经有界队列交给回放线程。
+# 定位 (从任意时间戳开始) 依赖稀疏时间索引:
+#   - .mkr : 文件自带块索引 (每块的起止时间)，二分查找到块即可
+#   - JSONL: 时间戳单调递增，直接在字节偏移上二分 (每次探测读一行)，
+#            探测结果缓存为稀疏索引，不需要扫描整个文件
+import bisect
+import functools
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+from record_format import ROW_DTYPE, Recording, encode_event, is_binary_recording
+
+_END = object()
+INDEX_CACHE_SIZE = 32   # 最多缓存多少个文件的索引 (LRU)，文件改动后键随之改变，旧索引自然淘汰
+
+
+def jsonl_index(filename):
+    """按 (路径, 大小, 修改时间) 缓存的 JSONL 索引，循环回放时复用探测结果"""
+    st = os.stat(filename)
+    return _cached_index(os.path.abspath(filename), st.st_size, st.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=INDEX_CACHE_SIZE)
+def _cached_index(path, size, mtime_ns):
+    return JsonlIndex(path)
+
+
+class JsonlIndex:
+    """JSONL 稀疏时间索引: 在字节偏移上二分查找时间戳"""
+    def __init__(self, filename):
+        self.filename = filename
+        self.size = os.path.getsize(filename)
+        self._offsets = [0]   # 已探测到的 (行首偏移, 时间戳)，按偏移排序
+        self._times = [None]
+
+    @staticmethod
+    def _line_at(f, offset):
+        """offset 之后第一个完整行 -> (行首偏移, 事件)；到文件尾返回 (None, None)"""
+        f.seek(offset)
+        if offset:
+            f.readline()  # 跳过半行
+        while True:
+            pos = f.tell()
+            line = f.readline()
+            if not line:
+                return None, None
+            if line.strip():
+                return pos, json.loads(line)
+
+    def seek_offset(self, t_ms):
+        """返回一个字节偏移，从这里开始读，之后第一个事件的时间戳 >= t_ms 前不会漏掉事件"""
+        if t_ms is None:
+            return 0
+        with open(self.filename, 'rb') as f:
+            lo, hi = 0, self.size
+            # 利用已缓存的探测点收窄区间
+            for off, t in zip(self._offsets, self._times):
+                if t is not None and t < t_ms:
+                    lo = max(lo, off)
+                elif t is not None:
+                    hi = min(hi, off)
+            while hi - lo > 4096:
+                mid = (lo + hi) // 2
+                pos, event = self._line_at(f, mid)
+                if pos is None or pos >= hi:
+                    hi = mid
+                    continue
+                i = bisect.bisect_left(self._offsets, pos)
+                if i == len(self._offsets) or self._offsets[i] != pos:
+                    self._offsets.insert(i, pos)
+                    self._times.insert(i, event['t'])
+                if event['t'] < t_ms:
+                    lo = pos
+                else:
+                    hi = pos
+            return lo
+
+
+class EventStream:
+    """
+    流式事件迭代器 (带预读线程)
+
+    for event in EventStream('actions.mkr', start_ms=60000, end_ms=90000):
+        ...
+    :param start_ms, end_ms: 录制时间轴上的区间 [start_ms, end_ms)，None 表示不限
+    :param prefetch: 预读块数 (内存占用上限 = prefetch * chunk)
+    :param raw: 不解码成字典，逐块产出 (ROW_DTYPE 结构化数组, 字符串表)，供批量编码使用
+    """
+    def __init__(self, filename, start_ms=None, end_ms=None, prefetch=4, chunk=4096, raw=False):
+        self.filename = filename
+        self.raw = raw
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.chunk = chunk
+        self.binary = is_binary_recording(filename)
+        self._queue = queue.Queue(maxsize=prefetch)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, name='minke-prefetch', daemon=True)
+        self._thread.start()
+
+    def __iter__(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                if self.raw:
+                    yield item
+                else:
+                    yield from item
+        finally:
+            self.close()
+
+    def close(self):
+        self._stop.set()
+        # 让可能阻塞在 put 上的预读线程退出
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _in_range(self, events):
+        start, end = self.start_ms, self.end_ms
+        out = []
+        for event in events:
+            t = event['t']
+            if start is not None and t < start:
+                continue
+            if end is not None and t >= end:
+                return out, True
+            out.append(event)
+        return out, False
+
+    def _rows_in_range(self, rows):
+        t = rows['t']
+        lo = int(np.searchsorted(t, self.start_ms, side='left')) if self.start_ms is not None else 0
+        hi = int(np.searchsorted(t, self.end_ms, side='left')) if self.end_ms is not None else len(t)
+        return rows[lo:hi], hi < len(t)
+
+    def _produce(self):
+        try:
+            if self.binary:
+                self._produce_binary()
+            else:
+                self._produce_jsonl()
+        except BaseException as e:
+            self._put(e)
+            return
+        self._put(_END)
+
+    def _produce_binary(self):
+        with Recording(self.filename) as rec:
+            first = 0
+            if self.start_ms is not None:
+                ends = [b[2] for b in rec.blocks]
+                first = bisect.bisect_left(ends, self.start_ms)
+            for i in range(first, len(rec.blocks)):
+                if self.end_ms is not None and rec.blocks[i][1] >= self.end_ms:
+                    return
+                # 块可能很大，按 chunk 切片解码；首块内用时间戳二分定位
+                cols = rec.block(i)
+                t = rec.block_timestamps(i, cols)
+                j = 0
+                if self.start_ms is not None and i == first:
+                    j = int(np.searchsorted(t, self.start_ms, side='left'))
+                while j < len(t):
+                    if self.raw:
+                        rows, done = self._rows_in_range(rec.rows(i, j, j + self.chunk, cols, t))
+                        events = (rows, rec.strings) if len(rows) else None
+                    else:
+                        events, done = self._in_range(rec.decode_block(i, j, j + self.chunk, cols, t))
+                    if events and not self._put(events):
+                        return
+                    if done:
+                        return
+                    j += self.chunk
+
+    def _produce_jsonl(self):
+        offset = jsonl_index(self.filename).seek_offset(self.start_ms)
+        strings, string_ids = [], {}
+
+        def string_id(name):
+            sid = string_ids.get(name)
+            if sid is None:
+                sid = string_ids[name] = len(strings)
+                strings.append(name)
+            return sid
+
+        with open(self.filename, 'rb') as f:
+            f.seek(offset)
+            while not self._stop.is_set():
+                lines = f.readlines(self.chunk * 48)
+                if not lines:
+                    return
+                events, done = self._in_range(json.loads(l) for l in lines if l.strip())
+                if self.raw and events:
+                    events = (np.array([encode_event(ev, string_id) for ev in events], dtype=ROW_DTYPE),
+                              list(strings))
+                if events and not self._put(events):
+                    return
+                if done:
+                    return
@@ -0,0 +1,189 @@
+# ================= 批量点击的访问顺序 =================
+# 按检测顺序逐个 click_at 时，鼠标在屏幕上来回横跳；批量点击先排一条短的访问路线再走:
+#   - 构造: 从当前逻辑坐标出发的近邻路线。逐点找最近邻是 n 次 numpy 调用 (几百个目标就要几毫秒)，
+#           这里改用 Moore 曲线 (首尾相接的 Hilbert 曲线) 排序: 曲线上相邻的点在平面上也相邻，
+#           一次排序得到同样"就近走"的路线；在起点所在的位置把环切开，从离起点近的一端走起
+#   - 改进: 窗口内的 2-opt。对每个位置 p、每个段长 k，把 p 之后的 k+1 个点反转的收益
+#           |p,a| + |b,q| - |p,b| - |a,q| 按预先算好的下标网格一次算完 (n x window 的数组运算)，
+#           每轮按收益从大到小应用互不重叠的反转，直到没有收益或达到轮数上限；
+#           路线终点自由 (不回起点)，反转到末尾时少一条边
+# 200 个目标的规划不到 1 毫秒 (见 benchmark.py tour)。
+# 每段移动的时长按 Fitts 定律由距离决定 (常数与 rel_stream.move_duration 相同)。
+from functools import lru_cache
+
+import numpy as np
+
+from rel_stream import MOVE_BASE, MOVE_PER_BIT, TARGET_WIDTH
+
+CURVE_ORDER = 7      # Moore 曲线阶数: 2^7 x 2^7 网格 (1080p 下每格 15 像素，格内的先后交给 2-opt)
+TWO_OPT_WINDOW = 8   # 2-opt 反转段的最大长度 - 1
+TWO_OPT_PASSES = 4
+
+
+def _hilbert_index(x, y, order):
+    """整数网格坐标 (0 ~ 2^order - 1) -> Hilbert 曲线上的序号 (向量化)"""
+    d = np.zeros(len(x), dtype=np.int64)
+    s = 1 << (order - 1)
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        flip = ~ry & rx
+        x = np.where(flip, s - 1 - x, x)
+        y = np.where(flip, s - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s >>= 1
+    return d
+
+
+def _moore_index(x, y, order):
+    """
+    整数网格坐标 (0 ~ 2^order - 1) -> Moore 曲线上的序号
+    Moore 曲线由四个 Hilbert 子曲线拼成一个环: 象限按 左下 -> 左上 -> 右上 -> 右下 访问，
+    上半两个子曲线原样，下半两个旋转 180°，首尾相接
+    """
+    h = 1 << (order - 1)
+    right = x >= h
+    top = y >= h
+    x = x - right * h
+    y = y - top * h
+    quadrant = np.where(right, np.where(top, 2, 3), np.where(top, 1, 0))
+    x = np.where(top, x, h - 1 - x)
+    y = np.where(top, y, h - 1 - y)
+    return quadrant * (h * h) + _hilbert_index(x, y, order - 1)
+
+
+@lru_cache(maxsize=4)
+def _moore_table(order):
+    """整张网格的曲线序号表 (按 y * 2^order + x 展开)，只读"""
+    n = 1 << order
+    y, x = np.divmod(np.arange(n * n), n)
+    table = _moore_index(x, y, order).astype(np.int32)
+    table.setflags(write=False)
+    return table
+
+
+_moore_table(CURVE_ORDER)    # 建表要几毫秒，导入时完成，第一次规划不用等
+
+
+def moore_index(points, order=CURVE_ORDER):
+    """(n, 2) 单位正方形内的坐标 -> Moore 曲线上的序号 (查表)"""
+    points = np.asarray(points, dtype=np.float64)
+    n = 1 << order
+    cell = np.clip((points * n).astype(np.intp), 0, n - 1)
+    return _moore_table(order)[cell[:, 1] * n + cell[:, 0]]
+
+
+def _norm(dx, dy):
+    # 比 np.hypot 快得多 (像素距离不需要它的溢出保护)
+    return np.sqrt(dx * dx + dy * dy)
+
+
+def two_opt(path, window=TWO_OPT_WINDOW, passes=TWO_OPT_PASSES):
+    """
+    终点自由的窗口 2-opt
+    :param path: (m, 2) 像素坐标，path[0] 为起点 (不动)
+    :return: 访问顺序 (m,)，order[0] == 0
+    """
+    m = len(path)
+    order = np.arange(m)
+    window = min(window, m - 2)
+    if window < 1:
+        return order
+    # 末尾补一个哑点 (下标 m): 反转到路线末尾时 q 落在哑点上，|b,q| 与 |a,q| 记为 0；
+    # b 超出路线的组合加上惩罚，收益永远为负
+    xs = np.append(path[:, 0], 0.0)
+    ys = np.append(path[:, 1], 0.0)
+    p = np.arange(m - 2)[:, None]
+    b = p + 1 + np.arange(1, window + 1)
+    q = np.minimum(b + 1, m)
+    penalty = np.where(b > m - 1, np.inf, 0.0)
+    open_end = q < m
+    b = np.minimum(b, m - 1)
+    a = p + 1
+    p = p[:, 0]
+    rows = np.arange(m - 2)
+    for _ in range(passes):
+        x = xs[np.append(order, m)]
+        y = ys[np.append(order, m)]
+        edge = _norm(np.diff(x), np.diff(y))         # edge[i] = |i, i+1|
+        edge[m - 1] = 0.0
+        gain = (edge[p, None] + edge[b] - penalty
+                - _norm(x[p, None] - x[b], y[p, None] - y[b])
+                - _norm(x[a] - x[q], y[a] - y[q]) * open_end)
+        k = gain.argmax(axis=1)
+        best = gain[rows, k]
+        cand = np.flatnonzero(best > 1e-6)
+        if not len(cand):
+            break
+        cand = cand[np.argsort(-best[cand])].tolist()
+        k = k.tolist()
+        busy = bytearray(m + 1)
+        seq = order.tolist()
+        for i in cand:
+            j = i + k[i] + 3               # 反转 seq[i+1 : j]
+            if any(busy[i:j + 1]):
+                continue
+            busy[i:j + 1] = b'\x01' * (j + 1 - i)
+            seq[i + 1:j] = seq[i + 1:j][::-1]
+        order = np.array(seq)
+    return order
+
+
+def plan_tour(points_px, start_px, window=TWO_OPT_WINDOW, passes=TWO_OPT_PASSES, extent=None):
+    """
+    从 start_px 出发经过全部点的短路线
+    :param points_px: (n, 2) 像素坐标
+    :param extent: 坐标范围 (宽, 高)，None 时取点集的包围盒
+    :return: 访问顺序 (n,)，points_px[order] 为依次点击的位置
+    """
+    pts = np.asarray(points_px, dtype=np.float64).reshape(-1, 2)
+    start = np.asarray(start_px, dtype=np.float64).reshape(2)
+    n = len(pts)
+    if n <= 1:
+        return np.arange(n)
+    everything = np.vstack([pts, start])
+    lo = everything.min(axis=0) if extent is None else np.zeros(2)
+    span = np.ptp(everything, axis=0) if extent is None else np.asarray(extent, dtype=np.float64)
+    # 统一按长边缩放，保持宽高比，曲线的"相邻"才对应平面上的相邻
+    key = moore_index((everything - lo) / max(float(span.max()), 1e-9))
+    key_start = key[-1]
+    order = np.argsort(key[:-1], kind='stable')
+    cut = int(np.searchsorted(key[:-1][order], key_start))
+    order = np.concatenate([order[cut:], order[:cut]])
+    # 环从起点切开后两个方向都可以走，取首尾中离起点近的一端
+    if np.hypot(*(pts[order[-1]] - start)) < np.hypot(*(pts[order[0]] - start)):
+        order = order[::-1]
+    path = np.vstack([start, pts[order]])
+    improved = two_opt(path, window, passes)
+    return order[improved[1:] - 1]
+
+
+def fitts_durations(distance_px, width_px=TARGET_WIDTH, base=MOVE_BASE, per_bit=MOVE_PER_BIT):
+    """各段移动时长 (秒): base + per_bit * log2(1 + 距离 / 目标宽度)"""
+    return base + per_bit * np.log2(1.0 + np.asarray(distance_px, dtype=np.float64) / width_px)
+
+
+class TourPlan:
+    """
+    一次批量点击的计划与结果 (HumanHID.click_many 的返回值)
+    :ivar order: 访问顺序，targets[order[i]] 为第 i 个点击的目标
+    :ivar durations: 各段移动时长 (秒)
+    :ivar length_px: 路线总长 (像素)
+    :ivar plan_seconds: 排路线的耗时
+    :ivar estimated: 按计划整批动作的总时长 (秒)
+    :ivar actual: 实际总时长 (秒，发送完毕到设备执行完，设备计时模式下按链路模型估算)
+    """
+    def __init__(self, order, durations, length_px, plan_seconds, estimated):
+        self.order = order
+        self.durations = durations
+        self.length_px = length_px
+        self.plan_seconds = plan_seconds
+        self.estimated = estimated
+        self.actual = None
+
+    def __repr__(self):
+        actual = 'pending' if self.actual is None else f'{self.actual:.3f}s'
+        return (f'TourPlan(targets={len(self.order)}, length={self.length_px:.0f}px, '
+                f'plan={self.plan_seconds * 1e6:.0f}us, estimated={self.estimated:.3f}s, actual={actual})')
+
@@ -0,0 +1,174 @@
+# ================= 预计算拟人轨迹库 =================
+# 离线生成大量归一化轨迹 (起点 (0,0) -> 终点 (1,0)，像素空间按距离归一化)，
+# 按 距离桶 x 方向桶 x 时长桶 分格存放，每格若干变体。
+# 运行时查表 -> 旋转 + 缩放 -> 得到实际轨迹，不再实时计算控制点与贝塞尔曲线。
+#
+# 文件格式 (小端):
+#   header   : '<4sHHHHIQ' magic, version, n_dist, n_dir, n_dur, variants, n_points (补齐到 32 字节)
+#   dist_edges float32[n_dist+1]   距离桶边界 (像素)
+#   dur_edges  float32[n_dur+1]    时长桶边界 (秒)
+#   steps      int32[n_dur]        每个时长桶的步数 (每条轨迹 steps+1 个点)
+#   offsets    int64[n_dist*n_dir*n_dur]  每格第一条轨迹的点下标
+#   points     float32[n_points, 2]       (16 字节对齐)
+# 通过 np.memmap 只读映射，多个进程共享同一份页缓存，没有各自的副本。
+import argparse
+import bisect
+import math
+import random
+import struct
+
+import numpy as np
+
+from bezier import human_paths
+
+MAGIC = b'MKTL'
+VERSION = 1
+_HEADER = struct.Struct('<4sHHHHIQ')
+_HEADER_SIZE = 32
+
+DEFAULT_DIST_EDGES = (0, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 8192)
+DEFAULT_DUR_EDGES = (0, 0.15, 0.25, 0.4, 0.6, 0.9, 1.3, 2.0, 10.0)
+DEFAULT_DIRECTIONS = 16
+
+
+def _align(n, a=16):
+    return (n + a - 1) // a * a
+
+
+def build_library(filename, variants=64, dist_edges=DEFAULT_DIST_EDGES,
+                  dur_edges=DEFAULT_DUR_EDGES, n_dir=DEFAULT_DIRECTIONS, seed=None):
+    """
+    离线生成轨迹库文件
+    :param variants: 每格变体数量 (运行时随机挑选，避免重复轨迹)
+    :return: 写入的轨迹条数
+    """
+    rng = np.random.default_rng(seed)
+    n_dist = len(dist_edges) - 1
+    n_dur = len(dur_edges) - 1
+    # 时长桶取几何中点，步数为原 HumanHID 的规则 max(duration * 60, 5)；库里只存形状，发送前由 StepPlanner 重新取点
+    steps = []
+    for lo, hi in zip(dur_edges[:-1], dur_edges[1:]):
+        mid = math.sqrt(max(lo, 0.05) * hi)
+        steps.append(int(max(mid * 60, 5)))
+
+    offsets = np.empty(n_dist * n_dir * n_dur, dtype=np.int64)
+    chunks = []
+    cursor = 0
+    for i in range(n_dist):
+        d_lo, d_hi = max(dist_edges[i], 1.0), dist_edges[i + 1]
+        for j in range(n_dir):
+            for k in range(n_dur):
+                # 距离在桶内按对数均匀采样，方向在扇区内均匀采样
+                dist = np.exp(rng.uniform(math.log(d_lo), math.log(d_hi), variants))
+                theta = (j + rng.uniform(0, 1, variants)) * (2 * math.pi / n_dir)
+                ends = np.stack([dist * np.cos(theta), dist * np.sin(theta)], axis=1)
+                # 屏幕尺寸取 1x1，坐标即像素
+                paths = human_paths(np.zeros_like(ends), ends, steps[k], 1, 1, rng).astype(np.float64)
+
+                # 归一化: 旋转 -theta，除以距离
+                c, s = np.cos(theta)[:, None], np.sin(theta)[:, None]
+                px, py = paths[..., 0], paths[..., 1]
+                norm = np.stack([(px * c + py * s), (-px * s + py * c)], axis=-1) / dist[:, None, None]
+
+                offsets[(i * n_dir + j) * n_dur + k] = cursor
+                chunks.append(norm.astype(np.float32).reshape(-1, 2))
+                cursor += variants * (steps[k] + 1)
+
+    points = np.concatenate(chunks)
+    with open(filename, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, n_dist, n_dir, n_dur, variants, len(points)).ljust(_HEADER_SIZE, b'\0'))
+        f.write(np.asarray(dist_edges, dtype=np.float32).tobytes())
+        f.write(np.asarray(dur_edges, dtype=np.float32).tobytes())
+        f.write(np.asarray(steps, dtype=np.int32).tobytes())
+        f.write(offsets.tobytes())
+        f.write(b'\0' * (_align(f.tell()) - f.tell()))
+        f.write(points.tobytes())
+    return n_dist * n_dir * n_dur * variants
+
+
+class TrajectoryLibrary:
+    """
+    只读轨迹库 (memmap)
+
+    lib = TrajectoryLibrary('minke.mktl')
+    path = lib.lookup(0.1, 0.1, 0.8, 0.6, duration=0.5, screen_w=1920, screen_h=1080)
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            head = f.read(_HEADER_SIZE)
+        magic, version, n_dist, n_dir, n_dur, variants, n_points = _HEADER.unpack_from(head)
+        if magic != MAGIC:
+            raise ValueError(f"{filename} 不是轨迹库文件")
+        if version != VERSION:
+            raise ValueError(f"不支持的轨迹库版本: {version}")
+
+        self.n_dist, self.n_dir, self.n_dur, self.variants = n_dist, n_dir, n_dur, variants
+        raw = np.memmap(filename, dtype=np.uint8, mode='r')
+        pos = _HEADER_SIZE
+
+        def take(dtype, count):
+            nonlocal pos
+            arr = np.frombuffer(raw, dtype=dtype, count=count, offset=pos)
+            pos += arr.nbytes
+            return arr
+
+        # 桶边界/步数/偏移很小，转成 Python 列表，查表用 bisect 比 numpy 更快
+        self.dist_edges = take(np.float32, n_dist + 1).tolist()
+        self.dur_edges = take(np.float32, n_dur + 1).tolist()
+        self.steps = take(np.int32, n_dur).tolist()
+        self.offsets = take(np.int64, n_dist * n_dir * n_dur).tolist()
+        pos = _align(pos)
+        self.points = np.frombuffer(raw, dtype=np.float32, count=n_points * 2, offset=pos).reshape(-1, 2)
+        self._dir_scale = n_dir / (2 * math.pi)
+
+    def __len__(self):
+        return self.n_dist * self.n_dir * self.n_dur * self.variants
+
+    def _cell(self, dist_px, angle, duration):
+        i = min(max(bisect.bisect_right(self.dist_edges, dist_px) - 1, 0), self.n_dist - 1)
+        j = int((angle % (2 * math.pi)) * self._dir_scale) % self.n_dir
+        k = min(max(bisect.bisect_right(self.dur_edges, duration) - 1, 0), self.n_dur - 1)
+        return (i * self.n_dir + j) * self.n_dur + k, k
+
+    def normalized(self, dist_px, angle, duration, variant=None):
+        """取一条归一化轨迹 (零拷贝视图)，(steps+1, 2)"""
+        cell, k = self._cell(dist_px, angle, duration)
+        n = self.steps[k] + 1
+        if variant is None:
+            variant = random.randrange(self.variants)
+        start = self.offsets[cell] + variant * n
+        return self.points[start:start + n]
+
+    def lookup(self, start_x, start_y, end_x, end_y, duration, screen_w, screen_h, variant=None):
+        """
+        查表得到实际轨迹
+        :param start_x, start_y, end_x, end_y: 百分比坐标 (0.0 ~ 1.0)
+        :return: (steps+1, 2) float32 百分比坐标
+        """
+        dx_px = (end_x - start_x) * screen_w
+        dy_px = (end_y - start_y) * screen_h
+        dist = math.hypot(dx_px, dy_px)
+        angle = math.atan2(dy_px, dx_px)
+        norm = self.normalized(dist, angle, duration, variant)
+
+        # 旋转 + 缩放 + 回到百分比坐标，合成一个 2x2 矩阵
+        c, s = dx_px, dy_px  # = dist * (cos, sin)
+        m = np.array(((c / screen_w, s / screen_h),
+                      (-s / screen_w, c / screen_h)), dtype=np.float32)
+        path = norm @ m
+        path += np.array((start_x, start_y), dtype=np.float32)
+        return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成预计算拟人轨迹库")
+    parser.add_argument("output", help="输出文件，例如 minke.mktl")
+    parser.add_argument("--variants", type=int, default=64, help="每格变体数量")
+    parser.add_argument("--directions", type=int, default=DEFAULT_DIRECTIONS, help="方向桶数量")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    n = build_library(args.output, args.variants, n_dir=args.directions, seed=args.seed)
+    lib = TrajectoryLibrary(args.output)
+    print(f"✅ 轨迹库已生成: {args.output}，共 {n} 条轨迹，{lib.points.nbytes / 1e6:.1f} MB")
@@ -0,0 +1,605 @@
+# ================= 虚拟 Minke 设备 =================
+# 纯软件实现的固件行为模型，没有开发板也能做吞吐测试与回归测试。
+# 与固件 (minke_firmware/main) 一一对应:
+#   - RxContext      : uart_protocol.c 的 rx_process_byte / rx_next_event / try_resync
+#                      (v1 定长帧 + v2 变长记录，突发记录展开为多个事件)
+#   - uart_rx 线程   : 按波特率接收，心跳帧原样回显，应答协议协商，
+#                      xQueueSend 等待 10ms，队列满则丢帧
+#   - hid 线程       : 深度 64 的事件队列 -> vTaskDelay(delay_ms 按滴答取整)
+#                      -> USB 忙则每滴答重试，10 次后丢帧 -> 发送 HID 报告
+#   - 看门狗         : 3000ms 没有新帧时复位键盘/鼠标状态
+# USB 端点按 bInterval 轮询建模: 报告提交后要等下一次主机轮询才送达，期间 tud_hid_ready() 为假。
+# 每份报告带时间戳记录到 reports (可同时写 JSONL)，用来测吞吐、延迟、丢包与计时精度。
+#
+# 连接方式:
+#   1. pty (Linux): with VirtualMinke() as vm: InputDevice(vm.port)
+#   2. loop://    : dev = InputDevice('loop://'); dev.connect(); VirtualMinke().start(dev.ser)
+#      (loop:// 只有上位机 -> 设备方向，日志行不会回传)
+import argparse
+import json
+import math
+import os
+import queue
+import select
+import threading
+import time
+
+from hid_driver import (FRAME_HEAD, FRAME_TAIL, FRAME_LEN, EVENT_QUEUE_SIZE, HID_POLL_INTERVAL,
+                        FIRMWARE_TICK_MS, WATCHDOG_TIMEOUT_MS, EVENT_TYPE_KEYBOARD,
+                        EVENT_TYPE_MOUSE_REL, EVENT_TYPE_MOUSE_ABS, EVENT_TYPE_SYSTEM, SYS_CMD_HEARTBEAT,
+                        SYS_CMD_PROTOCOL, PROTOCOL_ACK, PROTOCOL_VERSION, FRAME2_SYNC, FRAME2_MAX_BODY,
+                        REC_FLAG_DELAY, REC_TYPE_MASK, REC_REL_BURST, REC_ABS_BURST, MAX_BURST,
+                        REC_MAX_BODY, crc8)
+
+FLAG_KEY_PRESS = 0x00
+SYS_CMD_SET_ID = 0x10
+FRAME2_MAX_LEN = FRAME2_MAX_BODY + 3
+
+QUEUE_SEND_WAIT = 0.010   # uart_rx_task: xQueueSend(..., pdMS_TO_TICKS(10))
+QUEUE_RECV_WAIT = 0.100   # hid_process_task: xQueueReceive(..., pdMS_TO_TICKS(100))
+USB_BUSY_RETRIES = 10     # hid_process_task: 最多重试 10 次，每次 1 个滴答
+
+
+class InputEvent:
+    """uart_protocol.h: InputEvent (另附接收序号与接收时刻，用于统计延迟)"""
+    __slots__ = ('type', 'delay_ms', 'keycode', 'flags', 'modifier', 'buttons', 'wheel',
+                 'x', 'y', 'command', 'data', 'seq', 'rx_t')
+
+
+def _int16(lo, hi):
+    v = lo | (hi << 8)
+    return v - 0x10000 if v & 0x8000 else v
+
+
+def parse_frame(buf, evt):
+    """uart_protocol.c: parse_frame"""
+    evt.type = buf[1]
+    evt.delay_ms = buf[8] | (buf[9] << 8)
+    evt.keycode = evt.flags = evt.modifier = evt.buttons = evt.wheel = 0
+    evt.x = evt.y = evt.command = evt.data = 0
+    if evt.type == EVENT_TYPE_KEYBOARD:
+        evt.keycode, evt.flags, evt.modifier = buf[2], buf[3], buf[4]
+    elif evt.type == EVENT_TYPE_SYSTEM:
+        evt.command, evt.data = buf[2], buf[3]
+    else:
+        evt.buttons = buf[2]
+        evt.wheel = buf[3] - 256 if buf[3] & 0x80 else buf[3]
+        evt.x = _int16(buf[4], buf[5])
+        evt.y = _int16(buf[6], buf[7])
+
+
+def parse_record(buf, length, evt):
+    """
+    uart_protocol.c: parse_record (v2 记录 -> 第一个事件)
+    :return: 突发记录的展开状态 (step_ms, 剩余差分字节) 或 None；记录非法时返回 False
+    """
+    end = length - 1
+    p = 2
+    rtype = buf[p]
+    p += 1
+    evt.type = evt.delay_ms = evt.keycode = evt.flags = evt.modifier = evt.buttons = evt.wheel = 0
+    evt.x = evt.y = evt.command = evt.data = 0
+    if rtype & REC_FLAG_DELAY:
+        if end - p < 2:
+            return False
+        evt.delay_ms = buf[p] | (buf[p + 1] << 8)
+        p += 2
+    rtype &= REC_TYPE_MASK
+    body = bytes(buf[p:end])
+    n = len(body)
+
+    if rtype == EVENT_TYPE_KEYBOARD and n == 3:
+        evt.type = EVENT_TYPE_KEYBOARD
+        evt.keycode, evt.flags, evt.modifier = body
+    elif rtype == EVENT_TYPE_MOUSE_REL and n == 6:
+        evt.type = EVENT_TYPE_MOUSE_REL
+        evt.buttons = body[0]
+        evt.wheel = body[1] - 256 if body[1] & 0x80 else body[1]
+        evt.x = _int16(body[2], body[3])
+        evt.y = _int16(body[4], body[5])
+    elif rtype == EVENT_TYPE_MOUSE_ABS and n == 5:
+        evt.type = EVENT_TYPE_MOUSE_ABS
+        evt.buttons = body[0]
+        evt.x = _int16(body[1], body[2])
+        evt.y = _int16(body[3], body[4])
+    elif rtype == EVENT_TYPE_SYSTEM and n == 2:
+        evt.type = EVENT_TYPE_SYSTEM
+        evt.command, evt.data = body
+    elif rtype == REC_REL_BURST and n >= 4 and n % 2 == 0 and (n - 2) // 2 <= MAX_BURST:
+        evt.type = EVENT_TYPE_MOUSE_REL
+        evt.buttons = body[0]
+        evt.x, evt.y = _int8(body[2]), _int8(body[3])
+        return body[1], body[4:]
+    elif rtype == REC_ABS_BURST and n >= 6 and (n - 6) % 3 == 0 and (n - 6) // 3 + 1 <= MAX_BURST:
+        evt.type = EVENT_TYPE_MOUSE_ABS
+        evt.buttons = body[0]
+        evt.x = _int16(body[2], body[3])
+        evt.y = _int16(body[4], body[5])
+        return body[1], body[6:]
+    else:
+        return False
+    return None
+
+
+def _int8(v):
+    return v - 256 if v & 0x80 else v
+
+
+def _int12(v):
+    return v - 0x1000 if v & 0x800 else v
+
+
+def _frame_length(buf, count):
+    """uart_protocol.c: frame_length"""
+    if buf[0] == FRAME_HEAD:
+        return FRAME_LEN
+    if count < 2:
+        return FRAME2_MAX_LEN
+    return buf[1] + 3 if 0 < buf[1] <= REC_MAX_BODY else 0
+
+
+class RxContext:
+    """
+    uart_protocol.c: 逐字节帧同步 (v1 定长帧与 v2 变长记录，含出错时的自愈)
+    也是 v2 格式的参考解码器: 不接硬件即可验证 RecordEncoder 的输出
+
+    rx = RxContext()
+    for byte in data:
+        evt = rx.process_byte(byte)
+        while evt:
+            handle(evt)
+            evt = rx.next_event()
+    """
+    def __init__(self):
+        self.buffer = bytearray(FRAME2_MAX_LEN)
+        self.received_count = 0
+        self.frame_len = 0
+        self.discarded = 0   # 自愈过程中丢弃的字节数
+        self._burst = None   # (上一个事件, step_ms, 剩余差分字节, 读取位置)
+        self._pending = bytearray()   # 自愈待重解析的字节
+        self._pending_pos = 0
+
+    def _try_resync(self):
+        # 只丢掉坏候选帧的首字节，其余已收字节排在尚未重解析的字节之前重新同步，
+        # 候选之后已经收齐的完整帧照常被接收
+        count = self.received_count
+        self._pending = self.buffer[1:count] + self._pending[self._pending_pos:]
+        self._pending_pos = 0
+        self.received_count = 0
+        self.discarded += 1
+
+    def _drain_pending(self):
+        """重解析待处理字节，收齐一帧即返回其第一个事件"""
+        pending = self._pending
+        while self._pending_pos < len(pending):
+            byte = pending[self._pending_pos]
+            self._pending_pos += 1
+            evt = self._feed(byte)
+            if evt:
+                return evt
+            pending = self._pending   # 自愈可能换了一段新的待处理字节
+        return None
+
+    def process_byte(self, byte):
+        """喂一个字节，凑齐合法帧时返回第一个 InputEvent，否则返回 None"""
+        evt = self._feed(byte)
+        if evt is None and self._pending_pos < len(self._pending):
+            evt = self._drain_pending()
+        return evt
+
+    def _feed(self, byte):
+        if self.received_count == 0:
+            if byte == FRAME_HEAD or byte == FRAME2_SYNC:
+                self.buffer[0] = byte
+                self.received_count = 1
+            else:
+                self.discarded += 1
+            return None
+
+        self.buffer[self.received_count] = byte
+        self.received_count += 1
+        need = _frame_length(self.buffer, self.received_count)
+        if need == 0:
+            self._try_resync()
+            return None
+        if self.received_count < need:
+            return None
+
+        if self.buffer[0] == FRAME_HEAD:
+            ok = byte == FRAME_TAIL
+        else:
+            ok = crc8(self.buffer[1:need - 1]) == byte
+        if not ok:
+            self._try_resync()
+            return None
+
+        self.received_count = 0
+        self.frame_len = need
+        self._burst = None
+        evt = InputEvent()
+        if self.buffer[0] == FRAME_HEAD:
+            parse_frame(self.buffer, evt)
+            return evt
+        burst = parse_record(self.buffer, need, evt)
+        if burst is False:
+            self.discarded += need
+            return None
+        if burst:
+            self._burst = (evt, burst[0], burst[1], 0)
+        return evt
+
+    def next_event(self):
+        """uart_protocol.c: rx_next_event (突发记录的下一个事件，之后是自愈重解析出的帧)，没有时返回 None"""
+        if self._burst and self._burst[3] >= len(self._burst[2]):
+            self._burst = None
+        if not self._burst:
+            return self._drain_pending()
+        prev, step, pairs, pos = self._burst
+        evt = InputEvent()
+        evt.type, evt.buttons, evt.wheel, evt.delay_ms = prev.type, prev.buttons, 0, step
+        evt.keycode = evt.flags = evt.modifier = evt.command = evt.data = 0
+        if prev.type == EVENT_TYPE_MOUSE_ABS:
+            d0, d1, d2 = pairs[pos:pos + 3]
+            evt.x = prev.x + _int12(d0 | (d1 & 0x0F) << 8)
+            evt.y = prev.y + _int12(d1 >> 4 | d2 << 4)
+            pos += 3
+        else:
+            evt.x, evt.y = _int8(pairs[pos]), _int8(pairs[pos + 1])
+            pos += 2
+        self._burst = (evt, step, pairs, pos)
+        return evt
+
+    def events(self, data):
+        """整段字节 -> 事件列表 (离线解码)"""
+        out = []
+        for byte in data:
+            evt = self.process_byte(byte)
+            while evt:
+                out.append(evt)
+                evt = self.next_event()
+        return out
+
+
+class _PtyTransport:
+    """pty 主端: 从端路径交给 InputDevice 打开"""
+    def __init__(self):
+        import tty
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+
+    def read(self, timeout):
+        r, _, _ = select.select([self.master], [], [], timeout)
+        if not r:
+            return b''
+        try:
+            return os.read(self.master, 1024)
+        except (BlockingIOError, OSError):
+            return b''
+
+    def write(self, data):
+        # 上位机不读日志时不阻塞设备 (缓冲满直接丢)
+        try:
+            os.write(self.master, data)
+        except (BlockingIOError, OSError):
+            pass
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class _SerialTransport:
+    """挂在上位机的 loop:// 串口对象上: 读走上位机写入的字节"""
+    def __init__(self, ser):
+        self.ser = ser
+        self.port = ser.port
+
+    def read(self, timeout):
+        n = self.ser.in_waiting
+        if not n:
+            time.sleep(min(timeout, 0.001))
+            return b''
+        return self.ser.read(n)
+
+    def write(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+class VirtualMinke:
+    """
+    软件模拟的 Minke 设备
+
+    with VirtualMinke(log_file='hid.jsonl') as vm:
+        with InputDevice(vm.port) as dev:
+            dev.mouse_move(100, 0)
+        vm.wait_idle()
+        print(vm.stats(), vm.reports[-1])
+
+    :param baud_rate: UART 波特率 (按线路时间限速接收)，None 表示不限速
+    :param usb_ready: 可选回调 now -> bool，额外注入 USB 忙 (例如模拟主机卡顿)
+    """
+    def __init__(self, baud_rate=115200, queue_size=EVENT_QUEUE_SIZE, tick_ms=FIRMWARE_TICK_MS,
+                 hid_interval=HID_POLL_INTERVAL, watchdog_ms=WATCHDOG_TIMEOUT_MS,
+                 log_file=None, usb_ready=None):
+        self.byte_time = 10 / baud_rate if baud_rate else 0.0
+        self.queue_size = queue_size
+        self.tick_ms = tick_ms
+        self.tick = tick_ms / 1000.0
+        self.hid_interval = hid_interval
+        self.watchdog = watchdog_ms / 1000.0
+        self.log_file = log_file
+        self.usb_ready = usb_ready
+
+        self.reports = []         # [{'t', 'submit', 'rx', 'seq', 'report', ...}]
+        self.log_lines = []
+        self.transport = None
+        self._queue = None
+        self._threads = []
+        self._running = False
+        self._log = None
+        self._lock = threading.Lock()
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.rx = RxContext()
+        self.frames = 0           # 收到的事件 (v2 突发记录按展开后的事件计)
+        self.queue_drops = 0      # xQueueSend 超时丢弃
+        self.usb_drops = 0        # USB 忙超时丢弃
+        self.watchdog_resets = 0
+        self.restarts = 0
+        self._busy = False
+        self._usb_busy_until = 0.0
+        self._stall_until = 0.0
+
+    # ================= 生命周期 =================
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def port(self):
+        return self.transport.port if self.transport else None
+
+    def start(self, ser=None):
+        """
+        启动设备
+        :param ser: 上位机的 loop:// 串口对象；不传则创建 pty (见 port)
+        """
+        self.transport = _SerialTransport(ser) if ser is not None else _PtyTransport()
+        self.t0 = time.perf_counter()
+        self._poll_phase = self.t0
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._last_activity = self.t0
+        if self.log_file:
+            self._log = open(self.log_file, 'w', encoding='utf-8')
+        self._running = True
+        self._boot()
+        self._threads = [threading.Thread(target=self._uart_rx_task, name='minke-vdev-rx', daemon=True),
+                         threading.Thread(target=self._hid_process_task, name='minke-vdev-hid', daemon=True)]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        if self.transport:
+            self.transport.close()
+        if self._log:
+            self._log.close()
+            self._log = None
+
+    def _boot(self):
+        self._esp_log('I', "Minke Engine Initializing...")
+        self._esp_log('I', "System Ready.")
+
+    def _esp_log(self, level, msg):
+        """ESP_LOGx 输出到 UART0 (与控制串口同一个口)"""
+        line = f"{level} ({int((time.perf_counter() - self.t0) * 1000)}) MAIN: {msg}"
+        self.log_lines.append(line)
+        self.transport.write(line.encode() + b'\r\n')
+
+    # ================= 统计 =================
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'reports': len(self.reports),
+            'queue_drops': self.queue_drops,
+            'usb_drops': self.usb_drops,
+            'discarded_bytes': self.rx.discarded,
+            'watchdog_resets': self.watchdog_resets,
+            'restarts': self.restarts,
+            'queued': self._queue.qsize() if self._queue else 0,
+        }
+
+    def wait_idle(self, timeout=10.0, quiet=0.05):
+        """等到接收端安静 quiet 秒、队列清空且没有正在执行的帧"""
+        deadline = time.perf_counter() + timeout
+        last = (-1, -1)
+        quiet_since = time.perf_counter()
+        while time.perf_counter() < deadline:
+            cur = (self.frames, len(self.reports))
+            if cur != last or self._busy or not self._queue.empty():
+                last = cur
+                quiet_since = time.perf_counter()
+            elif time.perf_counter() - quiet_since >= quiet:
+                return True
+            time.sleep(0.005)
+        return False
+
+    def stall(self, seconds):
+        """注入 USB 忙 (主机停止轮询 seconds 秒)"""
+        self._stall_until = time.perf_counter() + seconds
+
+    # ================= FreeRTOS / TinyUSB 模型 =================
+    def _delay_ticks(self, ticks):
+        """vTaskDelay: 唤醒于当前滴答之后第 ticks 个滴答边界"""
+        if ticks <= 0:
+            return
+        now = time.perf_counter()
+        wake = self.t0 + (math.floor((now - self.t0) / self.tick) + ticks) * self.tick
+        time.sleep(max(0.0, wake - now))
+
+    def _hid_ready(self):
+        now = time.perf_counter()
+        if now < self._usb_busy_until or now < self._stall_until:
+            return False
+        return self.usb_ready(now) if self.usb_ready else True
+
+    def _next_poll(self, t):
+        """t 之后的下一次主机轮询时刻"""
+        n = math.floor((t - self._poll_phase) / self.hid_interval) + 1
+        return self._poll_phase + n * self.hid_interval
+
+    def _report(self, kind, evt=None, **fields):
+        """tud_hid_report: 提交报告，下一次轮询时送达主机"""
+        submit = time.perf_counter()
+        delivered = self._next_poll(max(submit, self._stall_until))
+        self._usb_busy_until = delivered
+        rec = {'t': delivered, 'submit': submit, 'report': kind}
+        if evt is not None:
+            rec['seq'] = evt.seq
+            rec['rx'] = evt.rx_t
+        rec.update(fields)
+        with self._lock:
+            self.reports.append(rec)
+        if self._log:
+            out = dict(rec)
+            for key in ('t', 'submit', 'rx'):
+                if key in out:
+                    out[key] = round((out[key] - self.t0) * 1000, 3)
+            self._log.write(json.dumps(out) + '\n')
+
+    def _safety_reset_hid(self):
+        if self._hid_ready():
+            self._report('keyboard', keycode=0, modifier=0)
+            self._report('mouse_rel', buttons=0, x=0, y=0, wheel=0)
+            self._esp_log('W', "Watchdog triggered: HID state reset for safety.")
+            self.watchdog_resets += 1
+
+    def _restart(self):
+        """esp_restart(): 丢掉队列与接收状态，重新启动"""
+        self.restarts += 1
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self.rx.received_count = 0
+        self._boot()
+
+    # ================= 两个任务 =================
+    def _uart_rx_task(self):
+        arrival = 0.0
+        while self._running:
+            data = self.transport.read(0.020)
+            if not data:
+                continue
+            now = time.perf_counter()
+            arrival = max(arrival, now)
+            for byte in data:
+                # 按 8N1 线路时间限速: 第 i 个字节最早在 arrival + byte_time 收完
+                arrival += self.byte_time
+                evt = self.rx.process_byte(byte)
+                if evt is None:
+                    continue
+                wait = arrival - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                while evt:
+                    if evt.type == EVENT_TYPE_SYSTEM:
+                        self._system_reply(evt)
+                    evt.seq = self.frames
+                    evt.rx_t = time.perf_counter()
+                    self.frames += 1
+                    try:
+                        self._queue.put(evt, timeout=QUEUE_SEND_WAIT)
+                    except queue.Full:
+                        self.queue_drops += 1
+                    evt = self.rx.next_event()
+
+    def _system_reply(self, evt):
+        buf = self.rx.buffer
+        if evt.command == SYS_CMD_HEARTBEAT:
+            # uart_rx_task: 心跳帧原样回显 (连接握手)
+            self.transport.write(bytes(buf[:self.rx.frame_len]))
+        elif evt.command == SYS_CMD_PROTOCOL and buf[0] == FRAME_HEAD:
+            # uart_rx_task: 协议协商应答 (双方都支持的最高版本 + 应答标记)
+            reply = bytearray(buf[:FRAME_LEN])
+            reply[3] = min(evt.data, PROTOCOL_VERSION)
+            reply[5] = PROTOCOL_ACK
+            self.transport.write(bytes(reply))
+
+    def _hid_process_task(self):
+        self._last_activity = time.perf_counter()
+        while self._running:
+            now = time.perf_counter()
+            if now - self._last_activity > self.watchdog:
+                self._safety_reset_hid()
+                self._last_activity = now
+
+            try:
+                evt = self._queue.get(timeout=QUEUE_RECV_WAIT)
+            except queue.Empty:
+                continue
+            self._busy = True
+            try:
+                self._execute(evt)
+            finally:
+                self._busy = False
+
+    def _execute(self, evt):
+        self._last_activity = time.perf_counter()
+        if evt.delay_ms > 0:
+            self._delay_ticks(evt.delay_ms // self.tick_ms)
+
+        retry = 0
+        while not self._hid_ready() and retry < USB_BUSY_RETRIES:
+            self._delay_ticks(1)
+            retry += 1
+        if not self._hid_ready():
+            self._esp_log('E', f"USB Busy timeout! Dropping packet. Retries: {retry}")
+            self.usb_drops += 1
+            return
+
+        if evt.type == EVENT_TYPE_KEYBOARD:
+            pressed = evt.flags == FLAG_KEY_PRESS
+            self._report('keyboard', evt, keycode=evt.keycode if pressed else 0,
+                         modifier=evt.modifier if pressed else 0)
+        elif evt.type == EVENT_TYPE_MOUSE_REL:
+            # 报告里 x/y 为 int8，固件直接截断
+            x = (evt.x + 128) % 256 - 128
+            y = (evt.y + 128) % 256 - 128
+            self._report('mouse_rel', evt, buttons=evt.buttons, x=x, y=y, wheel=evt.wheel)
+        elif evt.type == EVENT_TYPE_MOUSE_ABS:
+            self._report('mouse_abs', evt, buttons=evt.buttons, x=evt.x & 0xFFFF, y=evt.y & 0xFFFF)
+        elif evt.type == EVENT_TYPE_SYSTEM:
+            if evt.command == SYS_CMD_SET_ID:
+                self._esp_log('W', "Identity change requested. Rebooting...")
+                self._restart()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="虚拟 Minke 设备 (pty)")
+    parser.add_argument("--log", default=None, help="HID 报告日志 (JSONL)")
+    parser.add_argument("--baud", type=int, default=115200)
+    args = parser.parse_args()
+
+    with VirtualMinke(baud_rate=args.baud, log_file=args.log) as vm:
+        print(f"🧪 虚拟设备已启动: {vm.port}  (Ctrl+C 退出)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        print(f"📊 {vm.stats()}")
@@ -0,0 +1,342 @@
+# ================= 视觉闭环流水线 =================
+# 采集 -> 检测 -> 动作，每段一个线程 (检测可以放到子进程，绕开 GIL)。段与段之间是容量为 1 的
+# "最新帧优先" 槽: 下游还没取走的旧帧直接被新帧覆盖 (计入 pipeline_dropped_total)，
+# 检测器跟不上帧率时队列不会越积越长，动作总是针对最新一帧的结果。
+# 动作段基于 HumanHID.start_move 的可改目标移动，不阻塞: 移动还在途中时，新结果只改目标。
+# GIL 被其他线程占用时，每次线程交接最多要等一个切换间隔 (CPython 默认 5ms)，三段交接就是十几毫秒；
+# 运行期间把切换间隔调到 switch_interval (默认 1ms，进程级设置，close 时恢复)，检测放到子进程后
+# 负载下的端到端反应时间可以压到一个帧周期以内 (见 benchmark.py vision)。
+# 各段耗时记入 metrics 的 pipeline_latency_seconds{stage=...}，stats() 给出分位数:
+#   capture      : 取一帧的耗时 (不含等待下一帧的时间)
+#   frame_wait   : 帧在槽里等检测的时间
+#   detect       : 检测耗时 (子进程模式含传输)
+#   result_wait  : 结果在槽里等动作的时间
+#   action       : 下发动作的耗时
+#   reaction     : 端到端 (采集完成 -> 动作下发)
+import multiprocessing
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from scheduler import Scheduler
+
+STAGES = ('capture', 'frame_wait', 'detect', 'result_wait', 'action', 'reaction')
+
+
+class Frame:
+    """一帧画面 (t_capture 为采集完成时刻，perf_counter)"""
+    __slots__ = ('seq', 't_capture', 'data')
+
+    def __init__(self, seq, t_capture, data):
+        self.seq = seq
+        self.t_capture = t_capture
+        self.data = data
+
+
+class Detection:
+    """一帧的检测结果: targets 为 [(x, y), ...] 百分比坐标"""
+    __slots__ = ('seq', 't_capture', 't_detect', 'targets')
+
+    def __init__(self, seq, t_capture, t_detect, targets):
+        self.seq = seq
+        self.t_capture = t_capture
+        self.t_detect = t_detect
+        self.targets = targets
+
+
+class ProcessDetector:
+    """
+    在专用子进程里执行检测器: 画面经管道发过去，结果发回来
+    (比进程池少两个管理线程，GIL 被占用时少几次线程切换)
+    """
+    def __init__(self, detector):
+        self._conn, child = multiprocessing.Pipe()
+        self._proc = multiprocessing.Process(target=_detect_worker, args=(child, detector),
+                                             name='minke-vision-detect', daemon=True)
+        self._proc.start()
+        child.close()
+
+    def __call__(self, data):
+        self._conn.send(data)
+        ok, result = self._conn.recv()
+        if not ok:
+            raise result
+        return result
+
+    def close(self):
+        try:
+            self._conn.send(None)
+        except OSError:
+            pass
+        self._proc.join(1.0)
+        if self._proc.is_alive():
+            self._proc.terminate()
+        self._conn.close()
+
+
+def _detect_worker(conn, detector):
+    while True:
+        try:
+            data = conn.recv()
+        except EOFError:
+            return
+        if data is None:
+            return
+        try:
+            conn.send((True, list(detector(data))))
+        except Exception as e:
+            conn.send((False, e))
+
+
+class LatestSlot:
+    """容量为 1 的最新帧优先槽: put 覆盖未取走的旧值，get 阻塞到有新值"""
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.dropped = 0
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+                if self.metrics is not None:
+                    self.metrics.inc('pipeline_dropped_total')
+            self._item = item
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """-> 最新值；超时或已关闭时返回 None"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._item is not None or self._closed, timeout)
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+# ================= 动作 =================
+class TrackAction:
+    """
+    默认动作: 移向离当前逻辑坐标最近的目标
+    移动在途中时只改目标 (retarget)，否则开始一次新移动
+    :param click: 到达后点击的按钮，None 只跟随不点击
+    """
+    def __init__(self, duration=0.25, click=None, jitter_pixels=0):
+        self.duration = duration
+        self.click = click
+        self.jitter_pixels = jitter_pixels
+
+    def __call__(self, human, detection):
+        if not detection.targets:
+            return
+        pts = np.asarray(detection.targets, dtype=np.float64)
+        d = np.hypot((pts[:, 0] - human.current_x) * human.screen_w,
+                     (pts[:, 1] - human.current_y) * human.screen_h)
+        x, y = pts[int(np.argmin(d))]
+        handle = human.active_move
+        if handle is not None and not handle.done:
+            handle.retarget(x, y)
+        else:
+            human.start_move(x, y, self.duration, self.jitter_pixels, self.click)
+
+
+# ================= 流水线 =================
+class VisionPipeline:
+    """
+    采集 -> 检测 -> 动作 流水线
+
+    with VisionPipeline(bot, SyntheticSource(fps=60), brightest_spot) as pipe:
+        time.sleep(5)
+    print(pipe.stats())
+    :param source: 无参回调，阻塞到下一帧并返回画面数据；返回 None 表示结束
+    :param detector: detector(画面数据) -> [(x, y), ...] 百分比坐标
+    :param action: action(human, Detection)，必须很快返回 (默认 TrackAction)
+    :param detect_in_process: 检测放到子进程执行 (detector 与画面数据需可 pickle)
+    :param switch_interval: 运行期间的 GIL 切换间隔 (秒)，None 不修改
+    """
+    def __init__(self, human, source, detector, action=None, detect_in_process=False,
+                 switch_interval=0.001, history=4096):
+        self.human = human
+        self.metrics = human.metrics
+        self.source = source
+        self.detector = detector
+        self.action = action or TrackAction()
+        self.detect_in_process = detect_in_process
+        self.frames = LatestSlot(self.metrics)
+        self.detections = LatestSlot(self.metrics)
+        self.errors = []
+        self.counts = dict.fromkeys(('captured', 'detected', 'acted'), 0)
+        self._samples = {stage: deque(maxlen=history) for stage in STAGES}
+        self._stop = threading.Event()
+        self._threads = []
+        self._detect = detector
+        self.switch_interval = switch_interval
+        self._saved_interval = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        if self.detect_in_process:
+            self._detect = ProcessDetector(self.detector)
+        if self.switch_interval is not None:
+            self._saved_interval = sys.getswitchinterval()
+            sys.setswitchinterval(self.switch_interval)
+        for name, fn in (('capture', self._capture_loop), ('detect', self._detect_loop),
+                         ('action', self._action_loop)):
+            t = threading.Thread(target=self._guard, args=(fn,), name=f'minke-vision-{name}', daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def close(self):
+        self._stop.set()
+        self.frames.close()
+        self.detections.close()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        if isinstance(self._detect, ProcessDetector):
+            self._detect.close()
+            self._detect = self.detector
+        if self._saved_interval is not None:
+            sys.setswitchinterval(self._saved_interval)
+            self._saved_interval = None
+
+    def join(self, timeout=None):
+        """等到采集结束 (source 返回 None) 且剩余结果处理完"""
+        for t in self._threads:
+            t.join(timeout)
+
+    @property
+    def running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    # ---------- 各段 ----------
+    def _guard(self, fn):
+        try:
+            fn()
+        except Exception as e:
+            self.errors.append(e)
+        finally:
+            # 任一段结束 (正常或异常)，整条流水线结束
+            self._stop.set()
+            self.frames.close()
+            self.detections.close()
+
+    def _observe(self, stage, seconds):
+        self._samples[stage].append(seconds)
+        self.metrics.observe('pipeline_latency_seconds', stage, seconds)
+
+    def _capture_loop(self):
+        seq = 0
+        while not self._stop.is_set():
+            t = time.perf_counter()
+            data = self.source()
+            if data is None:
+                return
+            now = time.perf_counter()
+            # source 里等待下一帧的时间不算采集耗时
+            capture = getattr(self.source, 'last_capture', None)
+            self._observe('capture', now - t if capture is None else capture)
+            self.frames.put(Frame(seq, now, data))
+            self.counts['captured'] += 1
+            seq += 1
+
+    def _detect_loop(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                return
+            t = time.perf_counter()
+            self._observe('frame_wait', t - frame.t_capture)
+            targets = self._detect(frame.data)
+            now = time.perf_counter()
+            self._observe('detect', now - t)
+            self.detections.put(Detection(frame.seq, frame.t_capture, now, list(targets)))
+            self.counts['detected'] += 1
+
+    def _action_loop(self):
+        while True:
+            det = self.detections.get()
+            if det is None:
+                return
+            t = time.perf_counter()
+            self._observe('result_wait', t - det.t_detect)
+            self.action(self.human, det)
+            now = time.perf_counter()
+            self._observe('action', now - t)
+            self._observe('reaction', now - det.t_capture)
+            self.counts['acted'] += 1
+
+    # ---------- 统计 ----------
+    def stats(self):
+        """各段耗时分布 (毫秒) 与帧数 / 丢帧数"""
+        out = {**self.counts, 'dropped_frames': self.frames.dropped,
+               'dropped_detections': self.detections.dropped}
+        for stage, samples in self._samples.items():
+            if not samples:
+                continue
+            ms = np.array(samples) * 1000.0
+            out[stage] = {'p50_ms': float(np.percentile(ms, 50)), 'p95_ms': float(np.percentile(ms, 95)),
+                          'max_ms': float(ms.max())}
+        return out
+
+
+# ================= 合成数据 (无相机测试) =================
+class SyntheticSource:
+    """
+    合成画面: 按 fps 产出灰度图，上面有一个沿李萨如曲线移动的亮块
+    truth[seq] 为第 seq 帧目标的真实位置 (百分比坐标)，用于评估跟踪误差
+    """
+    def __init__(self, fps=60, width=320, height=180, frames=None, period=4.0, blob=6):
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.frames = frames          # None 表示无限
+        self.period = period
+        self.blob = blob
+        self.truth = []
+        self.last_capture = None
+        self._sched = Scheduler()
+        self._t0 = None
+
+    def position(self, t):
+        w = 2 * np.pi / self.period
+        return 0.5 + 0.35 * np.sin(w * t), 0.5 + 0.3 * np.sin(2 * w * t + 0.5)
+
+    def __call__(self):
+        if self.frames is not None and len(self.truth) >= self.frames:
+            return None
+        if self._t0 is None:
+            self._t0 = time.perf_counter()
+        else:
+            self._sched.wait(1.0 / self.fps)
+        t = time.perf_counter()
+        x, y = self.position(t - self._t0)
+        img = np.zeros((self.height, self.width), dtype=np.uint8)
+        cx, cy, r = int(x * self.width), int(y * self.height), self.blob
+        img[max(cy - r, 0):cy + r + 1, max(cx - r, 0):cx + r + 1] = 255
+        self.truth.append((x, y))
+        self.last_capture = time.perf_counter() - t
+        return img
+
+
+def brightest_spot(image, threshold=128):
+    """示例检测器: 亮块的质心 -> [(x, y)] 百分比坐标 (没有亮块时为空)"""
+    ys, xs = np.nonzero(image >= threshold)
+    if not len(xs):
+        return []
+    h, w = image.shape[:2]
+    return [((xs.mean() + 0.5) / w, (ys.mean() + 0.5) / h)]
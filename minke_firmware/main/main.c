@@ -2,6 +2,7 @@
  * main.c
  * 核心逻辑文件：支持随机身份切换、心跳看门狗安全重置与手动构造 HID 报告
  * [已修复]：USB 忙碌重试机制与 FreeRTOS Tick 对齐问题，实现零丢包。
+ * 串口同时接受 v1 定长帧与 v2 变长记录 (见 protocol/uart_protocol.h)。
  */
 #include <stdlib.h>
 #include <stdio.h>
@@ -99,11 +100,29 @@ void uart_rx_task(void *arg) {
         int len = uart_read_bytes(UART_PORT_NUM, data, BUF_SIZE, 20 / portTICK_PERIOD_MS);
         if (len > 0) {
             for (int i = 0; i < len; i++) {
-                if (rx_process_byte(&g_rx_ctx, data[i], &evt)) {
+                if (!rx_process_byte(&g_rx_ctx, data[i], &evt)) continue;
+
+                // v2 突发记录展开为多个事件，依次入队 (自愈重解析出的后续帧也从这里取出)
+                do {
+                    if (evt.type == EVENT_TYPE_SYSTEM) {
+                        // 心跳帧原样回显：上位机据此确认串口解析已就绪 (连接握手)
+                        if (evt.param.system.command == SYS_CMD_HEARTBEAT) {
+                            uart_write_bytes(UART_PORT_NUM, (const char *)g_rx_ctx.buffer, g_rx_ctx.frame_len);
+                        }
+                        // 协议协商 (v1 帧)：回复双方都支持的最高版本，Buf[5] 置应答标记
+                        else if (evt.param.system.command == SYS_CMD_PROTOCOL && g_rx_ctx.buffer[0] == FRAME_HEAD) {
+                            uint8_t reply[FRAME_LEN];
+                            memcpy(reply, g_rx_ctx.buffer, FRAME_LEN);
+                            reply[3] = evt.param.system.data < PROTOCOL_VERSION ? evt.param.system.data : PROTOCOL_VERSION;
+                            reply[5] = PROTOCOL_ACK;
+                            uart_write_bytes(UART_PORT_NUM, (const char *)reply, FRAME_LEN);
+                        }
+                    }
+
                     // ✅ 修复 1：将等待时间从 0 改为 10ms。
                     // 防止瞬间爆发大量数据时队列已满导致丢包
                     xQueueSend(g_event_queue, &evt, pdMS_TO_TICKS(10));
-                }
+                } while (rx_next_event(&g_rx_ctx, &evt));
             }
         }
     }
@@ -6,12 +6,24 @@ void rx_context_init(RxContext* ctx) {
     ctx->received_count = 0;
 }
 
+// CRC-8 (多项式 0x07，初值 0)，逐位计算，串口速率下开销可以忽略
+uint8_t crc8(const uint8_t* data, uint16_t len) {
+    uint8_t crc = 0;
+    for (uint16_t i = 0; i < len; i++) {
+        crc ^= data[i];
+        for (int b = 0; b < 8; b++) {
+            crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ 0x07) : (uint8_t)(crc << 1);
+        }
+    }
+    return crc;
+}
+
 // ---------------------------------------------------------
 // 核心解析逻辑
 // ---------------------------------------------------------
 static void parse_frame(const uint8_t* buf, InputEvent* evt) {
     memset(evt, 0, sizeof(InputEvent));
-    
+
     evt->type     = buf[1];
     // 延迟固定在最后两字节 (Index 8, 9)
     evt->delay_ms = (uint16_t)(buf[8] | (buf[9] << 8));
@@ -23,8 +35,8 @@ static void parse_frame(const uint8_t* buf, InputEvent* evt) {
         // Buf[4]: Modifier (Ctrl/Shift...)
         evt->param.key.keycode  = buf[2];
         evt->param.key.flags    = buf[3];
-        evt->param.key.modifier = buf[4]; 
-    } 
+        evt->param.key.modifier = buf[4];
+    }
     else if (evt->type == EVENT_TYPE_SYSTEM) {
         // === 系统/心跳指令映射 (新增) ===
         // Buf[2]: Command (例如 0xFF 为心跳包，0x10 为身份切换指令)
@@ -46,46 +58,179 @@ static void parse_frame(const uint8_t* buf, InputEvent* evt) {
 }
 
 // ---------------------------------------------------------
-// 自愈逻辑 (保持不变)
+// v2 记录解析 (buf 为整条记录，len 为记录总长)
+// 载荷长度与类型不符时返回 false，整条记录丢弃
 // ---------------------------------------------------------
-static void try_resync(RxContext* ctx, uint8_t last_byte) {
-    uint8_t temp[FRAME_LEN];
-    memcpy(temp, ctx->buffer, FRAME_LEN - 1);
-    temp[FRAME_LEN - 1] = last_byte;
-
-    for (int i = 1; i < FRAME_LEN; i++) {
-        if (temp[i] == FRAME_HEAD) {
-            uint8_t valid_len = FRAME_LEN - i;
-            memcpy(ctx->buffer, &temp[i], valid_len);
-            ctx->received_count = valid_len;
-            return;
-        }
+static bool parse_record(RxContext* ctx, const uint8_t* buf, uint16_t len, InputEvent* evt) {
+    const uint8_t* p   = buf + 2;
+    const uint8_t* end = buf + len - 1;     // CRC 之前
+    uint8_t type = *p++;
+
+    memset(evt, 0, sizeof(InputEvent));
+    if (type & REC_FLAG_DELAY) {
+        if (end - p < 2) return false;
+        evt->delay_ms = (uint16_t)(p[0] | (p[1] << 8));
+        p += 2;
+    }
+    type &= REC_TYPE_MASK;
+    int n = (int)(end - p);
+
+    switch (type) {
+        case EVENT_TYPE_KEYBOARD:           // [Keycode, Flags, Modifier]
+            if (n != 3) return false;
+            evt->type = EVENT_TYPE_KEYBOARD;
+            evt->param.key.keycode  = p[0];
+            evt->param.key.flags    = p[1];
+            evt->param.key.modifier = p[2];
+            return true;
+
+        case EVENT_TYPE_MOUSE_REL:          // [Buttons, Wheel, X_L, X_H, Y_L, Y_H]
+            if (n != 6) return false;
+            evt->type = EVENT_TYPE_MOUSE_REL;
+            evt->param.mouse.buttons = p[0];
+            evt->param.mouse.wheel   = (int8_t)p[1];
+            evt->param.mouse.x       = (int16_t)(p[2] | (p[3] << 8));
+            evt->param.mouse.y       = (int16_t)(p[4] | (p[5] << 8));
+            return true;
+
+        case EVENT_TYPE_MOUSE_ABS:          // [Buttons, X_L, X_H, Y_L, Y_H]
+            if (n != 5) return false;
+            evt->type = EVENT_TYPE_MOUSE_ABS;
+            evt->param.mouse.buttons = p[0];
+            evt->param.mouse.x       = (int16_t)(p[1] | (p[2] << 8));
+            evt->param.mouse.y       = (int16_t)(p[3] | (p[4] << 8));
+            return true;
+
+        case EVENT_TYPE_SYSTEM:             // [Command, Data]
+            if (n != 2) return false;
+            evt->type = EVENT_TYPE_SYSTEM;
+            evt->param.system.command = p[0];
+            evt->param.system.data    = p[1];
+            return true;
+
+        case REC_REL_BURST:
+            if (n < 4 || (n - 2) % 2 || (n - 2) / 2 > MAX_BURST) return false;
+            evt->type = EVENT_TYPE_MOUSE_REL;
+            evt->param.mouse.buttons = p[0];
+            evt->param.mouse.x       = (int8_t)p[2];
+            evt->param.mouse.y       = (int8_t)p[3];
+            ctx->burst_step = p[1];
+            ctx->burst_ptr  = p + 4;
+            ctx->burst_left = (uint8_t)((n - 4) / 2);
+            ctx->burst_evt  = *evt;
+            return true;
+
+        case REC_ABS_BURST:
+            if (n < 6 || (n - 6) % 3 || (n - 6) / 3 + 1 > MAX_BURST) return false;
+            evt->type = EVENT_TYPE_MOUSE_ABS;
+            evt->param.mouse.buttons = p[0];
+            evt->param.mouse.x       = (int16_t)(p[2] | (p[3] << 8));
+            evt->param.mouse.y       = (int16_t)(p[4] | (p[5] << 8));
+            ctx->burst_step = p[1];
+            ctx->burst_ptr  = p + 6;
+            ctx->burst_left = (uint8_t)((n - 6) / 3);
+            ctx->burst_evt  = *evt;
+            return true;
     }
+    return false;
+}
+
+// 从 buf 开始的 count 个字节按帧头推算的整帧长度 (LEN 还没收到时按最大长度)，非法时为 0
+static uint16_t frame_length(const uint8_t* buf, uint16_t count) {
+    if (buf[0] == FRAME_HEAD) return FRAME_LEN;
+    if (count < 2) return FRAME2_MAX_LEN;
+    return (buf[1] && buf[1] <= REC_MAX_BODY) ? (uint16_t)(buf[1] + 3) : 0;
+}
+
+// ---------------------------------------------------------
+// 自愈逻辑：候选帧不成立时只丢掉它的首字节，其余已收字节放回待重解析区
+// (排在上一轮还没重解析完的字节之前)，再逐字节重新同步。
+// 候选之后已经收齐的完整帧照常通过校验被接收，不会连同坏帧一起丢掉。
+// 缓冲区与待重解析区的字节合起来不超过一帧的最大长度 (重解析期间不会收新字节)。
+// ---------------------------------------------------------
+static void try_resync(RxContext* ctx) {
+    uint16_t keep = ctx->received_count - 1;
+    uint16_t left = ctx->pending_len - ctx->pending_pos;
+    memmove(&ctx->pending[keep], &ctx->pending[ctx->pending_pos], left);
+    memcpy(ctx->pending, &ctx->buffer[1], keep);
+    ctx->pending_pos = 0;
+    ctx->pending_len = keep + left;
     ctx->received_count = 0;
 }
 
-bool rx_process_byte(RxContext* ctx, uint8_t byte, InputEvent* evt) {
+static bool feed_byte(RxContext* ctx, uint8_t byte, InputEvent* evt) {
     if (ctx->received_count == 0) {
-        if (byte == FRAME_HEAD) {
+        if (byte == FRAME_HEAD || byte == FRAME2_SYNC) {
             ctx->buffer[0] = byte;
             ctx->received_count = 1;
         }
         return false;
     }
 
-    if (ctx->received_count < FRAME_LEN - 1) {
-        ctx->buffer[ctx->received_count++] = byte;
+    ctx->buffer[ctx->received_count++] = byte;
+    uint16_t need = frame_length(ctx->buffer, ctx->received_count);
+    if (need == 0) {
+        try_resync(ctx);
+        return false;
+    }
+    if (ctx->received_count < need) {
         return false;
     }
 
-    if (byte == FRAME_TAIL) {
-        ctx->buffer[FRAME_LEN - 1] = byte;
+    bool ok;
+    if (ctx->buffer[0] == FRAME_HEAD) {
+        ok = (byte == FRAME_TAIL);
+    } else {
+        ok = (crc8(&ctx->buffer[1], need - 2) == byte);
+    }
+    if (!ok) {
+        try_resync(ctx);
+        return false;
+    }
+
+    ctx->received_count = 0;
+    ctx->frame_len = need;
+    ctx->burst_left = 0;
+    if (ctx->buffer[0] == FRAME_HEAD) {
         parse_frame(ctx->buffer, evt);
-        ctx->received_count = 0;
         return true;
-    } 
-    else {
-        try_resync(ctx, byte);
-        return false;
     }
-}
\ No newline at end of file
+    return parse_record(ctx, ctx->buffer, need, evt);
+}
+
+// 重解析待处理字节，收齐一帧即返回 (其余字节留到 rx_next_event)
+static bool drain_pending(RxContext* ctx, InputEvent* evt) {
+    while (ctx->pending_pos < ctx->pending_len) {
+        if (feed_byte(ctx, ctx->pending[ctx->pending_pos++], evt)) return true;
+    }
+    return false;
+}
+
+bool rx_process_byte(RxContext* ctx, uint8_t byte, InputEvent* evt) {
+    if (feed_byte(ctx, byte, evt)) return true;
+    return drain_pending(ctx, evt);
+}
+
+bool rx_next_event(RxContext* ctx, InputEvent* evt) {
+    // 突发记录展开完后，继续重解析自愈留下的字节
+    if (ctx->burst_left == 0) return drain_pending(ctx, evt);
+
+    InputEvent* prev = &ctx->burst_evt;
+    const uint8_t* p = ctx->burst_ptr;
+    prev->delay_ms = ctx->burst_step;
+    if (prev->type == EVENT_TYPE_MOUSE_ABS) {
+        // 12 位有符号差分，先放到 16 位高端再算术右移完成符号扩展
+        int16_t dx = (int16_t)((uint16_t)(p[0] | ((p[1] & 0x0F) << 8)) << 4) >> 4;
+        int16_t dy = (int16_t)((uint16_t)((p[1] >> 4) | (p[2] << 4)) << 4) >> 4;
+        prev->param.mouse.x += dx;
+        prev->param.mouse.y += dy;
+        ctx->burst_ptr += 3;
+    } else {
+        prev->param.mouse.x = (int8_t)p[0];
+        prev->param.mouse.y = (int8_t)p[1];
+        ctx->burst_ptr += 2;
+    }
+    ctx->burst_left--;
+    *evt = *prev;
+    return true;
+}
@@ -16,6 +16,18 @@ extern "C" {
 #define FRAME_TAIL          0x55
 #define FRAME_LEN           11  // 固定 11 字节
 
+// v2 变长记录: [SYNC][LEN][TYPE][delay_ms 可选][载荷...][CRC8]
+//   LEN  : TYPE 起到 CRC 之前的字节数 (1~255)
+//   TYPE : 低 6 位为记录类型，最高位 REC_FLAG_DELAY 表示 TYPE 后跟 u16 delay_ms
+//   CRC8 : 多项式 0x07、初值 0，覆盖 LEN ~ 载荷末尾
+// 与 v1 帧共用一个解析器，按首字节区分，两种格式可以在同一条串口上混发
+#define FRAME2_SYNC         0xA5
+#define FRAME2_MAX_BODY     255
+#define FRAME2_MAX_LEN      (FRAME2_MAX_BODY + 3)
+#define REC_FLAG_DELAY      0x80
+#define REC_TYPE_MASK       0x3F
+#define PROTOCOL_VERSION    2
+
 // ==========================================
 // 2. 事件类型定义
 // ==========================================
@@ -24,11 +36,26 @@ extern "C" {
 #define EVENT_TYPE_MOUSE_ABS  0x03  // 绝对鼠标
 #define EVENT_TYPE_SYSTEM     0x04  // 系统指令（心跳/身份切换）
 
+// v2 专用记录类型 (单条记录展开为多个事件)
+// REL_BURST: [Buttons, Step_ms, (dx, dy) * N]            每对 int8 为一次相对移动
+// ABS_BURST: [Buttons, Step_ms, X_L, X_H, Y_L, Y_H, (D0, D1, D2) * N]
+//            首点为绝对坐标，之后每 3 字节为相对上一点的 12 位有符号差分:
+//            dx = D0 | (D1 & 0x0F) << 8，dy = D1 >> 4 | D2 << 4 (±2047，约 ±120 像素/步 @1080p)
+// 第一个事件使用记录的 delay_ms，之后每个事件延迟 Step_ms
+#define REC_REL_BURST         0x12
+#define REC_ABS_BURST         0x13
+#define MAX_BURST             32    // 单条突发记录的事件数上限 (不超过事件队列的一半)
+// 合法记录的最大 LEN: TYPE + delay_ms + 满 ABS_BURST 载荷。LEN 更大的同步字必是错位，立即重新同步，
+// 不必等 FRAME2_MAX_LEN 个字节收齐再靠 CRC 失败发现
+#define REC_MAX_BODY          (1 + 2 + 6 + 3 * (MAX_BURST - 1))
+
 // ==========================================
 // 3. 系统子指令定义 (仅在 EVENT_TYPE_SYSTEM 时有效)
 // ==========================================
 #define SYS_CMD_HEARTBEAT     0xFF  // 维持连接心跳
 #define SYS_CMD_SET_ID        0x10  // 切换身份池索引
+#define SYS_CMD_PROTOCOL      0x20  // 协议版本协商: Data = 上位机支持的最高版本，Buf[4] = nonce
+#define PROTOCOL_ACK          0x01  // 协商应答帧 Buf[5] 的标记 (区分应答与串口回环)
 
 // ==========================================
 // 4. 标志位定义
@@ -72,12 +99,30 @@ typedef struct {
 // 6. 解析上下文
 // ==========================================
 typedef struct {
-    uint8_t buffer[FRAME_LEN];
-    uint8_t received_count;
+    uint8_t buffer[FRAME2_MAX_LEN];
+    uint16_t received_count;
+    uint16_t frame_len;         // 最近一次收齐的帧长 (v1 为 11，v2 为整条记录)
+
+    // 突发记录展开状态 (由 rx_next_event 逐个取出)
+    InputEvent burst_evt;       // 上一个事件 (ABS 差分的基准)
+    const uint8_t* burst_ptr;   // 下一组差分，指向 buffer 内部
+    uint8_t burst_left;
+    uint8_t burst_step;
+
+    // 自愈待重解析的字节 (坏候选帧首字节之后已收到的部分)
+    uint8_t pending[FRAME2_MAX_LEN];
+    uint16_t pending_pos;
+    uint16_t pending_len;
 } RxContext;
 
 void rx_context_init(RxContext* ctx);
+uint8_t crc8(const uint8_t* data, uint16_t len);
+
+// 喂一个字节；收齐合法帧时填入第一个事件并返回 true。
+// 突发记录的其余事件、以及自愈重解析出的后续帧，必须在喂下一个字节之前用 rx_next_event 取完：
+//   if (rx_process_byte(&ctx, b, &evt)) do { ... } while (rx_next_event(&ctx, &evt));
 bool rx_process_byte(RxContext* ctx, uint8_t byte, InputEvent* evt);
+bool rx_next_event(RxContext* ctx, InputEvent* evt);
 
 #ifdef __cplusplus
 }